@@ -5,7 +5,7 @@ import datetime
 import aiohttp
 
 from ..web.rest.json import json_response
-from ..log import LOG_NOTICE
+from ..log import LOG_NOTICE, get_message
 
 ##
 
@@ -61,7 +61,7 @@ class WebApiLoggingHandler(logging.Handler):
 			"l": severity,
 		}
 
-		message = record.getMessage()
+		message = get_message(record)
 		if record.exc_text is not None:
 			message += '\n' + record.exc_text
 		if record.stack_info is not None:
@@ -2,10 +2,12 @@ import os
 import sys
 import time
 import signal
+import socket
 import random
 import logging
 import asyncio
 import argparse
+import concurrent.futures
 import itertools
 import platform
 
@@ -20,6 +22,7 @@ from .config import Config
 from .abc.singleton import Singleton
 from .log import Logging, _loop_exception_handler, LOG_NOTICE
 from .task import TaskService
+from .loopmonitor import LoopMonitor
 from .docker import running_in_docker
 
 L = logging.getLogger(__name__)
@@ -61,7 +64,18 @@ class Application(metaclass=Singleton):
 		os.environ['HOSTNAME'] = self.HostName
 		Config._load()
 
-		if hasattr(self.Args, "daemonize") and self.Args.daemonize:
+		# Number of the worker process in the multi-worker mode, see `Supervisor`
+		worker_id = os.environ.get('ASAB_WORKER_ID')
+		self.WorkerId = int(worker_id) if worker_id is not None else None
+		# The process is the supervisor of workers, it doesn't run the application itself
+		self.IsSupervisor = self.WorkerId is None and Config.getint('general', 'workers') > 1 and hasattr(socket, 'SO_REUSEPORT')
+		self.Supervisor = None
+
+		if self.WorkerId is not None:
+			# The supervisor has been already daemonized
+			pass
+
+		elif hasattr(self.Args, "daemonize") and self.Args.daemonize:
 			self.daemonize()
 
 		elif hasattr(self.Args, "kill") and self.Args.kill:
@@ -71,11 +85,19 @@ class Application(metaclass=Singleton):
 		random.seed()
 
 		# Obtain the event loop
+		_set_event_loop_policy(Config.get('general', 'event_loop'))
 		self.Loop = asyncio.get_event_loop()
 		if self.Loop.is_closed():
 			self.Loop = asyncio.new_event_loop()
 			asyncio.set_event_loop(self.Loop)
 
+		# Configure the event loop before any module creates its futures
+		_configure_event_loop(
+			self.Loop,
+			Config.getint('general', 'executor_workers'),
+			Config.getboolean('general', 'eager_tasks'),
+		)
+
 		self.LaunchTime = time.time()
 		self.BaseTime = self.LaunchTime - self.Loop.time()
 
@@ -140,6 +162,12 @@ class Application(metaclass=Singleton):
 		L.info("Initializing ...")
 
 		self.TaskService = TaskService(self)
+		self.LoopMonitor = LoopMonitor(self)
+
+		if self.WorkerId is not None:
+			# The worker exits when its supervisor is gone
+			self.SupervisorPid = os.getppid()
+			self.PubSub.subscribe("Application.tick!", self._check_supervisor)
 
 		for module in modules:
 			self.add_module(module)
@@ -325,6 +353,12 @@ class Application(metaclass=Singleton):
 
 
 	def run(self):
+		workers = Config.getint('general', 'workers')
+		if self.IsSupervisor:
+			return self._run_supervisor(workers)
+		if workers > 1 and self.WorkerId is None:
+			L.warning("Multiple workers are not supported on this platform, running a single process")
+
 		# Comence init-time
 		self.PubSub.publish("Application.init!")
 		self.Loop.run_until_complete(asyncio.gather(
@@ -348,6 +382,8 @@ class Application(metaclass=Singleton):
 			self._exit_time_governor(),
 		))
 
+		self.LoopMonitor.stop()
+
 		# Python 3.5 lacks support for shutdown_asyncgens()
 		if hasattr(self.Loop, "shutdown_asyncgens"):
 			self.Loop.run_until_complete(self.Loop.shutdown_asyncgens())
@@ -356,6 +392,27 @@ class Application(metaclass=Singleton):
 		return self.ExitCode
 
 
+	def _run_supervisor(self, workers):
+		from .supervisor import Supervisor
+
+		L.log(LOG_NOTICE, "is starting {} workers ...".format(workers))
+		self.Supervisor = Supervisor(self, workers)
+		self.Loop.run_until_complete(self.Supervisor.run())
+
+		L.log(LOG_NOTICE, "is exiting ...")
+		if hasattr(self.Loop, "shutdown_asyncgens"):
+			self.Loop.run_until_complete(self.Loop.shutdown_asyncgens())
+		self.Loop.close()
+
+		return self.ExitCode
+
+
+	def _check_supervisor(self, message_type):
+		if os.getppid() != self.SupervisorPid:
+			L.error("Supervisor process exited, stopping the worker")
+			self.stop()
+
+
 	def stop(self, exit_code: int = None):
 		if exit_code is not None:
 			self.set_exit_code(exit_code)
@@ -456,6 +513,7 @@ class Application(metaclass=Singleton):
 	async def _run_time_governor(self):
 		timeout = Config.getint('general', 'tick_period')
 		self.PubSub.publish("Application.run!")
+		self.LoopMonitor.start()
 
 		# Wait for stop event & tick in meanwhile
 		for cycle_no in itertools.count(1):
@@ -495,7 +553,7 @@ class Application(metaclass=Singleton):
 		futures = set()
 		for service in self.Services.values():
 			futures.add(
-				service.finalize(self)
+				asyncio.ensure_future(service.finalize(self))
 			)
 
 		while len(futures) > 0:
@@ -511,7 +569,7 @@ class Application(metaclass=Singleton):
 		futures = set()
 		for module in self.Modules:
 			futures.add(
-				module.finalize(self)
+				asyncio.ensure_future(module.finalize(self))
 			)
 
 		while len(futures) > 0:
@@ -584,3 +642,37 @@ class Application(metaclass=Singleton):
 		Return UTC unix timestamp using a loop time (a fast way how to get a wall clock time).
 		'''
 		return self.BaseTime + self.Loop.time()
+
+
+def _set_event_loop_policy(event_loop):
+	'''
+	Select the implementation of the event loop, `asyncio` (the default one) or `uvloop`.
+	'''
+	if event_loop == 'uvloop':
+		try:
+			import uvloop
+		except ImportError:
+			L.warning("The 'uvloop' event loop is requested but the uvloop module is not installed, using asyncio")
+			return
+		asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+	elif event_loop != 'asyncio':
+		raise RuntimeError("Unknown event loop '{}', use 'asyncio' or 'uvloop'".format(event_loop))
+
+
+def _configure_event_loop(loop, executor_workers, eager_tasks):
+	'''
+	Set the size of the default executor of the event loop (0 keeps the Python default) and enable eager tasks (Python 3.12+).
+	'''
+	if executor_workers > 0:
+		loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+			max_workers=executor_workers,
+			thread_name_prefix="AsabDefaultExecutor"
+		))
+
+	if eager_tasks:
+		eager_task_factory = getattr(asyncio, 'eager_task_factory', None)
+		if eager_task_factory is not None:
+			loop.set_task_factory(eager_task_factory)
+		else:
+			L.warning("Eager tasks are not supported by this version of Python, ignoring 'eager_tasks'")
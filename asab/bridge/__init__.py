@@ -0,0 +1,33 @@
+import logging
+import asab
+
+from .service import PubSubBridgeService
+
+#
+
+L = logging.getLogger(__name__)
+
+#
+
+asab.Config.add_defaults(
+	{
+		'pubsub:bridge': {
+			# Directory with Unix sockets of sibling processes, '' means `pubsub` in the `[general] var_dir`
+			'directory': '',
+			# Whitespace-separated message types (or patterns) that are forwarded to sibling processes
+			'message_types': '',
+			# Maximum number of bytes waiting to be sent to a sibling process, the slow process is disconnected above it
+			'max_buffer_size': 16 * 1024 * 1024,
+		}
+	}
+)
+
+
+class Module(asab.Module):
+	'''
+	Bridge of PubSub messages to sibling processes on the same host over Unix sockets.
+	'''
+
+	def __init__(self, app):
+		super().__init__(app)
+		self.service = PubSubBridgeService(app, "asab.PubSubBridgeService")
@@ -0,0 +1,323 @@
+import os
+import json
+import struct
+import asyncio
+import logging
+import functools
+
+try:
+	import msgpack
+except ImportError:
+	msgpack = None
+
+import asab
+
+#
+
+L = logging.getLogger(__name__)
+
+#
+
+# Frame is a length of the payload, a codec of the payload and the payload
+FrameHeader = struct.Struct(">Ic")
+MaxFrameSize = 64 * 1024 * 1024
+
+# Codecs this process can decode, in the order of preference
+SupportedCodecs = "mj" if msgpack is not None else "j"
+
+
+class PubSubBridgeService(asab.Service):
+	'''
+	Forwards selected PubSub message types to sibling processes of the application and publishes messages received from them.
+
+	Every process listens on its own Unix socket `<directory>/<pid>.sock` and it connects to sockets of all other processes
+	in the directory, which are discovered at the start, every 10 seconds and when a sibling process connects.
+
+	The forwarding is local-first: local subscribers are called by `publish()` as usual,
+	the bridge only collects forwarded messages and sends them in one batch per loop iteration.
+	Messages are framed by a length prefix and serialized by MessagePack if it is installed in both processes, JSON otherwise
+	(every process announces codecs it can decode when it connects to a sibling).
+	Arguments of forwarded messages must be serializable (tuples are received as lists),
+	a message that can't be serialized is logged and skipped.
+	'''
+
+	def __init__(self, app, service_name, config_section_name='pubsub:bridge'):
+		super().__init__(app, service_name)
+		self.Loop = app.Loop
+
+		self.Directory = asab.Config.get(config_section_name, 'directory')
+		if self.Directory == '':
+			self.Directory = os.path.join(asab.Config.get('general', 'var_dir'), 'pubsub')
+		self.Path = os.path.join(self.Directory, "{}.sock".format(os.getpid()))
+		self.MaxBufferSize = asab.Config.getint(config_section_name, 'max_buffer_size')
+
+		self.Server = None
+		self.Peers = dict()  # Socket path -> transport of the connection to the sibling process
+		self.PeerCodecs = dict()  # Socket path -> codecs announced by the sibling process
+		self.Connecting = set()
+
+		self.Pending = []
+		self.FlushScheduled = False
+		self.Receiving = False  # Messages received from siblings are not forwarded back
+
+		for message_type in asab.Config.get(config_section_name, 'message_types').split():
+			self.forward(message_type)
+
+		app.PubSub.subscribe("Application.tick/10!", self._on_tick)
+
+
+	async def initialize(self, app):
+		os.makedirs(self.Directory, mode=0o700, exist_ok=True)
+		if os.path.exists(self.Path):
+			os.unlink(self.Path)
+
+		self.Server = await self.Loop.create_unix_server(functools.partial(_ReceiverProtocol, self), self.Path)
+		os.chmod(self.Path, 0o600)
+		await self._discover()
+
+
+	async def finalize(self, app):
+		self._flush()
+
+		if self.Server is not None:
+			self.Server.close()
+			await self.Server.wait_closed()
+			self.Server = None
+			try:
+				os.unlink(self.Path)
+			except FileNotFoundError:
+				pass
+
+		for transport in self.Peers.values():
+			transport.close()
+		self.Peers.clear()
+
+
+	def forward(self, message_type):
+		'''
+		Forward the message type (or a pattern of message types) to sibling processes.
+		'''
+		self.App.PubSub.subscribe(message_type, self._on_message)
+
+
+	def _on_message(self, message_type, *args, **kwargs):
+		if self.Receiving:
+			return
+
+		self.Pending.append((message_type, args, kwargs))
+		if not self.FlushScheduled:
+			self.FlushScheduled = True
+			self.Loop.call_soon(self._flush)
+
+
+	def _flush(self):
+		self.FlushScheduled = False
+		pending = self.Pending
+		if len(pending) == 0:
+			return
+		self.Pending = []
+
+		if len(self.Peers) == 0:
+			return
+
+		frames = dict()  # codec -> frame, each codec is used for siblings that announced it
+		for path, transport in list(self.Peers.items()):
+			if transport.get_write_buffer_size() > self.MaxBufferSize:
+				L.warning("Sibling process doesn't read PubSub messages, disconnecting", struct_data={"path": path})
+				transport.abort()
+				del self.Peers[path]
+				continue
+
+			codec = select_codec(self.PeerCodecs.get(path, ""))
+			if codec not in frames:
+				frames[codec] = encode_frame(pending, codec)
+			frame = frames[codec]
+			if frame is not None:
+				transport.write(frame)
+
+
+	def _deliver(self, messages):
+		self.Receiving = True
+		try:
+			for message_type, args, kwargs in messages:
+				try:
+					self.App.PubSub.publish(message_type, *args, **kwargs)
+				except Exception:
+					L.exception("Error when delivering PubSub message from a sibling process", struct_data={"message_type": message_type})
+		finally:
+			self.Receiving = False
+
+
+	def _on_tick(self, message_type):
+		self.Loop.create_task(self._discover())
+
+
+	async def _discover(self):
+		try:
+			names = os.listdir(self.Directory)
+		except FileNotFoundError:
+			return
+
+		for name in names:
+			if not name.endswith(".sock"):
+				continue
+			await self._connect(os.path.join(self.Directory, name))
+
+
+	async def _connect(self, path):
+		if path == self.Path or path in self.Peers or path in self.Connecting:
+			return
+
+		self.Connecting.add(path)
+		try:
+			transport, _ = await self.Loop.create_unix_connection(functools.partial(_SenderProtocol, self, path), path)
+		except ConnectionRefusedError:
+			# The process that created the socket doesn't exist anymore
+			L.debug("Removing stale socket of a sibling process", struct_data={"path": path})
+			try:
+				os.unlink(path)
+			except FileNotFoundError:
+				pass
+			return
+		except OSError as e:
+			L.warning("Failed to connect to a sibling process: {}".format(e), struct_data={"path": path})
+			return
+		finally:
+			self.Connecting.discard(path)
+
+		# Tell the sibling where to connect back and which codecs it can use
+		hello = json.dumps({"path": self.Path, "codecs": SupportedCodecs}).encode("utf-8")
+		transport.write(FrameHeader.pack(len(hello), b'h') + hello)
+		self.Peers[path] = transport
+		L.debug("Connected to a sibling process", struct_data={"path": path})
+
+
+def select_codec(peer_codecs):
+	'''
+	Returns MessagePack codec if both processes support it, JSON otherwise.
+	'''
+	if msgpack is not None and 'm' in peer_codecs:
+		return b'm'
+	return b'j'
+
+
+def encode_frame(messages, codec=b'j'):
+	'''
+	Serialize messages into a frame, messages that can't be serialized are skipped.
+	Returns None if there is no message to send.
+	'''
+	if codec == b'm':
+		serialize = functools.partial(msgpack.packb, use_bin_type=True)
+	else:
+		serialize = _json_dumps
+
+	items = []
+	for message in messages:
+		try:
+			items.append(serialize(message))
+		except (TypeError, ValueError, OverflowError) as e:
+			L.warning("Failed to serialize PubSub message for sibling processes: {}".format(e), struct_data={"message_type": str(message[0])})
+
+	if len(items) == 0:
+		return None
+
+	if codec == b'm':
+		payload = msgpack.Packer().pack_array_header(len(items)) + b''.join(items)
+	else:
+		payload = b'[' + b','.join(items) + b']'
+	return FrameHeader.pack(len(payload), codec) + payload
+
+
+def _json_dumps(message):
+	return json.dumps(message).encode("utf-8")
+
+
+def decode_payload(codec, payload):
+	if codec == b'm':
+		if msgpack is None:
+			raise RuntimeError("Sibling process sends MessagePack but 'msgpack' is not installed")
+		return msgpack.unpackb(payload, raw=False)
+	if codec == b'j':
+		return json.loads(payload.decode("utf-8"))
+	raise RuntimeError("Unknown codec '{}' of PubSub bridge frame".format(codec))
+
+
+class _SenderProtocol(asyncio.Protocol):
+	'''
+	Outgoing connection to a sibling process, it is used only for sending.
+	'''
+
+	def __init__(self, bridge, path):
+		self.Bridge = bridge
+		self.Path = path
+		self.Transport = None
+
+	def connection_made(self, transport):
+		self.Transport = transport
+
+	def connection_lost(self, exc):
+		if self.Bridge.Peers.get(self.Path) is self.Transport:
+			del self.Bridge.Peers[self.Path]
+
+
+class _ReceiverProtocol(asyncio.Protocol):
+	'''
+	Incoming connection from a sibling process, it is used only for receiving.
+	'''
+
+	def __init__(self, bridge):
+		self.Bridge = bridge
+		self.Transport = None
+		self.Buffer = bytearray()
+		self.PeerPath = None
+
+	def connection_made(self, transport):
+		self.Transport = transport
+
+	def connection_lost(self, exc):
+		if self.PeerPath is not None:
+			self.Bridge.PeerCodecs.pop(self.PeerPath, None)
+
+	def data_received(self, data):
+		self.Buffer.extend(data)
+
+		offset = 0
+		while len(self.Buffer) - offset >= FrameHeader.size:
+			length, codec = FrameHeader.unpack_from(self.Buffer, offset)
+			if length > MaxFrameSize:
+				L.warning("Too large PubSub bridge frame, disconnecting", struct_data={"length": length})
+				self.Transport.abort()
+				return
+
+			end = offset + FrameHeader.size + length
+			if len(self.Buffer) < end:
+				break
+			payload = bytes(self.Buffer[offset + FrameHeader.size:end])
+			offset = end
+
+			if codec == b'h':
+				self._on_hello(payload)
+				continue
+
+			try:
+				messages = decode_payload(codec, payload)
+			except Exception:
+				L.exception("Failed to decode PubSub bridge frame")
+				continue
+			self.Bridge._deliver(messages)
+
+		del self.Buffer[:offset]
+
+	def _on_hello(self, payload):
+		try:
+			hello = json.loads(payload.decode("utf-8"))
+			path = hello["path"]
+			codecs = hello.get("codecs", "j")
+		except (ValueError, TypeError, KeyError, AttributeError):
+			L.warning("Invalid hello frame of PubSub bridge, disconnecting")
+			self.Transport.abort()
+			return
+
+		self.PeerPath = path
+		self.Bridge.PeerCodecs[path] = codecs
+		self.Bridge.Loop.create_task(self.Bridge._connect(path))
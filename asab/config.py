@@ -40,11 +40,34 @@ class ConfigParser(configparser.ConfigParser):
 			'working_dir': '.',
 			'uid': '',
 			'gid': '',
+
+			# Event loop
+			'event_loop': 'asyncio',  # 'asyncio' or 'uvloop' (if installed)
+			'executor_workers': 0,  # Size of the default executor of the event loop, 0 means the Python default
+			'eager_tasks': 'false',  # Start tasks eagerly (Python 3.12+)
+
+			# Multi-worker mode
+			'workers': 1,  # Number of worker processes, more than 1 starts the supervisor of workers that share listening sockets
 		},
 
 		"asab:metrics": {
 			"native_metrics": "true",
 			"expiration": 60,
+			"interval": 60,  # Flush period of metrics in seconds (e.g. 1s, 5s, 10s, 60s)
+			"max_series": 10000,  # Maximum number of series (tag combinations) of a metric with dynamic tags, 0 means unlimited
+			"cardinality_policy": "overflow",  # What to do when 'max_series' is reached: 'overflow' or 'lru'
+			"shared_memory": "",  # Path of the shared memory file (e.g. /dev/shm/myapp-metrics) to aggregate metrics of worker processes, empty disables
+			"shared_memory_slots": 64,  # Maximum number of worker processes
+			"shared_memory_slot_size": 1048576,  # Maximum size of serialized metrics of one worker in bytes
+		},
+
+		"asab:loop": {
+			"monitor_interval": 0.1,  # Period of measurement of the event loop lag in seconds, 0 disables the monitor
+			"blocked_threshold": 0,  # The stack of the main thread is logged when the event loop is blocked longer (in seconds), 0 disables
+		},
+
+		"asab:task": {
+			"slow_task": 10,  # Tasks running longer than this (in seconds) are logged with their stack, 0 disables
 		},
 
 		"logging": {
@@ -53,6 +76,10 @@ class ConfigParser(configparser.ConfigParser):
 			"sd_id": "sd",  # Structured data id, see RFC5424
 			"level": "NOTICE",
 			"levels": "",
+			"queue": "false",  # Format and write log records in a dedicated thread, off the event loop
+			"queue_size": 10000,  # Maximum number of log records waiting in the queue, further records are dropped
+			"dedup": "",  # Lines of 'logger window', identical records of the logger are suppressed within the window
+			"sampling": "",  # Lines of 'logger rate', only the fraction of records (below WARNING) of the logger is logged
 		},
 
 		"logging:console": {
@@ -65,6 +92,7 @@ class ConfigParser(configparser.ConfigParser):
 			# TODO: "facility": 'local1',
 			"address": _syslog_sockets.get(platform.system(), "/dev/log"),
 			"format": _syslog_format.get(platform.system(), "3"),
+			"buffer_size": 1048576,  # Maximum size of log messages (in bytes) waiting for the syslog server, further messages are dropped
 		},
 
 		"logging:file": {
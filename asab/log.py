@@ -1,19 +1,28 @@
 import asyncio
 import datetime
+import json
 import logging
 import logging.handlers
 import os
 import pprint
-import queue
+import random
 import re
 import socket
 import sys
 import time
+import threading
 import traceback
+import collections
 import urllib.parse
 
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
 from .config import Config
 from .timer import Timer
+from .utils import convert_to_seconds
 
 # Non-error/warning type of message that is visible without -v flag
 LOG_NOTICE = 25
@@ -24,11 +33,19 @@ class Logging(object):
 
 
 	def __init__(self, app):
+		self.App = app
 		self.RootLogger = logging.getLogger()
 
 		self.ConsoleHandler = None
 		self.FileHandler = None
 		self.SyslogHandler = None
+		self.QueueHandler = None
+		self.RateFilter = None
+
+		# Workers of the multi-worker mode share the log file, it is rotated by the supervisor
+		self.Worker = getattr(app, 'WorkerId', None) is not None
+		self.Supervisor = getattr(app, 'IsSupervisor', False)
+		self.MaxBytes = 0
 
 		if not self.RootLogger.hasHandlers():
 
@@ -46,21 +63,35 @@ class Logging(object):
 				if not os.path.exists(directory):
 					os.makedirs(directory)
 
-				self.FileHandler = logging.handlers.RotatingFileHandler(
-					file_path,
-					backupCount=Config.getint("logging:file", "backup_count"),
-					maxBytes=Config.getint("logging:file", "backup_max_bytes"),
-				)
+				if self.Worker:
+					# The worker never rotates the file, it reopens the file when the supervisor rotates it
+					self.FileHandler = logging.handlers.WatchedFileHandler(file_path)
+
+				elif self.Supervisor:
+					# The size of the file (written also by workers) is checked by the supervisor, see `_on_tick_size_check()`
+					self.FileHandler = logging.handlers.RotatingFileHandler(
+						file_path,
+						backupCount=Config.getint("logging:file", "backup_count"),
+					)
+					self.MaxBytes = Config.getint("logging:file", "backup_max_bytes")
+					if self.MaxBytes > 0:
+						async def schedule_size_check(app):
+							self.SizeCheckTimer = Timer(app, self._on_tick_size_check, autorestart=True)
+							self.SizeCheckTimer.start(1)
+						asyncio.ensure_future(schedule_size_check(app), loop=app.Loop)
+
+				else:
+					self.FileHandler = logging.handlers.RotatingFileHandler(
+						file_path,
+						backupCount=Config.getint("logging:file", "backup_count"),
+						maxBytes=Config.getint("logging:file", "backup_max_bytes"),
+					)
 				self.FileHandler.setLevel(logging.DEBUG)
-				self.FileHandler.setFormatter(StructuredDataFormatter(
-					fmt=Config["logging:file"]["format"],
-					datefmt=Config["logging:file"]["datefmt"],
-					sd_id=Config["logging"]["sd_id"],
-				))
+				self.FileHandler.setFormatter(_create_formatter("logging:file"))
 				self.RootLogger.addHandler(self.FileHandler)
 
 				rotate_every = Config.get("logging:file", "rotate_every")
-				if rotate_every != '':
+				if rotate_every != '' and not self.Worker:
 					rotate_every = re.match(r"^([0-9]+)([dMHs])$", rotate_every)
 					if rotate_every is not None:
 						i, u = rotate_every.groups()
@@ -90,9 +121,10 @@ class Logging(object):
 			if Config["logging:syslog"].getboolean("enabled"):
 
 				address = Config["logging:syslog"]["address"]
+				buffer_size = Config.getint("logging:syslog", "buffer_size")
 
 				if address[:1] == '/':
-					self.SyslogHandler = AsyncIOHandler(app.Loop, socket.AF_UNIX, socket.SOCK_DGRAM, address)
+					self.SyslogHandler = AsyncIOHandler(app.Loop, socket.AF_UNIX, socket.SOCK_DGRAM, address, buffer_size=buffer_size)
 
 				else:
 					url = urllib.parse.urlparse(address)
@@ -101,19 +133,19 @@ class Logging(object):
 						self.SyslogHandler = AsyncIOHandler(app.Loop, socket.AF_INET, socket.SOCK_STREAM, (
 							url.hostname if url.hostname is not None else 'localhost',
 							url.port if url.port is not None else logging.handlers.SYSLOG_UDP_PORT
-						))
+						), buffer_size=buffer_size)
 
 					elif url.scheme == 'udp':
 						self.SyslogHandler = AsyncIOHandler(app.Loop, socket.AF_INET, socket.SOCK_DGRAM, (
 							url.hostname if url.hostname is not None else 'localhost',
 							url.port if url.port is not None else logging.handlers.SYSLOG_UDP_PORT
-						))
+						), buffer_size=buffer_size)
 
 					elif url.scheme == 'unix-connect':
-						self.SyslogHandler = AsyncIOHandler(app.Loop, socket.AF_UNIX, socket.SOCK_STREAM, url.path)
+						self.SyslogHandler = AsyncIOHandler(app.Loop, socket.AF_UNIX, socket.SOCK_STREAM, url.path, buffer_size=buffer_size)
 
 					elif url.scheme == 'unix-sendto':
-						self.SyslogHandler = AsyncIOHandler(app.Loop, socket.AF_UNIX, socket.SOCK_DGRAM, url.path)
+						self.SyslogHandler = AsyncIOHandler(app.Loop, socket.AF_UNIX, socket.SOCK_DGRAM, url.path, buffer_size=buffer_size)
 
 					else:
 						self.RootLogger.warning("Invalid logging:syslog address '{}'".format(address))
@@ -122,7 +154,9 @@ class Logging(object):
 				if self.SyslogHandler is not None:
 					self.SyslogHandler.setLevel(logging.DEBUG)
 					format = Config["logging:syslog"]["format"]
-					if format == 'm':
+					if format == 'json':
+						self.SyslogHandler.setFormatter(JSONFormatter())
+					elif format == 'm':
 						self.SyslogHandler.setFormatter(MacOSXSyslogFormatter(sd_id=Config["logging"]["sd_id"]))
 					elif format == '5':
 						self.SyslogHandler.setFormatter(SyslogRFC5424Formatter(sd_id=Config["logging"]["sd_id"]))
@@ -137,6 +171,19 @@ class Logging(object):
 				if running_in_docker():
 					self._configure_console_logging()
 
+			# Records are formatted and written by a dedicated thread, off the event loop
+			if Config["logging"].getboolean("queue"):
+				self._configure_queue_logging()
+
+			# Deduplication and sampling of repetitive log records
+			dedup = _parse_logger_options(Config["logging"].get("dedup"), convert_to_seconds)
+			sampling = _parse_logger_options(Config["logging"].get("sampling"), float)
+			if len(dedup) > 0 or len(sampling) > 0:
+				self.RateFilter = LogRateFilter(dedup, sampling)
+				for handler in self.RootLogger.handlers:
+					handler.addFilter(self.RateFilter)
+				self.RateFilter.start(app.Loop)
+
 		else:
 			self.RootLogger.warning("Logging seems to be already configured. Proceed with caution.")
 
@@ -157,29 +204,68 @@ class Logging(object):
 
 
 	def rotate(self):
-		if self.FileHandler is not None:
-			self.RootLogger.log(LOG_NOTICE, "Rotating logs")
+		if self.FileHandler is None:
+			return
+
+		if self.Worker:
+			# The supervisor has renamed the log file, reopen it
+			with self.FileHandler.lock:
+				self.FileHandler.reopenIfNeeded()
+			return
+
+		self.RootLogger.log(LOG_NOTICE, "Rotating logs")
+		with self.FileHandler.lock:
 			self.FileHandler.doRollover()
 
 
+	def _file_size(self):
+		# The size of the file on the disk, it includes records written by workers of the multi-worker mode
+		try:
+			return os.stat(self.FileHandler.baseFilename).st_size
+		except FileNotFoundError:
+			return 0
+
+
+	def _rotate_and_notify(self):
+		if self.Supervisor:
+			# Rotate the file and send SIGHUP to workers, so that they reopen it
+			self.App._hup()
+		else:
+			self.rotate()
+
+
 	async def _on_tick_rotate_check(self):
 		if self.FileHandler is not None:
-			if self.FileHandler.stream.tell() > 1000:
-				self.rotate()
+			if self._file_size() > 1000:
+				self._rotate_and_notify()
+
+
+	async def _on_tick_size_check(self):
+		if self.FileHandler is not None:
+			if self._file_size() >= self.MaxBytes:
+				self._rotate_and_notify()
 
 
 	def _configure_console_logging(self):
 		self.ConsoleHandler = logging.StreamHandler(stream=sys.stderr)
-		self.ConsoleHandler.setFormatter(StructuredDataFormatter(
-			fmt=Config["logging:console"]["format"],
-			datefmt=Config["logging:console"]["datefmt"],
-			sd_id=Config["logging"]["sd_id"],
-			use_color=True
-		))
+		self.ConsoleHandler.setFormatter(_create_formatter("logging:console", use_color=True))
 		self.ConsoleHandler.setLevel(logging.DEBUG)
 		self.RootLogger.addHandler(self.ConsoleHandler)
 
 
+	def _configure_queue_logging(self):
+		handlers = list(self.RootLogger.handlers)
+		if len(handlers) == 0:
+			return
+
+		for handler in handlers:
+			self.RootLogger.removeHandler(handler)
+
+		self.QueueHandler = QueueLogHandler(handlers, maxsize=Config.getint("logging", "queue_size"))
+		self.QueueHandler.setLevel(logging.DEBUG)
+		self.RootLogger.addHandler(self.QueueHandler)
+
+
 class _StructuredDataLogger(logging.Logger):
 	'''
 This class extends a default python logger class, specifically by adding ``struct_data`` parameter to logging functions.
@@ -213,44 +299,65 @@ class StructuredDataFormatter(logging.Formatter):
 		self.Facility = facility
 		self.UseColor = use_color
 
+		# The format plan, what is needed to render a record is decided once
+		self.UsesTime = self.usesTime()
+		self.StructDataKey = ('struct_data', type(self).render_struct_data, self.SD_id, self.empty_sd)
+		self.LevelNames = dict()  # levelname -> colored levelname
+
 
 	def format(self, record):
 		'''
 		Format the specified record as text.
+
+		Parts of the output that are the same for all handlers (the message, the timestamp and the structured data)
+		are rendered once per record and cached in the record, see `render_cache()`.
 		'''
 
-		record.struct_data = self.render_struct_data(record.__dict__.get("_struct_data"))
+		cache = render_cache(record)
+
+		record.message = get_message(record)
+
+		if self.UsesTime:
+			# The converter can be changed after the formatter is created
+			time_key = ('asctime', type(self).formatTime, self.datefmt, self.converter)
+			asctime = cache.get(time_key)
+			if asctime is None:
+				asctime = cache[time_key] = self.formatTime(record, self.datefmt)
+			record.asctime = asctime
+
+		struct_data = cache.get(self.StructDataKey)
+		if struct_data is None:
+			struct_data = cache[self.StructDataKey] = self.render_struct_data(record.__dict__.get("_struct_data"))
+		record.struct_data = struct_data
 
 		# The Priority value is calculated by first multiplying the Facility number by 8 and then adding the numerical value of the Severity.
-		if record.levelno <= logging.DEBUG:
-			severity = 7  # Debug
-			color = self.BLUE
-		elif record.levelno <= logging.INFO:
-			severity = 6  # Informational
-			color = self.GREEN
-		elif record.levelno <= LOG_NOTICE:
-			severity = 5  # Notice
-			color = self.CYAN
-		elif record.levelno <= logging.WARNING:
-			severity = 4  # Warning
-			color = self.YELLOW
-		elif record.levelno <= logging.ERROR:
-			severity = 3  # Error
-			color = self.RED
-		elif record.levelno <= logging.CRITICAL:
-			severity = 2  # Critical
-			color = self.MAGENTA
-		else:
-			severity = 1  # Alert
-			color = self.WHITE
+		severity, color = _severity(record.levelno)
+		record.priority = (self.Facility << 3) + severity
 
+		levelname = record.levelname
 		if self.UseColor:
-			levelname = record.levelname
-			levelname_color = _COLOR_SEQ % (30 + color) + levelname + _RESET_SEQ
+			levelname_color = self.LevelNames.get(levelname)
+			if levelname_color is None:
+				levelname_color = self.LevelNames[levelname] = _COLOR_SEQ % (30 + color) + levelname + _RESET_SEQ
 			record.levelname = levelname_color
 
-		record.priority = (self.Facility << 3) + severity
-		return super().format(record)
+		try:
+			s = self.formatMessage(record)
+		finally:
+			# Other handlers of the record must not receive the colored level name
+			record.levelname = levelname
+
+		if record.exc_info and not record.exc_text:
+			record.exc_text = self.formatException(record.exc_info)
+		if record.exc_text:
+			if s[-1:] != "\n":
+				s = s + "\n"
+			s = s + record.exc_text
+		if record.stack_info:
+			if s[-1:] != "\n":
+				s = s + "\n"
+			s = s + self.formatStack(record.stack_info)
+		return s
 
 
 	def formatTime(self, record, datefmt=None):
@@ -285,6 +392,312 @@ class StructuredDataFormatter(logging.Formatter):
 				sd_params=" ".join(['{}="{}"'.format(key, val) for key, val in struct_data.items()]))
 
 
+class JSONFormatter(logging.Formatter):
+	'''
+	The logging formatter that renders a log record as one line of JSON (JSON lines),
+	with field names of the `Elastic Common Schema <https://www.elastic.co/guide/en/ecs/current/>`_:
+
+	``{"@timestamp": "2021-03-25T23:33:58.044595Z", "log.level": "WARNING", "log.logger": "myapp.mymodule", "message": "Hello world!", "labels": {...}, ...}``
+
+	Structured data of the record are in ``labels``, an exception in ``error.type``, ``error.message`` and ``error.stack_trace``.
+	The trace context is taken from ``trace_id`` and ``span_id`` attributes of the record (e.g. from ``extra``).
+	Static fields (the host name, the application name and the process id) are serialized only once.
+	The `orjson` package is used for serialization when it is installed.
+	'''
+
+	def __init__(self, static_fields=None):
+		super().__init__()
+		fields = {
+			"host.hostname": socket.gethostname(),
+			"service.name": Config["logging"]["app_name"],
+			"process.pid": os.getpid(),
+		}
+		if static_fields is not None:
+			fields.update(static_fields)
+
+		# The serialized static fields are appended to each record as a JSON fragment
+		self.StaticFields = ',' + _json_dumps(fields)[1:]
+
+
+	def format(self, record):
+		'''
+		Format the specified record as a line of JSON.
+		'''
+		cache = render_cache(record)
+		timestamp = cache.get('@timestamp')
+		if timestamp is None:
+			timestamp = cache['@timestamp'] = "{}.{:06d}Z".format(
+				time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)),
+				int((record.created % 1) * 1000000)
+			)
+
+		message = get_message(record)
+		if record.stack_info:
+			message = message + '\n' + self.formatStack(record.stack_info)
+
+		entry = {
+			"@timestamp": timestamp,
+			"log.level": record.levelname,
+			"log.logger": record.name,
+			"message": message,
+		}
+
+		struct_data = record.__dict__.get("_struct_data")
+		if struct_data is not None:
+			entry["labels"] = struct_data
+
+		if record.exc_info and record.exc_info[0] is not None:
+			# `exc_info` is `(None, None, None)` when an exception is logged outside of the `except` block
+			if not record.exc_text:
+				record.exc_text = self.formatException(record.exc_info)
+			entry["error.type"] = record.exc_info[0].__name__
+			entry["error.message"] = str(record.exc_info[1])
+			entry["error.stack_trace"] = record.exc_text
+
+		trace_id = record.__dict__.get("trace_id")
+		if trace_id is not None:
+			entry["trace.id"] = trace_id
+		span_id = record.__dict__.get("span_id")
+		if span_id is not None:
+			entry["span.id"] = span_id
+
+		return _json_dumps(entry)[:-1] + self.StaticFields
+
+
+class LogRateFilter(logging.Filter):
+	'''
+	The logging filter that limits repetitive log records, it is attached to all handlers of the root logger.
+
+	`dedup` is a dictionary of logger names and windows (in seconds).
+	The first record of the same logger, message template and level is passed, identical records are suppressed then
+	until the end of the window; a summary record with the number of suppressed records is logged after the window.
+
+	`sampling` is a dictionary of logger names and rates (0.0 - 1.0).
+	Only the given fraction of records of the logger below the WARNING level is passed, randomly.
+
+	Options of a logger apply also to its descendants (e.g. `asab.web` applies to `asab.web.al`).
+	'''
+
+	SweepInterval = 1.0
+
+	def __init__(self, dedup, sampling):
+		super().__init__()
+		self.Dedup = dedup
+		self.Sampling = sampling
+		self.Options = dict()  # Logger name -> (window, rate)
+
+		self.Lock = threading.Lock()
+		self.Records = dict()  # (logger name, template, level) -> _Suppression
+		self.Summaries = []  # Suppressions which windows are over
+		self.Loop = None
+
+
+	def start(self, loop):
+		self.Loop = loop
+		self.Loop.call_later(self.SweepInterval, self._on_sweep)
+
+
+	def filter(self, record):
+		# The decision is made once per record and it is shared by all handlers
+		decision = record.__dict__.get("_rate_decision")
+		if decision is None:
+			decision = record._rate_decision = self._decide(record)
+		return decision
+
+
+	def _decide(self, record):
+		if record.__dict__.get("_suppressed") is not None:
+			# The summary record
+			return True
+
+		window, rate = self._options(record.name)
+
+		if rate is not None and record.levelno < logging.WARNING and random.random() >= rate:
+			return False
+
+		if window is None:
+			return True
+
+		key = (record.name, record.msg, record.levelno)
+		with self.Lock:
+			suppression = self.Records.get(key)
+			if suppression is None or record.created - suppression.Start >= window:
+				if suppression is not None and suppression.Count > 0:
+					# The summary is logged by the next sweep, not from within a handler
+					self.Summaries.append(suppression)
+				self.Records[key] = _Suppression(record.created, window, record)
+				return True
+
+			suppression.Count += 1
+			suppression.Last = record
+			return False
+
+
+	def _options(self, name):
+		options = self.Options.get(name)
+		if options is None:
+			options = self.Options[name] = (_lookup_logger(self.Dedup, name), _lookup_logger(self.Sampling, name))
+		return options
+
+
+	def _on_sweep(self):
+		'''
+		Log summaries of suppressions which windows are over.
+		'''
+		now = time.time()
+		with self.Lock:
+			summaries = self.Summaries
+			self.Summaries = []
+			for key, suppression in list(self.Records.items()):
+				if now - suppression.Start < suppression.Window:
+					continue
+				del self.Records[key]
+				if suppression.Count > 0:
+					summaries.append(suppression)
+
+		for suppression in summaries:
+			self._summary(suppression)
+
+		if not self.Loop.is_closed():
+			self.Loop.call_later(self.SweepInterval, self._on_sweep)
+
+
+	def _summary(self, suppression):
+		last = suppression.Last
+		record = logging.makeLogRecord({
+			k: v for k, v in last.__dict__.items()
+			if k not in ("_render_cache", "_rate_decision")
+		})
+		record.msg = "{} (suppressed {} times in {:.0f} seconds)".format(get_message(last), suppression.Count, suppression.Window)
+		record.args = None
+		record.exc_info = None
+		record.exc_text = None
+		record.created = time.time()
+		record.msecs = (record.created % 1) * 1000
+		record._suppressed = suppression.Count
+		record._struct_data = dict(last.__dict__.get("_struct_data") or {}, suppressed=suppression.Count)
+		logging.getLogger(record.name).handle(record)
+
+
+class _Suppression(object):
+
+	__slots__ = ('Start', 'Window', 'Count', 'Last')
+
+	def __init__(self, start, window, record):
+		self.Start = start
+		self.Window = window
+		self.Count = 0
+		self.Last = record
+
+
+def _parse_logger_options(value, convert):
+	'''
+	Parse lines of `logger_name value` configuration, such as `levels` in `[logging]`.
+	'''
+	options = dict()
+	for line in value.split('\n'):
+		line = line.strip()
+		if len(line) == 0 or line.startswith('#') or line.startswith(';'):
+			continue
+		loggername, option = line.split(' ', 1)
+		options[loggername] = convert(option.strip())
+	return options
+
+
+def _lookup_logger(options, name):
+	'''
+	Find the option of the logger or of its nearest ancestor.
+	'''
+	while True:
+		option = options.get(name)
+		if option is not None:
+			return option
+		if '.' not in name:
+			return None
+		name = name.rsplit('.', 1)[0]
+
+
+def _json_dumps(obj):
+	try:
+		return _json_dumps_raw(obj)
+	except TypeError:
+		# Keys that the serializer doesn't accept (e.g. tuples) are converted to strings
+		return _json_dumps_raw(_str_keys(obj))
+
+
+def _json_dumps_raw(obj):
+	if orjson is not None:
+		return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+	return json.dumps(obj, default=str, ensure_ascii=False, separators=(',', ':'))
+
+
+def _str_keys(obj):
+	if isinstance(obj, dict):
+		return {
+			(k if isinstance(k, str) else str(k)): _str_keys(v)
+			for k, v in obj.items()
+		}
+	if isinstance(obj, (list, tuple)):
+		return [_str_keys(v) for v in obj]
+	return obj
+
+
+def _create_formatter(config_section_name, use_color=False):
+	'''
+	Create the formatter of the console or the file logging, ``format=json`` selects JSON lines.
+	'''
+	if Config[config_section_name]["format"] == 'json':
+		return JSONFormatter()
+
+	return StructuredDataFormatter(
+		fmt=Config[config_section_name]["format"],
+		datefmt=Config[config_section_name]["datefmt"],
+		sd_id=Config["logging"]["sd_id"],
+		use_color=use_color
+	)
+
+
+def render_cache(record):
+	'''
+	Return the dictionary of parts of the record that are already rendered by formatters.
+	It is shared by all handlers of the record, so that e.g. the timestamp is formatted only once.
+	'''
+	cache = record.__dict__.get("_render_cache")
+	if cache is None:
+		cache = record._render_cache = dict()
+	return cache
+
+
+def get_message(record):
+	'''
+	Return the message of the record (with merged arguments), it is merged only once per record.
+	'''
+	cache = render_cache(record)
+	message = cache.get('message')
+	if message is None:
+		message = cache['message'] = record.getMessage()
+	return message
+
+
+def _severity(levelno):
+	'''
+	Return the syslog severity and the console color of the log level.
+	'''
+	if levelno <= logging.DEBUG:
+		return 7, StructuredDataFormatter.BLUE  # Debug
+	elif levelno <= logging.INFO:
+		return 6, StructuredDataFormatter.GREEN  # Informational
+	elif levelno <= LOG_NOTICE:
+		return 5, StructuredDataFormatter.CYAN  # Notice
+	elif levelno <= logging.WARNING:
+		return 4, StructuredDataFormatter.YELLOW  # Warning
+	elif levelno <= logging.ERROR:
+		return 3, StructuredDataFormatter.RED  # Error
+	elif levelno <= logging.CRITICAL:
+		return 2, StructuredDataFormatter.MAGENTA  # Critical
+	else:
+		return 1, StructuredDataFormatter.WHITE  # Alert
+
 
 def _loop_exception_handler(loop, context):
 	'''
@@ -365,69 +778,116 @@ class AsyncIOHandler(logging.Handler):
 
 	'''
 A logging handler similar to a standard ``logging.handlers.SocketHandler`` that utilizes ``asyncio``.
-It implements a queue for decoupling logging from a networking. The networking is fully event-driven via ``asyncio`` mechanisms.
+The networking is fully event-driven via an ``asyncio`` transport, it never blocks the event loop.
+
+Encoded syslog frames are appended to a bounded buffer (``buffer_size`` bytes), frames that don't fit are dropped.
+The buffer is flushed once per iteration of the event loop, so that frames logged meanwhile are coalesced:
+a stream socket receives them in one write (RFC 5424 frames are octet-counted, see RFC 6587),
+a datagram socket sends them one datagram per frame in a single loop.
+The buffer keeps frames while the connection is being (re)established,
+the reconnect is retried with an exponential backoff.
+
+Counters ``Dropped`` (frames), ``DroppedBytes`` and ``BufferedBytes`` describe the state of the buffer.
 	'''
 
-	def __init__(self, loop, family, sock_type, address, facility=logging.handlers.SysLogHandler.LOG_LOCAL1):
+	ReconnectDelayMin = 0.1
+	ReconnectDelayMax = 60.0
+
+
+	def __init__(self, loop, family, sock_type, address, facility=logging.handlers.SysLogHandler.LOG_LOCAL1, buffer_size=1048576):
 		logging.Handler.__init__(self)
 
 		self._family = family
 		self._type = sock_type
 		self._address = address
 		self._loop = loop
+		self._thread_id = threading.get_ident()
 
-		self._socket = None
-		self._reset()
+		self._transport = None
+		self._connecting = False
+		self._write_paused = False
+		self._reconnect_delay = self.ReconnectDelayMin
+		self._reported_error = False
+		self._flush_scheduled = False
+		self._closed = False  # The closed handler doesn't reconnect
 
-		self._queue = queue.Queue()
+		self._buffer = collections.deque()
+		self._buffer_size = buffer_size
+		self.BufferedBytes = 0
+		self.Dropped = 0
+		self.DroppedBytes = 0
 
-		self._loop.call_soon(self._connect, self._loop)
+		self._loop.call_soon(self._connect)
 
 
-	def _reset(self):
-		self._write_ready = False
-		if self._socket is not None:
-			self._loop.remove_writer(self._socket)
-			self._loop.remove_reader(self._socket)
-			self._socket.close()
-			self._socket = None
-
+	def _connect(self):
+		if self._closed or self._connecting or self._transport is not None:
+			return
+		self._connecting = True
+		asyncio.ensure_future(self._open(), loop=self._loop)
 
-	def _connect(self, loop):
-		self._reset()
 
+	async def _open(self):
 		try:
-			self._socket = socket.socket(self._family, self._type)
-			self._socket.setblocking(0)
-			self._socket.connect(self._address)
+			if self._type == socket.SOCK_DGRAM:
+				if self._family == socket.AF_UNIX:
+					await self._loop.create_datagram_endpoint(
+						lambda: _SyslogProtocol(self), remote_addr=self._address, family=socket.AF_UNIX
+					)
+				else:
+					await self._loop.create_datagram_endpoint(lambda: _SyslogProtocol(self), remote_addr=self._address)
+
+			elif self._family == socket.AF_UNIX:
+				await self._loop.create_unix_connection(lambda: _SyslogProtocol(self), path=self._address)
+
+			else:
+				host, port = self._address
+				await self._loop.create_connection(lambda: _SyslogProtocol(self), host, port)
+
 		except Exception as e:
-			print("Error when opening syslog connection to '{}'".format(self._address), e, file=sys.stderr)
+			self._connecting = False
+			if not self._reported_error:
+				print("Error when opening syslog connection to '{}'".format(self._address), e, file=sys.stderr)
+				self._reported_error = True
+
+			if not self._closed:
+				self._loop.call_later(self._reconnect_delay, self._connect)
+				self._reconnect_delay = min(self._reconnect_delay * 2, self.ReconnectDelayMax)
+
+
+	def _connection_made(self, transport):
+		self._connecting = False
+		if self._closed:
+			# The handler has been closed while connecting
+			transport.close()
 			return
+		self._transport = transport
+		self._write_paused = False
+		self._reconnect_delay = self.ReconnectDelayMin
+		self._reported_error = False
+		self._flush()
 
-		self._loop.add_writer(self._socket, self._on_write)
-		self._loop.add_reader(self._socket, self._on_read)
 
+	def _connection_lost(self, exc):
+		self._transport = None
+		if self._closed:
+			return
+		if exc is not None and not self._reported_error:
+			print("Error on the syslog socket '{}'".format(self._address), exc, file=sys.stderr)
+			self._reported_error = True
 
-	def _on_write(self):
-		self._write_ready = True
-		self._loop.remove_writer(self._socket)
+		if not self._loop.is_closed():
+			self._loop.call_later(self._reconnect_delay, self._connect)
+			self._reconnect_delay = min(self._reconnect_delay * 2, self.ReconnectDelayMax)
 
-		while not self._queue.empty():
-			# TODO: Handle eventual error in writing -> break the cycle and restart on write handler
-			msg = self._queue.get_nowait()
-			self._socket.sendall(msg)
 
+	def _pause_writing(self):
+		self._write_paused = True
 
-	def _on_read(self):
-		try:
-			_ = self._socket.recvfrom(1024)
-			# We receive "something" ... let's ignore that!
-			return
-		except Exception as e:
-			print("Error on the syslog socket '{}'".format(self._address), e, file=sys.stderr)
 
-		# Close a socket - there is no reason for reading or socket is actually closed
-		self._reset()
+	def _resume_writing(self):
+		self._write_paused = False
+		self._schedule_flush()
 
 
 	def emit(self, record):
@@ -436,25 +896,247 @@ It implements a queue for decoupling logging from a networking. The networking i
 		'''
 		try:
 			msg = self.format(record).encode('utf-8')
+		except Exception as e:
+			print("Error when emit to syslog '{}'".format(self._address), e, file=sys.stderr)
+			self.handleError(record)
+			return
+
+		if threading.get_ident() == self._thread_id:
+			self._send([msg])
+		else:
+			# The buffer is owned by the event loop thread
+			try:
+				self._loop.call_soon_threadsafe(self._send, [msg])
+			except RuntimeError:
+				# The event loop is closed
+				pass
+
+
+	def _send(self, msgs):
+		'''
+		Append encoded messages into the buffer, it is called on the event loop thread.
+		'''
+		octet_counting = self._type == socket.SOCK_STREAM and isinstance(self.formatter, SyslogRFC5424Formatter)
+		json_lines = self._type == socket.SOCK_STREAM and isinstance(self.formatter, JSONFormatter)
+
+		for msg in msgs:
+			if octet_counting:
+				msg = b"%d %s" % (len(msg), msg)
+			elif json_lines:
+				msg = msg + b"\n"
+
+			if self.BufferedBytes + len(msg) > self._buffer_size:
+				self.Dropped += 1
+				self.DroppedBytes += len(msg)
+				continue
+
+			self._buffer.append(msg)
+			self.BufferedBytes += len(msg)
+
+		self._schedule_flush()
+
+
+	def _schedule_flush(self):
+		if self._flush_scheduled or self._loop.is_closed():
+			return
+		self._flush_scheduled = True
+		self._loop.call_soon(self._flush)
+
+
+	def _flush(self):
+		self._flush_scheduled = False
+		if self._transport is None or self._write_paused or len(self._buffer) == 0:
+			return
+
+		try:
+			if self._type == socket.SOCK_DGRAM:
+				while len(self._buffer) > 0 and not self._write_paused:
+					msg = self._buffer.popleft()
+					self.BufferedBytes -= len(msg)
+					self._transport.sendto(msg)
+
+			else:
+				data = b"".join(self._buffer)
+				self._buffer.clear()
+				self.BufferedBytes = 0
+				self._transport.write(data)
+
+		except Exception as e:
+			print("Error when writing to syslog '{}'".format(self._address), e, file=sys.stderr)
+
+
+	def close(self):
+		self._closed = True
+		if self._transport is not None and not self._loop.is_closed():
+			self._flush()
+			self._transport.close()
+			self._transport = None
+		super().close()
+
+
+class _SyslogProtocol(asyncio.Protocol, asyncio.DatagramProtocol):
+
+	def __init__(self, handler):
+		self.Handler = handler
+
+	def connection_made(self, transport):
+		self.Handler._connection_made(transport)
+
+	def connection_lost(self, exc):
+		self.Handler._connection_lost(exc)
+
+	def pause_writing(self):
+		self.Handler._pause_writing()
+
+	def resume_writing(self):
+		self.Handler._resume_writing()
+
+	def data_received(self, data):
+		# We receive "something" ... let's ignore that!
+		pass
+
+	def datagram_received(self, data, addr):
+		pass
+
+	def error_received(self, exc):
+		# E.g. the syslog server is not listening, datagrams are lost
+		pass
+
+
+class QueueLogHandler(logging.Handler):
+
+	'''
+A logging handler that decouples the logging from the event loop.
+Records are only appended to a bounded queue in ``emit()``,
+a dedicated writer thread formats them and writes them by batches to the target ``handlers``.
+File and stream handlers receive the whole batch in one buffered write followed by one flush.
+
+When the queue is full, new records are dropped, the number of dropped records is in ``Dropped``
+and it is reported by the writer thread.
+Records remaining in the queue are written when the handler is closed (i.e. at ``logging.shutdown()`` on exit).
+	'''
+
+	def __init__(self, handlers, maxsize=10000):
+		logging.Handler.__init__(self)
+
+		self.Handlers = handlers
+		self.MaxSize = maxsize
+		self.Queue = collections.deque()
+		self.Dropped = 0
+		self.ReportedDropped = 0
+
+		self.Wakeup = threading.Event()
+		self.Closing = False
+		self.Writer = threading.Thread(target=self._writer, name="AsabLogWriter", daemon=True)
+		self.Writer.start()
+
 
-			if self._write_ready:
+	def emit(self, record):
+		'''
+		This is the entry point for log entries, it is called on the event loop thread so it does a minimal work.
+		'''
+		if len(self.Queue) >= self.MaxSize:
+			self.Dropped += 1
+			return
+
+		if record.args:
+			# Arguments can be mutated before the record is formatted
+			record.msg = get_message(record)
+			record.args = None
+
+		self.Queue.append(record)
+		if not self.Wakeup.is_set():
+			self.Wakeup.set()
+
+
+	def flush(self):
+		'''
+		Wait until the queue is written.
+		'''
+		while len(self.Queue) > 0 and self.Writer.is_alive():
+			time.sleep(0.01)
+
+
+	def close(self):
+		if not self.Closing:
+			self.Closing = True
+			self.Wakeup.set()
+			self.Writer.join(timeout=5)
+			# Write what remains (e.g. when the writer thread didn't finish in time)
+			self._drain()
+		super().close()
+
+
+	def _writer(self):
+		while not self.Closing:
+			self.Wakeup.wait()
+			self.Wakeup.clear()
+			self._drain()
+
+
+	def _drain(self):
+		while len(self.Queue) > 0:
+			batch = []
+			try:
+				while len(batch) < 1000:
+					batch.append(self.Queue.popleft())
+			except IndexError:
+				pass
+
+			if self.Dropped > self.ReportedDropped:
+				record = logging.LogRecord(
+					__name__, logging.WARNING, __file__, 0,
+					"{} log records dropped, the log queue is full".format(self.Dropped - self.ReportedDropped),
+					None, None
+				)
+				self.ReportedDropped = self.Dropped
+				batch.append(record)
+
+			for handler in self.Handlers:
 				try:
-					self._socket.sendall(msg)
+					self._write(handler, batch)
 				except Exception as e:
-					print("Error when writing to syslog '{}'".format(self._address), e, file=sys.stderr)
-					self._enqueue(msg)
+					print("Error when writing logs by '{}'".format(handler), e, file=sys.stderr)
 
-			else:
-				self._enqueue(record)
 
+	def _write(self, handler, batch):
+		records = [record for record in batch if record.levelno >= handler.level and handler.filter(record)]
+		if len(records) == 0:
+			return
 
-		except Exception as e:
-			print("Error when emit to syslog '{}'".format(self._address), e, file=sys.stderr)
-			self.handleError(record)
+		if isinstance(handler, AsyncIOHandler):
+			# The socket of the handler is served by the event loop
+			msgs = [handler.format(record).encode('utf-8') for record in records]
+			try:
+				handler._loop.call_soon_threadsafe(handler._send, msgs)
+			except RuntimeError:
+				# The event loop is closed
+				pass
+			return
+
+		if not isinstance(handler, logging.StreamHandler):
+			for record in records:
+				handler.handle(record)
+			return
+
+		with handler.lock:
+			for record in records:
+				try:
+					msg = handler.format(record) + handler.terminator
+				except Exception:
+					handler.handleError(record)
+					continue
+
+				if isinstance(handler, logging.FileHandler) and handler.stream is None:
+					handler.stream = handler._open()
+
+				if isinstance(handler, logging.handlers.RotatingFileHandler) and handler.maxBytes > 0:
+					if handler.stream.tell() + len(msg) >= handler.maxBytes:
+						handler.doRollover()
 
+				handler.stream.write(msg)
 
-	def _enqueue(self, record):
-		self._queue.put(record)
+			handler.flush()
 
 
 _RESET_SEQ = "\033[0m"
@@ -0,0 +1,160 @@
+import sys
+import time
+import logging
+import threading
+import traceback
+
+from .config import Config
+
+#
+
+L = logging.getLogger(__name__)
+
+#
+
+
+class LoopMonitor(object):
+	'''
+	Monitor of the health of the event loop.
+
+	A heartbeat callback is scheduled every `monitor_interval` seconds,
+	the lag of the event loop is the delay between the time when the heartbeat is due and when it is actually called.
+
+	A watchdog thread checks the heartbeat and when the event loop doesn't call it for `blocked_threshold` seconds,
+	the event loop is blocked (e.g. by a synchronous I/O in a handler).
+	The stack of the main thread is then logged, so that the offending code can be found.
+
+	The heartbeat runs only when it is needed, i.e. when the watchdog is enabled or the lag is measured by `LoopMetrics`.
+	'''
+
+	def __init__(self, app):
+		self.App = app
+		self.Loop = app.Loop
+
+		self.Interval = Config.getseconds('asab:loop', 'monitor_interval')
+		self.BlockedThreshold = Config.getseconds('asab:loop', 'blocked_threshold')
+
+		self.MaxLag = 0.0
+		self.Blocked = 0  # Number of detected blocks of the event loop
+		self.Metrics = None  # LoopMetrics, set by MetricsService
+
+		self.Heartbeat = None  # Monotonic time of the last heartbeat
+		self.Handle = None
+		self.Watchdog = None
+		self.Stopped = threading.Event()
+		self.MainThreadId = threading.get_ident()
+
+
+	def start(self):
+		if self.Interval <= 0 or self.Handle is not None:
+			return
+
+		if self.BlockedThreshold <= 0 and self.Metrics is None:
+			# Nobody consumes the heartbeat
+			return
+
+		self.Heartbeat = time.monotonic()
+		self.Handle = self.Loop.call_later(self.Interval, self._heartbeat, self.Loop.time() + self.Interval)
+
+		if self.BlockedThreshold > 0:
+			self.Stopped.clear()
+			self.MainThreadId = threading.get_ident()
+			self.Watchdog = threading.Thread(target=self._watchdog, name="AsabLoopWatchdog", daemon=True)
+			self.Watchdog.start()
+
+
+	def stop(self):
+		if self.Handle is not None:
+			self.Handle.cancel()
+			self.Handle = None
+
+		if self.Watchdog is not None:
+			self.Stopped.set()
+			self.Watchdog.join()
+			self.Watchdog = None
+
+
+	def reset_max_lag(self):
+		'''
+		Returns the maximum lag since the last call and resets it.
+		'''
+		max_lag = self.MaxLag
+		self.MaxLag = 0.0
+		return max_lag
+
+
+	def _heartbeat(self, due):
+		now = self.Loop.time()
+		lag = max(now - due, 0.0)
+		self.Heartbeat = time.monotonic()
+
+		if lag > self.MaxLag:
+			self.MaxLag = lag
+		if self.Metrics is not None:
+			self.Metrics.lag(lag)
+
+		self.Handle = self.Loop.call_later(self.Interval, self._heartbeat, now + self.Interval)
+
+
+	def _watchdog(self):
+		reported = False
+		while not self.Stopped.wait(min(self.Interval, self.BlockedThreshold)):
+			blocked_for = time.monotonic() - self.Heartbeat
+			if blocked_for < self.BlockedThreshold + self.Interval:
+				reported = False
+				continue
+
+			if reported:
+				# Report the block only once
+				continue
+			reported = True
+			self.Blocked += 1
+
+			frame = sys._current_frames().get(self.MainThreadId)
+			if frame is None:
+				continue
+
+			stack = traceback.extract_stack(frame, limit=20)
+			L.warning(
+				"Event loop is blocked for {:.1f} seconds in {}:{} {}()\n{}".format(
+					blocked_for, stack[-1].filename, stack[-1].lineno, stack[-1].name, "".join(stack.format())
+				),
+				struct_data={"blocked": round(blocked_for, 3)}
+			)
+
+
+class LoopMetrics(object):
+	'''
+	Metrics of the event loop:
+
+	* `asab.loop.lag` histogram of the lag of the event loop
+	* `asab.loop` gauge with `lag_max` (the maximum lag in the last flush period) and `blocked` (the number of detected blocks)
+	'''
+
+	Buckets = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10]
+
+	def __init__(self, loop_monitor, metrics_svc):
+		self.LoopMonitor = loop_monitor
+
+		self.Histogram = metrics_svc.create_histogram(
+			"asab.loop.lag",
+			buckets=self.Buckets,
+			unit="seconds",
+			help="Lag of the event loop.",
+		)
+		self.Gauge = metrics_svc.create_gauge(
+			"asab.loop",
+			init_values={"lag_max": 0.0, "blocked": 0},
+			help="Health of the event loop.",
+		)
+
+		loop_monitor.App.PubSub.subscribe("Metrics.flush!", self._on_flushing_event)
+
+
+	def lag(self, lag):
+		self.Histogram.set("lag", lag)
+
+
+	def _on_flushing_event(self, message_type):
+		self.Gauge.set("lag_max", self.LoopMonitor.reset_max_lag())
+		self.Gauge.set("blocked", self.LoopMonitor.Blocked)
@@ -0,0 +1,82 @@
+import collections
+import logging
+
+#
+
+L = logging.getLogger(__name__)
+
+#
+
+
+class RetryBuffer(object):
+	'''
+	Bounded in-memory buffer of payloads of a metrics target.
+
+	Each flush window appends its payload, the target then sends payloads from the oldest one in batches
+	and removes them from the buffer once they are delivered.
+	Payloads that fail to be delivered stay in the buffer and they are resent with the next flush.
+	When the buffer is full, the oldest payload is dropped.
+
+	The depth of the buffer is reported by the `asab.metrics.target` gauge.
+	'''
+
+	def __init__(self, metrics_svc, target_name, max_size, max_batch_bytes):
+		self.Payloads = collections.deque()
+		self.MaxSize = max_size
+		self.MaxBatchBytes = max_batch_bytes
+		self.Bytes = 0
+		self.Dropped = 0
+
+		self.Gauge = metrics_svc.create_gauge(
+			"asab.metrics.target",
+			tags={"target": target_name},
+			init_values={"buffered": 0, "buffered_bytes": 0, "dropped": 0},
+			help="Payloads of the metrics target that wait for a delivery.",
+		)
+
+
+	def __len__(self):
+		return len(self.Payloads)
+
+
+	def append(self, payload):
+		self.Payloads.append(payload)
+		self.Bytes += len(payload)
+
+		while len(self.Payloads) > self.MaxSize:
+			dropped = self.Payloads.popleft()
+			self.Bytes -= len(dropped)
+			self.Dropped += 1
+			L.warning("Metrics buffer of the target is full, the oldest payload is dropped", struct_data={"target": self.Gauge.StaticTags.get("target")})
+
+		self._update_gauge()
+
+
+	def batch(self):
+		'''
+		Returns the oldest payloads that fit into `max_batch_bytes` (at least one payload).
+		'''
+		batch = []
+		size = 0
+		for payload in self.Payloads:
+			if len(batch) > 0 and size + len(payload) > self.MaxBatchBytes:
+				break
+			batch.append(payload)
+			size += len(payload)
+		return batch
+
+
+	def commit(self, count):
+		'''
+		Remove `count` oldest payloads, they have been delivered.
+		'''
+		for _ in range(count):
+			payload = self.Payloads.popleft()
+			self.Bytes -= len(payload)
+		self._update_gauge()
+
+
+	def _update_gauge(self):
+		self.Gauge.set("buffered", len(self.Payloads))
+		self.Gauge.set("buffered_bytes", self.Bytes)
+		self.Gauge.set("dropped", self.Dropped)
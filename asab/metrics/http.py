@@ -1,8 +1,11 @@
+import gzip
+import asyncio
 import logging
 import aiohttp
-import copy
 
 import asab
+from ..web.rest.json import JSONDumper
+from .buffer import RetryBuffer
 
 #
 
@@ -13,18 +16,96 @@ L = logging.getLogger(__name__)
 
 class HTTPTarget(asab.ConfigObject):
 
+	ConfigDefaults = {
+		'compression': '',  # Compression of request bodies, 'gzip' or '' for none
+		'timeout': '30s',  # Timeout of a request (e.g. 30s)
+		'interval': '',  # Push interval of the target (e.g. 60s), empty means every flush of metrics
+		'buffer_size': 60,  # Maximum number of flush windows kept when the HTTP server is not available
+		'batch_max_bytes': 5000000,  # Maximum size of the batch of buffered flush windows sent in one request
+	}
+
+
 	def __init__(self, svc, config_section_name, config=None):
 		super().__init__(config_section_name, config)
 		self.URL = self.Config.get('url')
+		self.Timeout = self.Config.getseconds('timeout')
+
+		self.Headers = {'Content-Type': 'application/json'}
+		self.Compression = self.Config.get('compression')
+		if self.Compression == 'gzip':
+			self.Headers['Content-Encoding'] = 'gzip'
+		elif self.Compression != '':
+			raise RuntimeError("Unknown compression '{}' of HTTP target".format(self.Compression))
+
+		interval = self.Config.get('interval')
+		self.Interval = self.Config.getseconds('interval') if interval != '' else None
+
+		# Serialized flush windows that wait for a delivery
+		self.RetryBuffer = RetryBuffer(
+			svc,
+			config_section_name,
+			max_size=self.Config.getint('buffer_size'),
+			max_batch_bytes=self.Config.getint('batch_max_bytes'),
+		)
+		self.Lock = asyncio.Lock()
+
+		# JSONDumper serializes also objects that provide `rest_get()`, such as quantile sketches
+		self.Dumper = JSONDumper(pretty=False)
+
+		# Long-lived HTTP session, created on the first use
+		self.Session = None
 
 
 	async def process(self, metrics, now):
-		metrics_to_send = copy.deepcopy(metrics)
-		for metrics in metrics_to_send:
-			if metrics.get("@timestamp") is None:
-				metrics["@timestamp"] = now
-		async with aiohttp.ClientSession() as session:
-			async with session.post(self.URL, json=metrics_to_send) as resp:
+		# Metrics are a read-only snapshot with `@timestamp` already set, see `Storage.snapshot()`
+		payload = self.Dumper(metrics)
+
+		async with self.Lock:
+			self.RetryBuffer.append(payload)
+
+			# Send buffered flush windows, the oldest first
+			while len(self.RetryBuffer) > 0:
+				batch = self.RetryBuffer.batch()
+
+				# Each payload is a JSON list of metrics, the batch is sent as one list
+				body = "[{}]".format(",".join(payload[1:-1] for payload in batch if len(payload) > 2)).encode("utf-8")
+
+				if not await self._upload(body):
+					# Delivery failed, try again with the next flush
+					break
+
+				self.RetryBuffer.commit(len(batch))
+
+
+	async def close(self):
+		if self.Session is not None:
+			await self.Session.close()
+			self.Session = None
+
+
+	async def _upload(self, body):
+		'''
+		Returns True if the batch is done (delivered or rejected) and False if it should be sent again later.
+		'''
+		if self.Compression == 'gzip':
+			body = gzip.compress(body, compresslevel=6)
+
+		if self.Session is None:
+			self.Session = aiohttp.ClientSession(headers=self.Headers, timeout=aiohttp.ClientTimeout(total=self.Timeout))
+
+		try:
+			async with self.Session.post(self.URL, data=body) as resp:
 				response = await resp.text()
-				if resp.status != 200:
-					L.warning("Error when sending metrics by HTTPTarget: {}\n{}".format(resp.status, response))
+		except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+			L.error("Failed to send metrics by HTTPTarget to {}: {}".format(self.URL, e))
+			return False
+
+		if resp.status == 200:
+			return True
+
+		if resp.status >= 500 or resp.status == 429:
+			L.warning("Error when sending metrics by HTTPTarget, will retry: {}\n{}".format(resp.status, response))
+			return False
+
+		L.warning("Error when sending metrics by HTTPTarget: {}\n{}".format(resp.status, response))
+		return True
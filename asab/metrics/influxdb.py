@@ -1,3 +1,5 @@
+import gzip
+import asyncio
 import logging
 import aiohttp
 import urllib
@@ -5,6 +7,8 @@ import http.client
 
 import asab
 
+from .buffer import RetryBuffer
+
 #
 
 L = logging.getLogger(__name__)
@@ -47,6 +51,11 @@ InfluxDB <1.8 API parameters:
 		'username': '',
 		'password': '',
 		'proactor': True,  # Use ProactorService to send metrics on thread
+		'compression': '',  # Compression of request bodies, 'gzip' or '' for none
+		'timeout': '30s',  # Timeout of a request (e.g. 30s)
+		'interval': '',  # Push interval of the target (e.g. 60s), empty means every flush of metrics
+		'buffer_size': 60,  # Maximum number of flush windows kept when the InfluxDB is not available
+		'batch_max_bytes': 5000000,  # Maximum size of the batch of buffered flush windows sent in one request
 	}
 
 
@@ -81,7 +90,30 @@ InfluxDB <1.8 API parameters:
 		if token is not None:
 			self.Headers = {'Authorization': 'Token {}'.format(token)}
 
+		self.Compression = self.Config.get('compression')
+		if self.Compression == 'gzip':
+			self.Headers['Content-Encoding'] = 'gzip'
+		elif self.Compression != '':
+			raise RuntimeError("Unknown compression '{}' of InfluxDB target".format(self.Compression))
+
 		self.WriteURL = "{}{}".format(self.BaseURL, self.WriteRequest)
+		self.Timeout = self.Config.getseconds('timeout')
+
+		interval = self.Config.get('interval')
+		self.Interval = self.Config.getseconds('interval') if interval != '' else None
+
+		# Flush windows that wait for a delivery into the InfluxDB
+		self.RetryBuffer = RetryBuffer(
+			svc,
+			config_section_name,
+			max_size=self.Config.getint('buffer_size'),
+			max_batch_bytes=self.Config.getint('batch_max_bytes'),
+		)
+		self.Lock = asyncio.Lock()
+
+		# Long-lived HTTP session (respective connection for a proactor), created on the first use
+		self.Session = None
+		self.Connection = None
 
 		# Proactor service is used for alternative delivery of the metrics into the InfluxDB
 		# It is handly when a main loop can become very busy
@@ -103,40 +135,92 @@ InfluxDB <1.8 API parameters:
 
 
 	async def process(self, m_tree, now):
-
 		rb = influxdb_format(m_tree, now)
 
-		if self.ProactorService is not None:
-			await self.ProactorService.execute(self._worker_upload, m_tree, rb)
+		async with self.Lock:
+			self.RetryBuffer.append(rb)
+
+			# Send buffered flush windows, the oldest first
+			while len(self.RetryBuffer) > 0:
+				batch = self.RetryBuffer.batch()
+				body = ''.join(batch).encode('utf-8')
+
+				if self.ProactorService is not None:
+					done = await self.ProactorService.execute(self._worker_upload, body)
+				else:
+					done = await self._upload(body)
+
+				if not done:
+					# Delivery failed, try again with the next flush
+					break
+
+				self.RetryBuffer.commit(len(batch))
+
+
+	async def close(self):
+		if self.Session is not None:
+			await self.Session.close()
+			self.Session = None
+
+		if self.Connection is not None:
+			self.Connection.close()
+			self.Connection = None
 
-		else:
-			try:
-				async with aiohttp.ClientSession(headers=self.Headers) as session:
-					async with session.post(self.WriteURL, data=rb) as resp:
-						response = await resp.text()
-						if resp.status != 204:
-							L.warning("Error when sending metrics to Influx: {}\n{}".format(resp.status, response))
-			except aiohttp.client_exceptions.ClientConnectorError:
-				L.error("Failed to connect to InfluxDB at {}".format(self.BaseURL))
-
-	def _worker_upload(self, m_tree, rb):
-
-		if self.BaseURL.startswith("https://"):
-			conn = http.client.HTTPSConnection(self.BaseURL.replace("https://", ""))
-		else:
-			conn = http.client.HTTPConnection(self.BaseURL.replace("http://", ""))
+
+	async def _upload(self, body):
+		if self.Compression == 'gzip':
+			body = gzip.compress(body, compresslevel=6)
+
+		if self.Session is None:
+			self.Session = aiohttp.ClientSession(headers=self.Headers, timeout=aiohttp.ClientTimeout(total=self.Timeout))
+
+		try:
+			async with self.Session.post(self.WriteURL, data=body) as resp:
+				response = await resp.text()
+		except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+			L.error("Failed to send metrics to InfluxDB at {}: {}".format(self.BaseURL, e))
+			return False
+
+		return self._check_response(resp.status, response)
+
+
+	def _worker_upload(self, body):
+		if self.Compression == 'gzip':
+			body = gzip.compress(body, compresslevel=6)
+
+		if self.Connection is None:
+			if self.BaseURL.startswith("https://"):
+				self.Connection = http.client.HTTPSConnection(self.BaseURL.replace("https://", ""), timeout=self.Timeout)
+			else:
+				self.Connection = http.client.HTTPConnection(self.BaseURL.replace("http://", ""), timeout=self.Timeout)
 
 		try:
-			conn.request("POST", self.WriteRequest, rb, self.Headers)
-		except ConnectionRefusedError:
-			L.error("Failed to connect to InfluxDB at {}".format(self.BaseURL))
-			return
+			self.Connection.request("POST", self.WriteRequest, body, self.Headers)
+			response = self.Connection.getresponse()
+			# The response has to be read completely, so that the connection can be reused
+			text = response.read().decode("utf-8")
+		except (OSError, http.client.HTTPException) as e:
+			L.error("Failed to send metrics to InfluxDB at {}: {}".format(self.BaseURL, e))
+			self.Connection.close()
+			self.Connection = None
+			return False
 
-		response = conn.getresponse()
-		if response.status != 204:
-			L.warning("Error when sending metrics to Influx: {}\n{}".format(
-				response.status, response.read().decode("utf-8"))
-			)
+		return self._check_response(response.status, text)
+
+
+	def _check_response(self, status, response):
+		'''
+		Returns True if the batch is done (delivered or rejected) and False if it should be sent again later.
+		'''
+		if 200 <= status < 300:
+			return True
+
+		if status >= 500 or status == 429:
+			L.warning("Error when sending metrics to Influx, will retry: {}\n{}".format(status, response))
+			return False
+
+		L.warning("Error when sending metrics to Influx: {}\n{}".format(status, response))
+		return True
 
 
 
@@ -191,6 +275,28 @@ def metric_to_influxdb(metric_record, now):
 			values_lines.append(build_metric_line(field.get("tags").copy(), {"sum": field.get("values").get("sum")}))
 			values_lines.append(build_metric_line(field.get("tags").copy(), {"count": field.get("values").get("count")}))
 
+	elif metric_type in ["Summary", "SummaryWithDynamicTags"]:
+		quantiles = metric_record.get("quantiles")
+		for field in fieldset:
+			sketches = {
+				v_name: sketch
+				for v_name, sketch in field.get("values").items()
+				if sketch.Count > 0
+			}
+			# SKIP empty fields
+			if len(sketches) == 0:
+				continue
+			estimates = {v_name: sketch.quantiles(quantiles) for v_name, sketch in sketches.items()}
+			for i, quantile in enumerate(quantiles):
+				tags = field.get("tags").copy()
+				tags["quantile"] = str(quantile)
+				values_lines.append(build_metric_line(tags, {v_name: values[i] for v_name, values in estimates.items()}))
+			stats = {}
+			for v_name, sketch in sketches.items():
+				stats["{}_sum".format(v_name)] = float(sketch.Sum)
+				stats["{}_count".format(v_name)] = sketch.Count
+			values_lines.append(build_metric_line(field.get("tags").copy(), stats))
+
 	else:
 		for field in fieldset:
 			# SKIP empty fields
@@ -1,7 +1,11 @@
 import abc
-import copy
 import time
+import heapq
+import bisect
+import itertools
+import collections
 from .. import Config
+from .sketch import DDSketch
 
 
 class Metric(abc.ABC):
@@ -11,8 +15,10 @@ class Metric(abc.ABC):
 		self.Storage = None
 		self.StaticTags = dict()
 
-		# Expiration is relevant only to WithDynamicTagsMixIn metrics
+		# Expiration and cardinality limits are relevant only to WithDynamicTagsMixIn metrics
 		self.Expiration = float(Config.get("asab:metrics", "expiration"))
+		self.MaxSeries = Config.getint("asab:metrics", "max_series")
+		self.CardinalityPolicy = Config.get("asab:metrics", "cardinality_policy")
 
 	def _initialize_storage(self, storage: dict):
 		assert storage['type'] is None
@@ -256,35 +262,123 @@ class AggregationCounter(Counter):
 class Histogram(Metric):
 	"""
 	Creates cumulative histograms.
+
+	Observations are accounted in per-bucket (non-cumulative) counters, one flat list per value name.
+	The bucket is located by a bisection, the cumulative view is computed at flush time.
 	"""
 	def __init__(self, buckets: list):
 		super().__init__()
-		_buckets = [float(b) for b in buckets]
+		self.UpperBounds = _parse_buckets(buckets)
+		self.Init = _empty_histogram()
 
-		if _buckets != sorted(buckets):
-			raise ValueError("Buckets not in sorted order")
+	def _initialize_storage(self, storage: dict):
+		storage['buckets'] = _export_buckets(self.UpperBounds)
+		super()._initialize_storage(storage)
 
-		if _buckets and _buckets[-1] != float("inf"):
-			_buckets.append(float("inf"))
+	def add_field(self, tags):
+		field = {
+			"tags": tags,
+			"values": cumulative_histogram(self.UpperBounds, self.Init),
+			"actuals": _empty_histogram(),
+		}
+		self.Storage['fieldset'].append(field)
+		self._actuals = field['actuals']
+		return field
 
-		if len(_buckets) < 2:
-			raise ValueError("Must have at least two buckets")
+	def flush(self, now):
+		if self.Storage.get("reset") is True:
+			for field in self.Storage['fieldset']:
+				field['values'] = cumulative_histogram(self.UpperBounds, field['actuals'])
+				field['actuals'] = _empty_histogram()
+				self._actuals = field['actuals']
+		else:
+			for field in self.Storage['fieldset']:
+				field['values'] = cumulative_histogram(self.UpperBounds, field['actuals'])
 
-		self.InitBuckets = {b: dict() for b in _buckets}
-		self.Buckets = copy.deepcopy(self.InitBuckets)
-		self.Count = 0
-		self.Sum = 0.0
-		self.Init = {
-			"buckets": self.InitBuckets,
-			"sum": 0.0,
-			"count": 0
-		}
+	def set(self, value_name, value):
+		actuals = self._actuals
+		counts = actuals["buckets"].get(value_name)
+		if counts is None:
+			counts = actuals["buckets"][value_name] = [0] * len(self.UpperBounds)
+		counts[bisect.bisect_left(self.UpperBounds, value)] += 1
+		actuals["sum"] += value
+		actuals["count"] += 1
+
+
+def _parse_buckets(buckets):
+	_buckets = [float(b) for b in buckets]
+
+	if _buckets != sorted(buckets):
+		raise ValueError("Buckets not in sorted order")
+
+	if _buckets and _buckets[-1] != float("inf"):
+		_buckets.append(float("inf"))
+
+	if len(_buckets) < 2:
+		raise ValueError("Must have at least two buckets")
+
+	return _buckets
+
+
+def _export_buckets(upper_bounds):
+	'''
+	Upper bounds of buckets in the storage are exported (e.g. to JSON), the infinite bound is the string "+Inf".
+	Use `float()` to get the bound back.
+	'''
+	return [b if b != float("inf") else "+Inf" for b in upper_bounds]
+
+
+def _empty_histogram():
+	return {
+		"buckets": dict(),
+		"sum": 0.0,
+		"count": 0
+	}
+
+
+def cumulative_histogram(upper_bounds, actuals):
+	"""
+	Converts histogram actuals, where "buckets" is `{value_name: [count, ...]}` with per-bucket counts,
+	into the cumulative view `{upper_bound: {value_name: count}}` that is used by exporters.
+	"""
+	buckets = {upper_bound: dict() for upper_bound in upper_bounds}
+	for value_name, counts in actuals["buckets"].items():
+		total = 0
+		for upper_bound, count in zip(upper_bounds, counts):
+			total += count
+			if total > 0:
+				buckets[upper_bound][value_name] = total
+
+	return {
+		"buckets": buckets,
+		"sum": actuals["sum"],
+		"count": actuals["count"],
+	}
+
+
+class Summary(Metric):
+	"""
+	Computes quantiles (and a sum and a count) of observed values.
+
+	Each value name is tracked by a mergeable quantile sketch (see `DDSketch`) with a bounded memory.
+	"""
+
+	def __init__(self, quantiles, relative_accuracy=0.01, max_bins=2048):
+		super().__init__()
+		self.Quantiles = _parse_quantiles(quantiles)
+		self.RelativeAccuracy = relative_accuracy
+		self.MaxBins = max_bins
+		self.Init = dict()
+
+	def _initialize_storage(self, storage: dict):
+		storage['quantiles'] = self.Quantiles
+		super()._initialize_storage(storage)
 
 	def add_field(self, tags):
 		field = {
 			"tags": tags,
-			"values": copy.deepcopy(self.Init),
-			"actuals": copy.deepcopy(self.Init),
+			"values": dict(),
+			"actuals": dict(),
 		}
 		self.Storage['fieldset'].append(field)
 		self._actuals = field['actuals']
@@ -294,29 +388,56 @@ class Histogram(Metric):
 		if self.Storage.get("reset") is True:
 			for field in self.Storage['fieldset']:
 				field['values'] = field['actuals']
-				field['actuals'] = copy.deepcopy(self.Init)
+				field['actuals'] = dict()
 				self._actuals = field['actuals']
 		else:
 			for field in self.Storage['fieldset']:
-				field['values'] = copy.deepcopy(field['actuals'])
+				field['values'] = {k: v.copy() for k, v in field['actuals'].items()}
 
 	def set(self, value_name, value):
-		buckets = self._actuals["buckets"]
-		summary = self._actuals["sum"]
-		count = self._actuals["count"]
-		for upper_bound in buckets:
-			if value <= upper_bound:
-				if buckets[upper_bound].get(value_name) is None:
-					buckets[upper_bound][value_name] = 1
-				else:
-					buckets[upper_bound][value_name] += 1
-		self._actuals["sum"] = summary + value
-		self._actuals["count"] = count + 1
+		try:
+			self._actuals[value_name].add(value)
+		except KeyError:
+			sketch = self._actuals[value_name] = DDSketch(self.RelativeAccuracy, self.MaxBins)
+			sketch.add(value)
+
+	def merge(self, value_name, sketch):
+		"""
+		Merge a sketch collected elsewhere (e.g. by other process) into the actual values.
+		"""
+		try:
+			self._actuals[value_name].merge(sketch)
+		except KeyError:
+			self._actuals[value_name] = DDSketch(self.RelativeAccuracy, self.MaxBins)
+			self._actuals[value_name].merge(sketch)
+
+
+def _parse_quantiles(quantiles):
+	_quantiles = sorted(float(q) for q in quantiles)
+	if len(_quantiles) == 0:
+		raise ValueError("Must have at least one quantile")
+	for q in _quantiles:
+		if not 0.0 <= q <= 1.0:
+			raise ValueError("Quantile '{}' is not between 0 and 1".format(q))
+	return _quantiles
 
 ###
 
 
 class MetricWithDynamicTags(Metric):
+	"""
+	The number of series (fields) is limited by `MaxSeries` (0 means unlimited).
+	When the limit is reached, the `CardinalityPolicy` applies:
+
+	* `overflow`: updates of new series are merged into a single series tagged `overflow=true`
+	* `lru`: the least recently updated series is evicted and replaced by the new one
+
+	Series that are not updated for `Expiration` seconds are removed at flush.
+	Updates don't read the clock, they set `expires_at` of the field to `ExpiresAt`,
+	which is refreshed by MetricsService on every application tick and on flush.
+	Fields are scheduled for the expiration in a heap ordered by their `expires_at`,
+	so the flush visits only fields which scheduled expiration has passed.
+	"""
 
 
 	def _initialize_storage(self, storage: dict):
@@ -324,26 +445,147 @@ class MetricWithDynamicTags(Metric):
 			'type': self.__class__.__name__,
 		})
 		self.Storage = storage
+
+		if self.CardinalityPolicy not in ('overflow', 'lru'):
+			raise ValueError("Unknown cardinality policy '{}'".format(self.CardinalityPolicy))
+
+		# Index of fields by a canonical (sorted) tuple of tag items.
+		# A field is indexed both by the dynamic tags as provided by a caller and by its final tags (incl. static tags),
+		# so that dynamic tags shadowed by static tags resolve to the same field.
+		self.FieldIndex = dict()
+
+		# Series in the order of their last update (for `lru` policy), `id(field)` -> (field, keys in FieldIndex)
+		self.Series = collections.OrderedDict()
+		self.OverflowField = None
+		self.EvictedSeries = 0
+		self.OverflowedUpdates = 0
+		self.CardinalityGauge = None  # Created by MetricsService when the limit is reached
+
+		# Coarse clock of updates, see `refresh_expiration()`
+		self.ExpiresAt = self.App.time() + self.Expiration
+
+		# Heap of (scheduled expiration, sequence, field) and positions of fields in the fieldset by `id(field)`
+		self.ExpirationHeap = []
+		self.ExpirationSequence = itertools.count()
+		self.FieldPositions = dict()
+
 		if self.Init is not None:
-			self.add_field(self.StaticTags.copy())
+			field = self._add_tracked_field(self.StaticTags.copy())
+			self._index_field(field, [tuple(), tuple(sorted(field['tags'].items()))])
+
+
+	def refresh_expiration(self, now):
+		self.ExpiresAt = now + self.Expiration
+
+
+	def _add_tracked_field(self, tags):
+		field = self.add_field(tags)
+		self.FieldPositions[id(field)] = len(self.Storage['fieldset']) - 1
+		heapq.heappush(self.ExpirationHeap, (field['expires_at'], next(self.ExpirationSequence), field))
+		return field
 
 
 	def locate_field(self, tags):
-		fieldset = self.Storage['fieldset']
+		key = tuple(sorted(tags.items()))
+		try:
+			field = self.FieldIndex[key]
+		except KeyError:
+			return self._locate_new_field(tags, key)
+
+		if self.CardinalityPolicy == 'lru':
+			self.Series.move_to_end(id(field))
+		return field
+
+
+	def _locate_new_field(self, tags, key):
+		# Dynamic tags that shadow static tags are not indexed, so that the index cannot grow without limits
+		shadowing = any(tag in self.StaticTags for tag in tags)
 
 		tags = tags.copy()
 		tags.update(self.StaticTags)
+		field_key = tuple(sorted(tags.items()))
 
-		# Seek for field in the fieldset using tags
-		for field in fieldset:
-			if field['tags'] == tags:
-				return field
+		field = self.FieldIndex.get(field_key)
+		if field is not None:
+			if self.CardinalityPolicy == 'lru':
+				self.Series.move_to_end(id(field))
+			return field
+
+		keys = [field_key] if shadowing else [field_key, key]
+
+		if 0 < self.MaxSeries <= len(self.Series):
+			if self.CardinalityPolicy == 'lru':
+				return self._evict_field(tags, keys)
+			return self._overflow_field()
 
 		# Field not found, create a new one
-		field = self.add_field(tags)
+		field = self._add_tracked_field(tags)
+		self._index_field(field, keys)
 		return field
 
 
+	def _index_field(self, field, keys):
+		for key in keys:
+			self.FieldIndex[key] = field
+		self.Series[id(field)] = (field, keys)
+
+
+	def _evict_field(self, tags, keys):
+		_, (field, old_keys) = self.Series.popitem(last=False)
+		for key in old_keys:
+			self.FieldIndex.pop(key, None)
+		self.EvictedSeries += 1
+
+		# The evicted field is reused in place for the new series, so that the fieldset doesn't need to be rebuilt
+		new_field = self.add_field(tags)
+		self.Storage['fieldset'].pop()
+		field.clear()
+		field.update(new_field)
+
+		self._index_field(field, keys)
+		return field
+
+
+	def _overflow_field(self):
+		self.OverflowedUpdates += 1
+		if self.OverflowField is None:
+			tags = {"overflow": "true"}
+			tags.update(self.StaticTags)
+			self.OverflowField = self._add_tracked_field(tags)
+		return self.OverflowField
+
+
+	def _expire_fields(self, now):
+		self.refresh_expiration(now)
+
+		heap = self.ExpirationHeap
+		while len(heap) > 0 and heap[0][0] < now:
+			_, _, field = heapq.heappop(heap)
+			if field['expires_at'] >= now:
+				# The field has been updated since it was scheduled
+				heapq.heappush(heap, (field['expires_at'], next(self.ExpirationSequence), field))
+				continue
+			self._remove_field(field)
+
+
+	def _remove_field(self, field):
+		# The last field takes the position of the removed one, so that the fieldset is not rebuilt
+		fieldset = self.Storage['fieldset']
+		position = self.FieldPositions.pop(id(field))
+		last = fieldset.pop()
+		if last is not field:
+			fieldset[position] = last
+			self.FieldPositions[id(last)] = position
+
+		series = self.Series.pop(id(field), None)
+		if series is not None:
+			for key in series[1]:
+				if self.FieldIndex.get(key) is field:
+					del self.FieldIndex[key]
+
+		if field is self.OverflowField:
+			self.OverflowField = None
+
 
 class CounterWithDynamicTags(MetricWithDynamicTags):
 
@@ -353,7 +595,7 @@ class CounterWithDynamicTags(MetricWithDynamicTags):
 			"tags": tags,
 			"values": self.Init.copy() if self.Init is not None else dict(),
 			"actuals": self.Init.copy() if self.Init is not None else dict(),
-			"expires_at": self.App.time() + self.Expiration,
+			"expires_at": self.ExpiresAt,
 		}
 		self.Storage['fieldset'].append(field)
 		return field
@@ -374,7 +616,7 @@ class CounterWithDynamicTags(MetricWithDynamicTags):
 		except KeyError:
 			actuals[name] = value
 
-		field["expires_at"] = self.App.time() + self.Expiration
+		field["expires_at"] = self.ExpiresAt
 
 	def sub(self, name, value, tags):
 		"""
@@ -392,15 +634,11 @@ class CounterWithDynamicTags(MetricWithDynamicTags):
 		except KeyError:
 			actuals[name] = -value
 
-		field["expires_at"] = self.App.time() + self.Expiration
+		field["expires_at"] = self.ExpiresAt
 
 	def flush(self, now):
-		# Filter expired fields
-		# TODO: Refactor this into for-based scan from the end
-		self.Storage["fieldset"] = [
-			field for field in self.Storage["fieldset"]
-			if field["expires_at"] >= now
-		]
+		# Remove expired fields
+		self._expire_fields(now)
 
 		if self.Storage.get("reset") is True:
 			for field in self.Storage['fieldset']:
@@ -429,7 +667,7 @@ class AggregationCounterWithDynamicTags(CounterWithDynamicTags):
 		except KeyError:
 			actuals[name] = value
 
-		field["expires_at"] = self.App.time() + self.Expiration
+		field["expires_at"] = self.ExpiresAt
 
 	def add(self, name, value, tags):
 		raise NotImplementedError("Do not use add() method with AggregationCounter. Use set() instead.")
@@ -445,65 +683,107 @@ class HistogramWithDynamicTags(MetricWithDynamicTags):
 
 	def __init__(self, buckets: list):
 		super().__init__()
-		_buckets = [float(b) for b in buckets]
+		self.UpperBounds = _parse_buckets(buckets)
+		self.Init = _empty_histogram()
 
-		if _buckets != sorted(buckets):
-			raise ValueError("Buckets not in sorted order")
+	def _initialize_storage(self, storage: dict):
+		storage['buckets'] = _export_buckets(self.UpperBounds)
+		super()._initialize_storage(storage)
 
-		if _buckets and _buckets[-1] != float("inf"):
-			_buckets.append(float("inf"))
+	def add_field(self, tags):
+		field = {
+			"tags": tags,
+			"values": cumulative_histogram(self.UpperBounds, self.Init),
+			"actuals": _empty_histogram(),
+			"expires_at": self.ExpiresAt,
+		}
+		self.Storage['fieldset'].append(field)
+		return field
 
-		if len(_buckets) < 2:
-			raise ValueError("Must have at least two buckets")
+	def flush(self, now):
+		# Remove expired fields
+		self._expire_fields(now)
 
-		self.InitBuckets = {b: dict() for b in _buckets}
-		self.Buckets = copy.deepcopy(self.InitBuckets)
-		self.Count = 0
-		self.Sum = 0.0
-		self.Init = {
-			"buckets": self.InitBuckets,
-			"sum": 0.0,
-			"count": 0
-		}
+		if self.Storage.get("reset") is True:
+			for field in self.Storage['fieldset']:
+				field['values'] = cumulative_histogram(self.UpperBounds, field['actuals'])
+				field['actuals'] = _empty_histogram()
+		else:
+			for field in self.Storage['fieldset']:
+				field['values'] = cumulative_histogram(self.UpperBounds, field['actuals'])
+
+	def set(self, value_name, value, tags):
+		field = self.locate_field(tags)
+		actuals = field["actuals"]
+		counts = actuals["buckets"].get(value_name)
+		if counts is None:
+			counts = actuals["buckets"][value_name] = [0] * len(self.UpperBounds)
+		counts[bisect.bisect_left(self.UpperBounds, value)] += 1
+		actuals["sum"] += value
+		actuals["count"] += 1
+
+		field["expires_at"] = self.ExpiresAt
+
+
+class SummaryWithDynamicTags(MetricWithDynamicTags):
+	"""
+	Computes quantiles (and a sum and a count) of observed values with dynamic tags
+	"""
+
+	def __init__(self, quantiles, relative_accuracy=0.01, max_bins=2048):
+		super().__init__()
+		self.Quantiles = _parse_quantiles(quantiles)
+		self.RelativeAccuracy = relative_accuracy
+		self.MaxBins = max_bins
+		self.Init = dict()
+
+	def _initialize_storage(self, storage: dict):
+		storage['quantiles'] = self.Quantiles
+		super()._initialize_storage(storage)
 
 	def add_field(self, tags):
 		field = {
 			"tags": tags,
-			"values": copy.deepcopy(self.Init),
-			"actuals": copy.deepcopy(self.Init),
-			"expires_at": self.App.time() + self.Expiration,
+			"values": dict(),
+			"actuals": dict(),
+			"expires_at": self.ExpiresAt,
 		}
 		self.Storage['fieldset'].append(field)
 		return field
 
 	def flush(self, now):
-		# Filter expired fields
-		# TODO: Refactor this into for-based scan from the end
-		self.Storage["fieldset"] = [
-			field for field in self.Storage["fieldset"]
-			if field["expires_at"] >= now
-		]
+		# Remove expired fields
+		self._expire_fields(now)
 
 		if self.Storage.get("reset") is True:
 			for field in self.Storage['fieldset']:
 				field['values'] = field['actuals']
-				field['actuals'] = copy.deepcopy(self.Init)
+				field['actuals'] = dict()
 		else:
 			for field in self.Storage['fieldset']:
-				field['values'] = copy.deepcopy(field['actuals'])
+				field['values'] = {k: v.copy() for k, v in field['actuals'].items()}
 
 	def set(self, value_name, value, tags):
 		field = self.locate_field(tags)
-		buckets = field.get("actuals").get("buckets")
-		summary = field.get("actuals").get("sum")
-		count = field.get("actuals").get("count")
-		for upper_bound in buckets:
-			if value <= upper_bound:
-				if buckets[upper_bound].get(value_name) is None:
-					buckets[upper_bound][value_name] = 1
-				else:
-					buckets[upper_bound][value_name] += 1
-		field.get("actuals")["sum"] = summary + value
-		field.get("actuals")["count"] = count + 1
+		actuals = field["actuals"]
+		try:
+			actuals[value_name].add(value)
+		except KeyError:
+			sketch = actuals[value_name] = DDSketch(self.RelativeAccuracy, self.MaxBins)
+			sketch.add(value)
+
+		field["expires_at"] = self.ExpiresAt
+
+	def merge(self, value_name, sketch, tags):
+		"""
+		Merge a sketch collected elsewhere (e.g. by other process) into the actual values.
+		"""
+		field = self.locate_field(tags)
+		actuals = field["actuals"]
+		try:
+			actuals[value_name].merge(sketch)
+		except KeyError:
+			actuals[value_name] = DDSketch(self.RelativeAccuracy, self.MaxBins)
+			actuals[value_name].merge(sketch)
 
-		field["expires_at"] = self.App.time() + self.Expiration
+		field["expires_at"] = self.ExpiresAt
@@ -1,4 +1,7 @@
 import re
+import functools
+
+from .metrics import cumulative_histogram
 
 # HOW TO FULLFIL OPEMETRICS STANDARD
 
@@ -15,6 +18,8 @@ def metric_to_openmetric(m):
 	metric_lines = []
 	if m.get("type") in ["Histogram", "HistogramWithDynamicTags"]:
 		metric_type = "histogram"
+	elif m.get("type") in ["Summary", "SummaryWithDynamicTags"]:
+		metric_type = "summary"
 	elif m.get("type") in ["Counter", "CounterWithDynamicTags", "AggregationCounterWithDynamicTags"] and m.get("reset") is False:
 		metric_type = "counter"
 	else:
@@ -32,7 +37,7 @@ def metric_to_openmetric(m):
 	if metric_type == "histogram":
 		for field in fieldset:
 			if m.get("reset") is False:
-				values = field.get("actuals")
+				values = cumulative_histogram([float(b) for b in m.get("buckets")], field.get("actuals"))
 			else:
 				values = field.get("values")
 
@@ -52,6 +57,25 @@ def metric_to_openmetric(m):
 			metric_lines.append(translate_value(name + "_count", None, values.get("count"), metric_type, field.get("tags")))
 			metric_lines.append(translate_value(name + "_sum", None, values.get("sum"), metric_type, field.get("tags")))
 
+	elif metric_type == "summary":
+		quantiles = m.get("quantiles")
+		for field in fieldset:
+			if m.get("reset") is False:
+				values = field.get("actuals")
+			else:
+				values = field.get("values")
+
+			for v_name, sketch in values.items():
+				# SKIP empty sketches
+				if sketch.Count == 0:
+					continue
+				for quantile, value in zip(quantiles, sketch.quantiles(quantiles)):
+					summary_labels = field.get("tags").copy()
+					summary_labels.update({"quantile": str(quantile)})
+					metric_lines.append(translate_value(name, v_name, value, metric_type, summary_labels))
+				metric_lines.append(translate_value(name + "_count", v_name, sketch.Count, metric_type, field.get("tags")))
+				metric_lines.append(translate_value(name + "_sum", v_name, sketch.Sum, metric_type, field.get("tags")))
+
 	else:
 		for field in fieldset:
 			if metric_type == "counter":
@@ -69,6 +93,7 @@ def metric_to_openmetric(m):
 	return metric_text
 
 
+@functools.lru_cache(maxsize=4096)
 def validate_format(name):
 	name = str(name)
 	regex = r"[a-zA-Z:][a-zA-Z0-9_:]*"
@@ -117,15 +142,38 @@ def validate_value(value):
 
 
 def translate_value(name, v_name, value, metric_type, labels_dict):
-	labels_dict = {validate_format(k): v for k, v in labels_dict.items()}
-	labels_str = get_value_labels(v_name, labels_dict)
+	try:
+		labels_str = _cached_value_labels(v_name, tuple(labels_dict.items()))
+	except TypeError:
+		# Unhashable tag value, cannot be cached
+		labels_str = get_value_labels(v_name, {validate_format(k): v for k, v in labels_dict.items()})
 
 	if metric_type == "counter":
 		name = name + "_total"
 
+	if labels_str is None:
+		return "{} {}".format(name, value)
 	return "{}{} {}".format(name, labels_str, value)
 
 
+@functools.lru_cache(maxsize=65536)
+def _cached_value_labels(v_name, label_items):
+	# Label strings are cached by tags of the field, so they are not rebuilt for every rendering of the metric
+	return get_value_labels(v_name, {validate_format(k): v for k, v in label_items})
+
+
+def renders_actuals(m):
+	"""
+	Returns True if the OpenMetrics output of the metric is rendered from actual values, i.e. it changes also between flushes.
+	"""
+	return m.get("reset") is False and m.get("type") in [
+		"Counter", "CounterWithDynamicTags",
+		"AggregationCounter", "AggregationCounterWithDynamicTags",
+		"Histogram", "HistogramWithDynamicTags",
+		"Summary", "SummaryWithDynamicTags",
+	]
+
+
 def get_value_labels(v_name, labels_dict):
 	if v_name is not None:
 		labels_dict.update({"name": v_name})
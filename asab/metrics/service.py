@@ -1,3 +1,6 @@
+import os
+import math
+import time
 import configparser
 import logging
 import asyncio
@@ -5,10 +8,10 @@ import asyncio
 from ..config import Config
 from ..abc import Service
 from .metrics import (
-	Metric, Counter, EPSCounter, Gauge, DutyCycle, AggregationCounter, Histogram,
-	CounterWithDynamicTags, AggregationCounterWithDynamicTags, HistogramWithDynamicTags
+	Metric, MetricWithDynamicTags, Counter, EPSCounter, Gauge, DutyCycle, AggregationCounter, Histogram, Summary,
+	CounterWithDynamicTags, AggregationCounterWithDynamicTags, HistogramWithDynamicTags, SummaryWithDynamicTags
 )
-from .storage import Storage
+from .storage import Storage, accumulate
 
 
 #
@@ -26,12 +29,38 @@ class MetricsService(Service):
 
 		self.Metrics = []
 		self.Targets = []
+		self.TargetWindows = dict()  # Target -> snapshot accumulated since its last push, see `_process_targets()`
 		self.Tags = {
 			"host": app.HostName,
 		}
 		self.Storage = Storage()
 
-		app.PubSub.subscribe("Application.tick/60!", self._on_flushing_event)
+		# The read-only snapshot of the storage produced by the last flush, see `Storage.snapshot()`
+		self.Snapshot = None
+
+		# Metrics are flushed every `interval` seconds, windows are aligned to multiples of the interval since the epoch
+		# so that multiple instances of the application produce comparable windows
+		self.FlushInterval = Config.getseconds('asab:metrics', 'interval')
+		if self.FlushInterval <= 0:
+			raise ValueError("Invalid metrics flush interval '{}'".format(Config.get('asab:metrics', 'interval')))
+		self.FlushTask = None
+		self.FinalFlush = None  # Time of the final flush into the shared memory
+
+		# Flushed metrics of worker processes of the application can be aggregated over a shared memory
+		self.SharedMemory = None
+		shared_memory = Config.get('asab:metrics', 'shared_memory')
+		# The supervisor of workers doesn't produce metrics, it must not take a slot of a worker
+		if shared_memory != '' and not getattr(app, 'IsSupervisor', False):
+			from .shared import SharedMemoryMetrics
+			worker_id = os.environ.get('ASAB_WORKER_ID')
+			self.SharedMemory = SharedMemoryMetrics(
+				shared_memory,
+				slots=Config.getint('asab:metrics', 'shared_memory_slots'),
+				slot_size=Config.getint('asab:metrics', 'shared_memory_slot_size'),
+				interval=self.FlushInterval,
+				worker_id=int(worker_id) if worker_id is not None else None,
+			)
+			app.PubSub.subscribe("Application.exit!", self._on_exit)
 
 		if Config.has_option('asab:metrics', 'target'):
 			for target in Config.get('asab:metrics', 'target').split():
@@ -55,52 +84,225 @@ class MetricsService(Service):
 
 				self.Targets.append(target)
 
+		# Coarse clock of metrics with dynamic tags, so that their updates don't need to read the time
+		self.App.PubSub.subscribe("Application.tick!", self._on_tick)
+
 		if Config.getboolean('asab:metrics', 'native_metrics'):
 			from .native import NativeMetrics
 			self._native_svc = NativeMetrics(self.App, self)
 
+			from ..task import TaskMetrics
+			app.TaskService.Metrics = TaskMetrics(app.TaskService, self)
+
+			from ..loopmonitor import LoopMetrics
+			app.LoopMonitor.Metrics = LoopMetrics(app.LoopMonitor, self)
+
+
+	async def initialize(self, app):
+		self.FlushTask = asyncio.ensure_future(self._flushing_timer())
+
 
 	async def finalize(self, app):
-		await self._on_flushing_event("finalize!")
+		if self.FlushTask is not None:
+			self.FlushTask.cancel()
+			try:
+				await self.FlushTask
+			except asyncio.CancelledError:
+				pass
+			self.FlushTask = None
+
+		if self.FinalFlush is not None:
+			await self._process_targets(self.FinalFlush, final=True)
+		else:
+			await self._on_flushing_event("finalize!")
+
+		for target in self.Targets:
+			try:
+				await target.close()
+			except Exception:
+				L.exception("Exception during target.close()")
+
+		if self.SharedMemory is not None:
+			self.SharedMemory.close()
 
 
 	def clear(self):
 		self.Metrics.clear()
 		self.Storage.clear()
+		self.Snapshot = None
 
-	def _flush_metrics(self):
+	def _on_tick(self, message_type):
 		now = self.App.time()
+		for metric in self.Metrics:
+			if isinstance(metric, MetricWithDynamicTags):
+				metric.refresh_expiration(now)
+
+
+	def _flush_metrics(self, now=None):
+		if now is None:
+			now = self.App.time()
 
 		self.App.PubSub.publish("Metrics.flush!")
+		self._update_cardinality_gauges()
+
 		for metric in self.Metrics:
 			try:
 				metric.flush(now)
 			except Exception:
 				L.exception("Exception during metric.flush()")
 
+		self.Snapshot = self.Storage.snapshot(now)
+
+		if self.SharedMemory is not None:
+			try:
+				self.SharedMemory.publish(self.Storage.Metrics, now)
+			except Exception:
+				L.exception("Exception during publishing of metrics into the shared memory")
+
 		return now
 
+
+	def aggregated_metrics(self, since=None, until=None):
+		'''
+		Returns metrics to be exposed by exporters, i.e. the storage of this process
+		or the storage aggregated from all worker processes when the shared memory is configured.
+		`since` and `until` select flush windows of workers, see `SharedMemoryMetrics.aggregate()`.
+		'''
+		if self.SharedMemory is None:
+			return self.Storage.Metrics
+		return self.SharedMemory.aggregate(since, until)
+
+
+	def aggregated_snapshot(self, since=None, until=None):
+		'''
+		Returns metrics aggregated from all worker processes in the form of the snapshot, see `Storage.snapshot()`.
+		'''
+		return [
+			dict(
+				{k: v for k, v in metric.items() if k != 'fieldset'},
+				fieldset=[{'tags': field['tags'], 'values': field['values']} for field in metric['fieldset']]
+			)
+			for metric in self.aggregated_metrics(since, until)
+		]
+
+
+	def _update_cardinality_gauges(self):
+		'''
+		Report metrics with dynamic tags that reached their limit of series.
+		The gauge of a metric is created when the limit is reached for the first time.
+		'''
+		for metric in list(self.Metrics):
+			if not isinstance(metric, MetricWithDynamicTags):
+				continue
+
+			if metric.CardinalityGauge is None:
+				if metric.EvictedSeries == 0 and metric.OverflowedUpdates == 0:
+					continue
+				metric.CardinalityGauge = self.create_gauge(
+					"asab.metrics.cardinality",
+					tags={"metric": metric.Storage['name']},
+					help="Series of the metric that exceeded its limit of series (evicted series, updates merged into the overflow series).",
+				)
+
+			metric.CardinalityGauge.set("series", len(metric.Series))
+			metric.CardinalityGauge.set("evicted", metric.EvictedSeries)
+			metric.CardinalityGauge.set("overflowed", metric.OverflowedUpdates)
+
+
+	async def _flushing_timer(self):
+		'''
+		Flush metrics at the end of every window, the window end is a multiple of the flush interval since the epoch.
+		The window end is computed from the system wall clock (`time.time()`), so that windows of all processes and hosts are aligned
+		even if the loop clock (and `App.time()` derived from it) drifts from the wall clock.
+		The loop clock is used only for the sleep.
+		'''
+		while True:
+			now = time.time()
+			window_end = (math.floor(now / self.FlushInterval) + 1) * self.FlushInterval
+
+			# The loop clock can run at a bit different pace than the wall clock, so the sleep is repeated if it wakes up too early
+			while now < window_end:
+				await asyncio.sleep(window_end - now)
+				now = time.time()
+
+			if len(self.Metrics) == 0:
+				continue
+
+			self._flush_metrics(window_end)
+
+			# Processing of targets is not awaited, so that a slow target doesn't delay the next window
+			self.App.TaskService.schedule(self._process_targets(window_end))
+
+
+	def _on_exit(self, message_type):
+		# The final window is flushed into the shared memory before services are finalized,
+		# so that it is there when other workers push metrics
+		if len(self.Metrics) > 0:
+			self.FinalFlush = self._flush_metrics()
+
+
 	async def _on_flushing_event(self, event_type):
 		if len(self.Metrics) == 0:
 			return
 
 		now = self._flush_metrics()
+		await self._process_targets(now, final=True)
+
+
+	async def _process_targets(self, now, final=False):
+		if len(self.Targets) == 0:
+			return
+
+		snapshot = self.Snapshot
+		if self.SharedMemory is not None:
+			# Workers produce the same series, so only one worker pushes metrics of all workers
+			live = self.SharedMemory.live_slots()
+			if final:
+				# An exiting worker leaves its final window in the shared memory for the next push,
+				# only the last running worker pushes final windows of all workers
+				if live != [self.SharedMemory.WorkerId]:
+					return
+				since = math.floor(now / self.FlushInterval) * self.FlushInterval
+			else:
+				# The worker in the lowest live slot pushes, so that the push continues when any worker exits
+				if len(live) == 0 or live[0] != self.SharedMemory.WorkerId:
+					return
+				# Let other workers publish the same flush window
+				await asyncio.sleep(min(1.0, self.FlushInterval / 10))
+				since = now - self.FlushInterval
+			snapshot = self.aggregated_snapshot(since, now)
 
 		pending = set()
 		for target in self.Targets:
+
+			# A target can push less often than metrics are flushed,
+			# flush windows are accumulated then and the target receives them at its interval boundaries
+			interval = getattr(target, 'Interval', None)
+			if interval is not None:
+				window = self.TargetWindows[target] = accumulate(self.TargetWindows.get(target), snapshot)
+				offset = now % interval
+				if not final and min(offset, interval - offset) >= self.FlushInterval / 2:
+					continue
+				del self.TargetWindows[target]
+			else:
+				window = snapshot
+
 			pending.add(
-				target.process(self.Storage.Metrics, now)
+				asyncio.ensure_future(target.process(window, now))
 			)
 
 		while len(pending) > 0:
-			done, pending = await asyncio.wait(pending, loop=self.App.Loop, timeout=180.0, return_when=asyncio.ALL_COMPLETED)
+			done, pending = await asyncio.wait(pending, timeout=180.0, return_when=asyncio.ALL_COMPLETED)
 
 
-	def _add_metric(self, metric: Metric, metric_name: str, tags=None, reset=None, help=None, unit=None):
+	def _add_metric(self, metric: Metric, metric_name: str, tags=None, reset=None, help=None, unit=None, max_series=None):
 		# Add global tags
 		metric.StaticTags.update(self.Tags)
 		metric.App = self.App
 
+		if max_series is not None:
+			metric.MaxSeries = max_series
+
 		# Add local static tags
 		if tags is not None:
 			metric.StaticTags.update(tags)
@@ -117,12 +319,12 @@ class MetricsService(Service):
 		self._add_metric(m, metric_name, tags=tags, help=help, unit=unit)
 		return m
 
-	def create_counter(self, metric_name, tags=None, init_values=None, reset: bool = True, help=None, unit=None, dynamic_tags=False):
+	def create_counter(self, metric_name, tags=None, init_values=None, reset: bool = True, help=None, unit=None, dynamic_tags=False, max_series=None):
 		if dynamic_tags:
 			m = CounterWithDynamicTags(init_values=init_values)
 		else:
 			m = Counter(init_values=init_values)
-		self._add_metric(m, metric_name, tags=tags, reset=reset, help=help, unit=unit)
+		self._add_metric(m, metric_name, tags=tags, reset=reset, help=help, unit=unit, max_series=max_series)
 		return m
 
 	def create_eps_counter(self, metric_name, tags=None, init_values=None, reset: bool = True, help=None, unit=None):
@@ -135,18 +337,29 @@ class MetricsService(Service):
 		self._add_metric(m, metric_name, tags=tags, help=help, unit=unit)
 		return m
 
-	def create_aggregation_counter(self, metric_name, tags=None, init_values=None, reset: bool = True, aggregator=max, help=None, unit=None, dynamic_tags=False):
+	def create_aggregation_counter(self, metric_name, tags=None, init_values=None, reset: bool = True, aggregator=max, help=None, unit=None, dynamic_tags=False, max_series=None):
 		if dynamic_tags:
 			m = AggregationCounterWithDynamicTags(init_values=init_values, aggregator=aggregator)
 		else:
 			m = AggregationCounter(init_values=init_values, aggregator=aggregator)
-		self._add_metric(m, metric_name, tags=tags, reset=reset, help=help, unit=unit)
+		self._add_metric(m, metric_name, tags=tags, reset=reset, help=help, unit=unit, max_series=max_series)
 		return m
 
-	def create_histogram(self, metric_name, buckets: list, tags=None, reset: bool = True, help=None, unit=None, dynamic_tags=False):
+	def create_histogram(self, metric_name, buckets: list, tags=None, reset: bool = True, help=None, unit=None, dynamic_tags=False, max_series=None):
 		if dynamic_tags:
 			m = HistogramWithDynamicTags(buckets=buckets)
 		else:
 			m = Histogram(buckets=buckets)
-		self._add_metric(m, metric_name, tags=tags, reset=reset, help=help, unit=unit)
+		self._add_metric(m, metric_name, tags=tags, reset=reset, help=help, unit=unit, max_series=max_series)
+		return m
+
+	def create_summary(
+		self, metric_name, quantiles=(0.5, 0.9, 0.99, 0.999), tags=None, reset: bool = True,
+		relative_accuracy=0.01, max_bins=2048, help=None, unit=None, dynamic_tags=False, max_series=None
+	):
+		if dynamic_tags:
+			m = SummaryWithDynamicTags(quantiles=quantiles, relative_accuracy=relative_accuracy, max_bins=max_bins)
+		else:
+			m = Summary(quantiles=quantiles, relative_accuracy=relative_accuracy, max_bins=max_bins)
+		self._add_metric(m, metric_name, tags=tags, reset=reset, help=help, unit=unit, max_series=max_series)
 		return m
@@ -0,0 +1,306 @@
+import os
+import time
+import mmap
+import fcntl
+import struct
+import pickle
+import logging
+
+from .storage import _merge_values
+
+#
+
+L = logging.getLogger(__name__)
+
+#
+
+
+class SharedMemoryMetrics(object):
+	'''
+	Exchange of flushed metrics between worker processes of the application over a shared memory segment.
+
+	The segment is a file (ideally on tmpfs, e.g. `/dev/shm/myapp-metrics`) mapped into every worker.
+	It has a fixed layout: a header followed by `slots` slots of `slot_size` bytes, one slot per worker.
+	Each worker writes only its own slot, so no lock is needed for writing;
+	the slot is protected by a sequence lock, a reader retries when the slot is being written.
+
+	A worker publishes its storage into its slot after each flush of metrics.
+	The slot of a worker that exits keeps its final flush (with PID 0), so that it is aggregated into the window it belongs to.
+	Any worker can then `aggregate()` the storages of all workers into one storage that is rendered by exporters:
+
+	* Counters, EPS counters, histograms and summaries are merged, i.e. values of the same series are added up.
+	* Gauges, duty cycles and aggregation counters cannot be merged meaningfully, so their series are kept
+	per worker and they are distinguished by the `worker` tag.
+	'''
+
+	Header = struct.Struct("=8sII")  # Magic, number of slots, size of the slot
+	SlotHeader = struct.Struct("=Qqdi")  # Sequence, PID, timestamp of the flush, length of the data
+	Magic = b"ASABMTR1"
+
+
+	def __init__(self, path, slots, slot_size, interval, worker_id=None):
+		self.Path = path
+		self.Slots = slots
+		self.SlotSize = slot_size
+		self.Interval = interval
+		self.Offset = self.Header.size
+		self.Stride = self.SlotHeader.size + self.SlotSize
+
+		self.FD = os.open(self.Path, os.O_RDWR | os.O_CREAT, 0o600)
+		size = self.Offset + self.Slots * self.Stride
+
+		# The file lock is taken only for the setup of the segment and the claim of the slot
+		fcntl.flock(self.FD, fcntl.LOCK_EX)
+		try:
+			if os.fstat(self.FD).st_size < size:
+				os.ftruncate(self.FD, size)
+			self.MMap = mmap.mmap(self.FD, size)
+
+			magic, slots, slot_size = self.Header.unpack_from(self.MMap, 0)
+			if magic != self.Magic:
+				self.Header.pack_into(self.MMap, 0, self.Magic, self.Slots, self.SlotSize)
+			elif slots != self.Slots or slot_size != self.SlotSize:
+				raise RuntimeError("Shared memory of metrics '{}' has a different layout ({} slots of {} bytes)".format(
+					self.Path, slots, slot_size
+				))
+
+			self.WorkerId = self._claim_slot(worker_id)
+
+		finally:
+			fcntl.flock(self.FD, fcntl.LOCK_UN)
+
+		self._Cache = (None, None)
+
+
+	def _claim_slot(self, worker_id):
+		pid = os.getpid()
+
+		if worker_id is None:
+			# Find a slot that is empty, then a slot that is free (it can keep a final flush of an exited worker)
+			# or that belongs to a process that doesn't exist anymore
+			headers = [self.SlotHeader.unpack_from(self.MMap, self._slot_offset(i)) for i in range(self.Slots)]
+			for i, (_, slot_pid, _, length) in enumerate(headers):
+				if slot_pid == 0 and length == 0:
+					worker_id = i
+					break
+			else:
+				for i, (_, slot_pid, _, _) in enumerate(headers):
+					if slot_pid == 0 or not _process_exists(slot_pid):
+						worker_id = i
+						break
+				else:
+					raise RuntimeError("No free slot in shared memory of metrics '{}'".format(self.Path))
+
+		elif not 0 <= worker_id < self.Slots:
+			raise RuntimeError("Worker id '{}' is out of range of shared memory of metrics '{}'".format(worker_id, self.Path))
+
+		offset = self._slot_offset(worker_id)
+		seq, _, _, _ = self.SlotHeader.unpack_from(self.MMap, offset)
+		# The sequence is kept even, so that readers that may be reading the slot notice the change
+		seq += seq & 1
+		self.SlotHeader.pack_into(self.MMap, offset, seq + 2, pid, 0.0, 0)
+		return worker_id
+
+
+	def _slot_offset(self, worker_id):
+		return self.Offset + worker_id * self.Stride
+
+
+	def publish(self, metrics, now):
+		'''
+		Write flushed metrics of this worker (the list of metric storages) into its slot.
+		'''
+		data = pickle.dumps(metrics, protocol=pickle.HIGHEST_PROTOCOL)
+		if len(data) > self.SlotSize:
+			L.warning("Metrics don't fit into the slot of the shared memory, increase 'shared_memory_slot_size'", struct_data={
+				"size": len(data),
+				"slot_size": self.SlotSize,
+			})
+			return False
+
+		offset = self._slot_offset(self.WorkerId)
+		seq, pid, _, _ = self.SlotHeader.unpack_from(self.MMap, offset)
+
+		# Odd sequence marks the slot that is being written
+		self.SlotHeader.pack_into(self.MMap, offset, seq + 1, pid, now, 0)
+		start = offset + self.SlotHeader.size
+		self.MMap[start:start + len(data)] = data
+		self.SlotHeader.pack_into(self.MMap, offset, seq + 2, pid, now, len(data))
+		return True
+
+
+	def read(self):
+		'''
+		Returns a list of `(worker_id, timestamp, sequence, data)` of all slots that contain metrics.
+		'''
+		result = []
+		for worker_id in range(self.Slots):
+			slot = self._read_slot(worker_id)
+			if slot is not None:
+				result.append(slot)
+		return result
+
+
+	def live_slots(self):
+		'''
+		Returns the list of slots that belong to running workers, in ascending order.
+		'''
+		result = []
+		own_pid = os.getpid()
+		for worker_id in range(self.Slots):
+			_, pid, _, _ = self.SlotHeader.unpack_from(self.MMap, self._slot_offset(worker_id))
+			if pid != 0 and (pid == own_pid or _process_exists(pid)):
+				result.append(worker_id)
+		return result
+
+
+	def _read_slot(self, worker_id, with_data=True):
+		'''
+		Returns `(worker_id, timestamp, sequence, data)` of the slot or None if the slot contains no metrics.
+		Only the header of the slot is read when `with_data` is False, the data is None then.
+		'''
+		offset = self._slot_offset(worker_id)
+		start = offset + self.SlotHeader.size
+
+		for _ in range(100):
+			seq, pid, timestamp, length = self.SlotHeader.unpack_from(self.MMap, offset)
+			if seq & 1:
+				# The slot is being written
+				time.sleep(0.0001)
+				continue
+			if length == 0:
+				return None
+			data = self.MMap[start:start + length] if with_data else None
+			if self.SlotHeader.unpack_from(self.MMap, offset)[0] == seq:
+				return (worker_id, timestamp, seq, data)
+
+		L.warning("Failed to read the slot of the shared memory of metrics", struct_data={"worker": worker_id})
+		return None
+
+
+	def aggregate(self, since=None, until=None):
+		'''
+		Returns the storage (a list of metrics) aggregated from flushes of all workers
+		with the timestamp in the window (`since`, `until`].
+
+		By default, the window is the flush interval that ends with the most recent flush of a running worker,
+		so slots of workers that stopped flushing are ignored
+		and final flushes of exited workers are included in the window they belong to.
+		The result is cached until any worker publishes new metrics,
+		headers of slots are compared with the cache first, so that data of slots are copied only when they change.
+		'''
+		headers = [
+			slot for slot in (self._read_slot(worker_id, with_data=False) for worker_id in range(self.Slots))
+			if slot is not None
+		]
+		if len(headers) == 0:
+			return []
+
+		if until is None:
+			live = set(self.live_slots())
+			timestamps = [timestamp for worker_id, timestamp, _, _ in headers if worker_id in live]
+			if len(timestamps) == 0:
+				timestamps = [timestamp for _, timestamp, _, _ in headers]
+			until = max(timestamps)
+		if since is None:
+			since = until - self.Interval
+
+		key = tuple((worker_id, seq) for worker_id, timestamp, seq, _ in headers if since < timestamp <= until)
+		if len(key) == 0:
+			return []
+		if self._Cache[0] == key:
+			return self._Cache[1]
+
+		slots = [
+			slot for slot in (self._read_slot(worker_id) for worker_id, _ in key)
+			if slot is not None and since < slot[1] <= until
+		]
+		if len(slots) == 0:
+			return []
+
+		newest = max(timestamp for _, timestamp, _, _ in slots)
+
+		aggregated = dict()
+		for worker_id, _, _, data in slots:
+			try:
+				metrics = pickle.loads(data)
+			except Exception:
+				L.exception("Failed to load metrics from the shared memory", struct_data={"worker": worker_id})
+				continue
+
+			for metric in metrics:
+				_aggregate_metric(aggregated, metric, str(worker_id))
+
+		result = list(aggregated.values())
+		for metric in result:
+			metric['fieldset'] = list(metric['fieldset'].values())
+			metric['@timestamp'] = newest
+
+		# The key of the cache is made of sequences of slots that have been actually read
+		self._Cache = (tuple((worker_id, seq) for worker_id, _, seq, _ in slots), result)
+		return result
+
+
+	def close(self):
+		if self.MMap is None:
+			return
+
+		# Release the slot for other workers, the final flush stays there to be aggregated by other workers
+		offset = self._slot_offset(self.WorkerId)
+		seq, _, timestamp, length = self.SlotHeader.unpack_from(self.MMap, offset)
+		self.SlotHeader.pack_into(self.MMap, offset, seq + 2, 0, timestamp, length)
+
+		self.MMap.close()
+		self.MMap = None
+		os.close(self.FD)
+		self.FD = None
+
+
+# Types of metrics which values of the same series can be added up across workers
+MERGEABLE_TYPES = frozenset([
+	"Counter", "CounterWithDynamicTags",
+	"EPSCounter",
+	"Histogram", "HistogramWithDynamicTags",
+	"Summary", "SummaryWithDynamicTags",
+])
+
+
+def _aggregate_metric(aggregated, metric, worker):
+	fieldset = metric.pop('fieldset')
+	metric.pop('@timestamp', None)
+
+	mkey = (metric['name'], tuple(sorted(metric['static_tags'].items())))
+	target = aggregated.get(mkey)
+	if target is None:
+		target = aggregated[mkey] = metric
+		metric['fieldset'] = dict()
+	elif target['type'] != metric['type']:
+		L.warning("Metric has a different type in other worker, skipping", struct_data={"name": metric['name'], "worker": worker})
+		return
+
+	mergeable = metric['type'] in MERGEABLE_TYPES
+
+	for field in fieldset:
+		field.pop('expires_at', None)
+		if not mergeable:
+			field['tags'] = dict(field['tags'], worker=worker)
+
+		fkey = tuple(sorted(field['tags'].items()))
+		existing = target['fieldset'].get(fkey)
+		if existing is None:
+			target['fieldset'][fkey] = field
+			continue
+
+		for key in ('values', 'actuals'):
+			if key in field:
+				existing[key] = _merge_values(existing.get(key), field[key])
+
+
+def _process_exists(pid):
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		return True
+	return True
@@ -0,0 +1,213 @@
+import math
+
+#
+
+
+class DDSketch(object):
+	'''
+	A quantile sketch with a relative-error guarantee (DDSketch, https://arxiv.org/abs/1908.10693).
+
+	Values are counted in bins of logarithmically growing width, so the quantile estimate `x'` of a true quantile `x`
+	satisfies `|x' - x| <= relative_accuracy * |x|`.
+	Insertion is O(1), the memory is bounded by `max_bins` per sign (the lowest bins are collapsed when the limit is reached).
+
+	Two sketches with the same `relative_accuracy` can be merged, e.g. sketches of many workers or of many flush windows.
+	'''
+
+	def __init__(self, relative_accuracy=0.01, max_bins=2048):
+		if not 0.0 < relative_accuracy < 1.0:
+			raise ValueError("Relative accuracy must be between 0 and 1")
+
+		self.RelativeAccuracy = relative_accuracy
+		self.Gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+		self.LogGamma = math.log(self.Gamma)
+		self.MaxBins = max_bins
+
+		self.Positive = _Bins()
+		self.Negative = _Bins()
+		self.ZeroCount = 0
+
+		self.Count = 0
+		self.Sum = 0.0
+		self.Min = math.inf
+		self.Max = -math.inf
+
+
+	def add(self, value, count=1):
+		if value > 0.0:
+			self.Positive.add(math.ceil(math.log(value) / self.LogGamma), count, self.MaxBins)
+		elif value < 0.0:
+			self.Negative.add(math.ceil(math.log(-value) / self.LogGamma), count, self.MaxBins)
+		else:
+			self.ZeroCount += count
+
+		self.Count += count
+		self.Sum += value * count
+		if value < self.Min:
+			self.Min = value
+		if value > self.Max:
+			self.Max = value
+
+
+	def merge(self, other):
+		'''
+		Merge the `other` sketch into this one.
+		'''
+		if other.Gamma != self.Gamma:
+			raise ValueError("Cannot merge sketches with a different relative accuracy")
+
+		if other.Count == 0:
+			return
+
+		self.Positive.merge(other.Positive, self.MaxBins)
+		self.Negative.merge(other.Negative, self.MaxBins)
+		self.ZeroCount += other.ZeroCount
+
+		self.Count += other.Count
+		self.Sum += other.Sum
+		self.Min = min(self.Min, other.Min)
+		self.Max = max(self.Max, other.Max)
+
+
+	def copy(self):
+		sketch = DDSketch(self.RelativeAccuracy, self.MaxBins)
+		sketch.merge(self)
+		return sketch
+
+
+	def quantile(self, q):
+		return self.quantiles([q])[0]
+
+
+	def quantiles(self, qs):
+		'''
+		Returns estimates of quantiles `qs` (a sequence of floats between 0 and 1), NaN when the sketch is empty.
+		The bins are traversed only once for all requested quantiles.
+		'''
+		if self.Count == 0:
+			return [math.nan for _ in qs]
+
+		# Bins in the ascending order of the value they represent
+		ordered = [
+			(-self._value(index), count)
+			for index, count in sorted(self.Negative.Counts.items(), reverse=True)
+		]
+		if self.ZeroCount > 0:
+			ordered.append((0.0, self.ZeroCount))
+		ordered.extend(
+			(self._value(index), count)
+			for index, count in sorted(self.Positive.Counts.items())
+		)
+
+		result = [None] * len(qs)
+		pending = sorted(range(len(qs)), key=lambda i: qs[i])
+		position = 0
+		cumulative = 0
+		for value, count in ordered:
+			cumulative += count
+			while position < len(pending) and qs[pending[position]] * (self.Count - 1) < cumulative:
+				result[pending[position]] = min(max(value, self.Min), self.Max)
+				position += 1
+			if position == len(pending):
+				break
+
+		for i in pending[position:]:
+			result[i] = self.Max
+
+		return result
+
+
+	def _value(self, index):
+		# The bin `index` covers the interval (gamma^(index-1), gamma^index], this is its midpoint in terms of a relative error
+		return 2.0 * math.pow(self.Gamma, index) / (self.Gamma + 1.0)
+
+
+	def rest_get(self):
+		return {
+			"relative_accuracy": self.RelativeAccuracy,
+			"count": self.Count,
+			"sum": self.Sum,
+			"min": self.Min if self.Count > 0 else None,
+			"max": self.Max if self.Count > 0 else None,
+			"zero_count": self.ZeroCount,
+			"positive": self.Positive.Counts,
+			"negative": self.Negative.Counts,
+		}
+
+
+	@classmethod
+	def from_dict(cls, data, max_bins=2048):
+		'''
+		Reconstruct the sketch from the output of `rest_get()`, e.g. when it is received from another process.
+		'''
+		sketch = cls(data["relative_accuracy"], max_bins)
+		for index, count in data["positive"].items():
+			sketch.Positive.add(int(index), count, max_bins)
+		for index, count in data["negative"].items():
+			sketch.Negative.add(int(index), count, max_bins)
+		sketch.ZeroCount = data["zero_count"]
+		sketch.Count = data["count"]
+		sketch.Sum = data["sum"]
+		if sketch.Count > 0:
+			sketch.Min = data["min"]
+			sketch.Max = data["max"]
+		return sketch
+
+
+	def __repr__(self):
+		return "<DDSketch count={} sum={}>".format(self.Count, self.Sum)
+
+
+class _Bins(object):
+	'''
+	Counts indexed by a bin index.
+	When there are more than `max_bins` bins, the lowest bins are collapsed into one.
+	'''
+
+	def __init__(self):
+		self.Counts = dict()
+		self.Floor = None  # All indexes below the floor are counted in the floor bin
+
+
+	def add(self, index, count, max_bins):
+		if self.Floor is not None and index < self.Floor:
+			index = self.Floor
+
+		try:
+			self.Counts[index] += count
+		except KeyError:
+			self.Counts[index] = count
+			if len(self.Counts) > max_bins:
+				self._collapse(max_bins)
+
+
+	def merge(self, other, max_bins):
+		if other.Floor is not None and (self.Floor is None or other.Floor > self.Floor):
+			self.Floor = other.Floor
+			self._collapse(max_bins)
+
+		for index, count in other.Counts.items():
+			if self.Floor is not None and index < self.Floor:
+				index = self.Floor
+			self.Counts[index] = self.Counts.get(index, 0) + count
+
+		if len(self.Counts) > max_bins:
+			self._collapse(max_bins)
+
+
+	def _collapse(self, max_bins):
+		indexes = sorted(self.Counts.keys())
+		if len(indexes) > max_bins:
+			self.Floor = indexes[len(indexes) - max_bins]
+
+		if self.Floor is None:
+			return
+
+		collapsed = 0
+		for index in indexes:
+			if index >= self.Floor:
+				break
+			collapsed += self.Counts.pop(index)
+
+		if collapsed > 0:
+			self.Counts[self.Floor] = self.Counts.get(self.Floor, 0) + collapsed
@@ -1,5 +1,8 @@
+import copy
 import logging
 
+from .sketch import DDSketch
+
 #
 
 L = logging.getLogger(__name__)
@@ -46,5 +49,107 @@ class Storage(object):
 		return metric
 
 
+	def snapshot(self, now):
+		'''
+		Produce a read-only snapshot of flushed values of all metrics, it is meant to be consumed by targets and web handlers.
+
+		The snapshot shares tags and values with the storage instead of copying them,
+		it relies on the fact that a flush replaces the `values` of a field rather than updating them.
+		Values of metrics that are updated in place (gauges, duty cycles) are copied.
+		The snapshot MUST NOT be modified.
+		'''
+		snapshot = []
+		for metric in self.Metrics:
+			metric_snapshot = {k: v for k, v in metric.items() if k != 'fieldset'}
+			metric_snapshot['@timestamp'] = now
+
+			if metric['type'] in ('Gauge', 'DutyCycle'):
+				metric_snapshot['fieldset'] = [
+					{'tags': field['tags'], 'values': field['values'].copy()}
+					for field in metric['fieldset']
+				]
+			else:
+				metric_snapshot['fieldset'] = [
+					{'tags': field['tags'], 'values': field['values']}
+					for field in metric['fieldset']
+				]
+
+			snapshot.append(metric_snapshot)
+
+		return snapshot
+
+
 	def clear(self):
 		self.Metrics.clear()
+
+
+# Types of metrics which values are reset by each flush, values of consecutive windows can be added up
+ACCUMULATED_TYPES = frozenset([
+	"Counter", "CounterWithDynamicTags",
+	"Histogram", "HistogramWithDynamicTags",
+	"Summary", "SummaryWithDynamicTags",
+])
+
+
+def accumulate(accumulated, snapshot):
+	'''
+	Merge the snapshot of the next flush window into the snapshot accumulated from previous windows.
+	Returns the new accumulated snapshot, the `snapshot` itself is not modified.
+
+	Values of resetable counters, histograms and summaries are added up, so that the result describes all the windows.
+	Other metrics (gauges, EPS counters, ...) and non-resetable metrics have the values of the last window.
+	'''
+	snapshot = copy.deepcopy(snapshot)
+	if accumulated is None:
+		return snapshot
+
+	metrics = {
+		(metric['name'], tuple(sorted(metric['static_tags'].items()))): metric
+		for metric in accumulated
+	}
+
+	for metric in snapshot:
+		previous = metrics.get((metric['name'], tuple(sorted(metric['static_tags'].items()))))
+		if previous is None or previous['type'] != metric['type']:
+			continue
+		if metric['type'] not in ACCUMULATED_TYPES or metric.get('reset') is not True:
+			continue
+
+		fields = {tuple(sorted(field['tags'].items())): field for field in previous['fieldset']}
+		for field in metric['fieldset']:
+			previous_field = fields.pop(tuple(sorted(field['tags'].items())), None)
+			if previous_field is not None:
+				field['values'] = _merge_values(previous_field['values'], field['values'])
+
+		# Series that were not updated in this window
+		metric['fieldset'].extend(fields.values())
+
+	return snapshot
+
+
+def _merge_values(a, b):
+	'''
+	Add up values of the same series of two workers or of two flush windows.
+	Values are dictionaries (of value names or of histogram buckets), lists of histogram bucket counts,
+	quantile sketches or numbers.
+	'''
+	if a is None:
+		return b
+
+	if isinstance(a, dict):
+		for k, v in b.items():
+			a[k] = _merge_values(a.get(k), v)
+		return a
+
+	if isinstance(a, list):
+		return [x + y for x, y in zip(a, b)]
+
+	if isinstance(a, DDSketch):
+		a.merge(b)
+		return a
+
+	if isinstance(a, (int, float)) and isinstance(b, (int, float)) and type(a) is not bool:
+		return a + b
+
+	# Values that cannot be added up (e.g. strings), the first value wins
+	return a
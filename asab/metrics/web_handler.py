@@ -1,7 +1,7 @@
 import aiohttp.web
-import copy
+import operator
 
-from .openmetric import metric_to_openmetric
+from .openmetric import metric_to_openmetric, renders_actuals
 from ..web.rest import json_response
 
 
@@ -11,6 +11,11 @@ class MetricWebHandler(object):
 		self.MetricsService = metrics_svc
 		self.App = self.MetricsService.App
 
+		# Cache of the OpenMetrics output, rendered metrics are stored by id of their storage
+		# as (storage, state, encoded text) tuples, see `_render_state()`
+		self.OpenMetricCache = dict()
+		self.OpenMetricBody = None
+
 		# Add routes
 		webapp.router.add_get("/asab/v1/metrics", self.metrics)
 		webapp.router.add_get("/asab/v1/watch_metrics", self.watch)
@@ -23,10 +28,14 @@ class MetricWebHandler(object):
 		---
 		tags: ['asab.metrics']
 		'''
-		metrics_to_send = copy.deepcopy(self.MetricsService.Storage.Metrics)
-		for metrics in metrics_to_send:
-			if metrics.get("@timestamp") is None:
-				metrics["@timestamp"] = self.App.time()
+		if self.MetricsService.SharedMemory is not None:
+			# Metrics aggregated from all worker processes
+			return json_response(request, self.MetricsService.aggregated_snapshot())
+
+		metrics_to_send = self.MetricsService.Snapshot
+		if metrics_to_send is None:
+			# No flush happened yet
+			metrics_to_send = self.MetricsService.Storage.snapshot(self.App.time())
 		return json_response(request, metrics_to_send)
 
 
@@ -36,25 +45,43 @@ class MetricWebHandler(object):
 		---
 		tags: ['asab.metrics']
 		'''
-		lines = []
-
-		for data in self.MetricsService.Storage.Metrics:
-			line = metric_to_openmetric(data)
-			if line is not None:
-				lines.append(line)
-
-		if lines:
-			lines.append("# EOF\n")
-
-		text = "\n".join(lines)
-
 		return aiohttp.web.Response(
-			text=text,
+			body=self._render_openmetric(self.MetricsService.aggregated_metrics()),
 			content_type="text/plain",
 			charset="utf-8",
 		)
 
 
+	def _render_openmetric(self, metrics):
+		'''
+		Metrics which state didn't change since they have been rendered are taken from the cache, the others are rendered again.
+		The previous body is reused if nothing has been rendered again.
+		'''
+		parts = []
+		cache = dict()
+		rendered = False
+
+		for data in metrics:
+			state = _render_state(data)
+			cached = self.OpenMetricCache.get(id(data))
+			if state is not None and cached is not None and cached[0] is data and cached[1] == state:
+				part = cached[2]
+			else:
+				line = metric_to_openmetric(data)
+				part = (line + "\n").encode("utf-8") if line is not None else b""
+				rendered = True
+			cache[id(data)] = (data, state, part)
+			parts.append(part)
+
+		body = self.OpenMetricBody
+		if rendered or body is None or len(body[0]) != len(parts) or not all(map(operator.is_, body[0], parts)):
+			body = (parts, b"".join(parts) + b"# EOF\n" if any(parts) else b"")
+			self.OpenMetricBody = body
+
+		self.OpenMetricCache = cache
+		return body[1]
+
+
 	async def watch(self, request):
 		"""
 		Endpoint to list ASAB metrics in the command line.
@@ -69,7 +96,7 @@ class MetricWebHandler(object):
 
 		filter = request.query.get("name")
 		tags = request.query.get("tags")
-		text = watch_table(self.MetricsService.Storage.Metrics, filter, tags)
+		text = watch_table(self.MetricsService.aggregated_metrics(), filter, tags)
 
 		return aiohttp.web.Response(
 			text=text,
@@ -78,6 +105,24 @@ class MetricWebHandler(object):
 		)
 
 
+def _render_state(m):
+	'''
+	Returns tags and values which the OpenMetrics output of the metric is rendered from, the cached output is valid while they are equal.
+	A flush replaces flushed values by new objects, so they are compared mostly by identity.
+	Values updated in place (gauges, duty cycles, actuals of non-resetting counters) are copied.
+	Returns None if the output has to be rendered on every request, i.e. actuals of non-resetting histograms and summaries.
+	'''
+	if m.get("type") in ("Gauge", "DutyCycle"):
+		return tuple((field["tags"], field["values"].copy()) for field in m["fieldset"])
+
+	if renders_actuals(m):
+		if m.get("type") not in ("Counter", "CounterWithDynamicTags", "AggregationCounter", "AggregationCounterWithDynamicTags"):
+			return None
+		return tuple((field["tags"], field["actuals"].copy()) for field in m["fieldset"])
+
+	return tuple((field["tags"], field["values"]) for field in m["fieldset"])
+
+
 def watch_table(metric_records: list(), filter, tags):
 	lines = []
 	m_name_len = max([len(i["name"]) for i in metric_records])
@@ -116,6 +161,14 @@ def watch_table(metric_records: list(), filter, tags):
 				lines.append(build_line(str(name), "Sum", field.get("values").get("sum"), m_name_len, v_name_len, tags, t_string=str(field["tags"]), t_name_len=t_name_len))
 				lines.append(build_line(str(name), "Count", field.get("values").get("count"), m_name_len, v_name_len, tags, t_string=str(field["tags"]), t_name_len=t_name_len))
 
+			elif metric_record.get("type") in ["Summary", "SummaryWithDynamicTags"]:
+				quantiles = metric_record.get("quantiles")
+				for v_name, sketch in field.get("values").items():
+					for quantile, value in zip(quantiles, sketch.quantiles(quantiles)):
+						lines.append(build_line(str(name), str(v_name), str(value), m_name_len, v_name_len, tags, str(quantile), t_string=str(field["tags"]), t_name_len=t_name_len))
+					lines.append(build_line(str(name), "{} Sum".format(v_name), sketch.Sum, m_name_len, v_name_len, tags, t_string=str(field["tags"]), t_name_len=t_name_len))
+					lines.append(build_line(str(name), "{} Count".format(v_name), sketch.Count, m_name_len, v_name_len, tags, t_string=str(field["tags"]), t_name_len=t_name_len))
+
 			else:
 				for key, value in field.get("values").items():
 					lines.append(build_line(str(name), str(key), str(value), m_name_len, v_name_len, tags, t_string=str(field["tags"]), t_name_len=t_name_len))
@@ -14,6 +14,10 @@ asab.Config.add_defaults(
 		'asab:proactor': {
 			'max_workers': '0',
 			'default_executor': True,
+			'cpu_workers': 0,  # Number of processes of the pool for CPU-bound functions, 0 means the number of CPUs
+			'cpu_warm_start': False,  # Start the processes at init-time instead of the first call
+			'cpu_max_tasks_per_child': 0,  # Restart the process after this number of calls (Python 3.11+), 0 means never
+			'cpu_shared_memory_threshold': 1048576,  # Bytes and bytearray arguments of this size or larger are passed over a shared memory, 0 disables
 		}
 	}
 )
@@ -1,6 +1,25 @@
-import asab
+import os
+import sys
+import signal
+import asyncio
+import logging
+import functools
 import concurrent.futures
 
+try:
+	from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+	# Python 3.7 lacks the shared memory
+	shared_memory = None
+
+import asab
+
+#
+
+L = logging.getLogger(__name__)
+
+#
+
 
 class ProactorService(asab.Service):
 
@@ -24,6 +43,31 @@ class ProactorService(asab.Service):
 		if asab.Config.get('asab:proactor', 'default_executor'):
 			self.Loop.set_default_executor(self.Executor)
 
+		# Pool of processes for CPU-bound functions, it is created on the first use (or at init-time for the warm start)
+		self.ProcessExecutor = None
+		self.CPUWorkers = asab.Config.getint('asab:proactor', 'cpu_workers')
+		if self.CPUWorkers <= 0:
+			self.CPUWorkers = os.cpu_count() or 1
+		self.CPUWarmStart = asab.Config.getboolean('asab:proactor', 'cpu_warm_start')
+		self.CPUMaxTasksPerChild = asab.Config.getint('asab:proactor', 'cpu_max_tasks_per_child')
+		self.SharedMemoryThreshold = asab.Config.getint('asab:proactor', 'cpu_shared_memory_threshold')
+
+
+	async def initialize(self, app):
+		if self.CPUWarmStart:
+			executor = self._process_executor()
+			# Each call starts one worker process
+			await asyncio.gather(*[
+				self.Loop.run_in_executor(executor, _warm_up)
+				for _ in range(self.CPUWorkers)
+			])
+
+
+	async def finalize(self, app):
+		if self.ProcessExecutor is not None:
+			await self.Loop.run_in_executor(None, self.ProcessExecutor.shutdown)
+			self.ProcessExecutor = None
+
 
 	# There was the method run, which is obsolete
 	def execute(self, func, *args):
@@ -42,3 +86,150 @@ class ProactorService(asab.Service):
 
 		future = self.execute(func, *args)
 		self.App.TaskService.schedule(future)
+
+
+	def execute_cpu(self, func, *args):
+		'''
+		The `execute_cpu` method executes func(*args) in a process from the Proactor Service process pool,
+		it is meant for CPU-bound functions that would hold the GIL (parsing, hashing, compression).
+		The method returns the future that MUST BE awaited and it provides the result of the func() call.
+
+		The function and its arguments are pickled, so the function has to be defined at the module level.
+		Bytes and bytearray arguments larger than `cpu_shared_memory_threshold` are passed over a shared memory instead of the pickle,
+		memory views (which can't be pickled) are passed over a shared memory regardless of their size.
+		The function receives them as a copy of the original type, a memory view is a view of a bytearray with the original format and shape.
+		'''
+		segments = []
+		if shared_memory is not None and self.SharedMemoryThreshold > 0:
+			args = tuple(self._share(arg, segments) for arg in args)
+
+		try:
+			cf_future = self._process_executor().submit(_call, func, args)
+		except BaseException:
+			_release(segments, None)
+			raise
+
+		# Segments are released when the worker process is done with the call (or the call is cancelled before it started),
+		# the asyncio future may be cancelled sooner, while the worker process still reads from them
+		if len(segments) > 0:
+			cf_future.add_done_callback(functools.partial(_release, segments))
+		return asyncio.wrap_future(cf_future, loop=self.Loop)
+
+
+	def schedule_cpu(self, func, *args):
+		'''
+		The `schedule_cpu` method executes func(*args) in a process from the Proactor Service process pool.
+		The result of the future is discarted (using Task Service)
+		'''
+
+		future = self.execute_cpu(func, *args)
+		self.App.TaskService.schedule(future)
+
+
+	def _process_executor(self):
+		if self.ProcessExecutor is not None:
+			return self.ProcessExecutor
+
+		kwargs = {}
+		if self.CPUMaxTasksPerChild > 0:
+			if sys.version_info >= (3, 11):
+				# Worker processes are started by the 'spawn' method then
+				kwargs['max_tasks_per_child'] = self.CPUMaxTasksPerChild
+			else:
+				L.warning("Recycling of worker processes is not supported by this version of Python, ignoring 'cpu_max_tasks_per_child'")
+
+		if shared_memory is not None:
+			# Worker processes inherit the resource tracker, so that they don't clean up shared memory segments on their exit
+			resource_tracker.ensure_running()
+
+		self.ProcessExecutor = concurrent.futures.ProcessPoolExecutor(
+			max_workers=self.CPUWorkers,
+			initializer=_init_worker,
+			**kwargs
+		)
+		return self.ProcessExecutor
+
+
+	def _share(self, arg, segments):
+		if isinstance(arg, memoryview):
+			size = arg.nbytes
+			data = arg.cast('B') if arg.c_contiguous else arg.tobytes()
+			shared = _SharedBytes(None, size, memoryview, arg.format, arg.shape)
+		elif isinstance(arg, (bytes, bytearray)):
+			size = len(arg)
+			if size < self.SharedMemoryThreshold:
+				return arg
+			data = arg
+			shared = _SharedBytes(None, size, bytearray if isinstance(arg, bytearray) else bytes)
+		else:
+			return arg
+
+		# The segment can't be empty
+		segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+		segment.buf[:size] = data
+		segments.append(segment)
+		shared.Name = segment.name
+		return shared
+
+
+class _SharedBytes(object):
+	'''
+	Reference to a bytes-like argument that is passed to the worker process over a shared memory.
+	'''
+
+	__slots__ = ('Name', 'Size', 'Type', 'Format', 'Shape')
+
+	def __init__(self, name, size, type=bytes, format='B', shape=None):
+		self.Name = name
+		self.Size = size
+		self.Type = type
+		self.Format = format
+		self.Shape = shape
+
+	def __getstate__(self):
+		return (self.Name, self.Size, self.Type.__name__, self.Format, self.Shape)
+
+	def __setstate__(self, state):
+		self.Name, self.Size, type_name, self.Format, self.Shape = state
+		self.Type = {'bytes': bytes, 'bytearray': bytearray, 'memoryview': memoryview}[type_name]
+
+	def load(self):
+		# The segment is owned (and unlinked) by the proactor service
+		segment = shared_memory.SharedMemory(name=self.Name)
+		try:
+			if self.Type is bytes:
+				return bytes(segment.buf[:self.Size])
+			data = bytearray(segment.buf[:self.Size])
+		finally:
+			segment.close()
+
+		if self.Type is bytearray:
+			return data
+
+		view = memoryview(data)
+		try:
+			return view.cast(self.Format, self.Shape)
+		except (TypeError, ValueError):
+			# Only native formats can be restored, others are passed as a view of bytes
+			return view
+
+
+def _release(segments, future):
+	for segment in segments:
+		segment.close()
+		segment.unlink()
+
+
+def _call(func, args):
+	# Executed in the worker process
+	args = [arg.load() if isinstance(arg, _SharedBytes) else arg for arg in args]
+	return func(*args)
+
+
+def _init_worker():
+	# Interrupts are handled by the application, not by its worker processes
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _warm_up():
+	return os.getpid()
@@ -1,6 +1,8 @@
+import re
 import logging
 import asyncio
 import weakref
+import collections
 import functools
 
 
@@ -8,10 +10,21 @@ L = logging.getLogger(__name__)
 
 
 class PubSub(object):
+	'''
+	Subscribers of each message type are kept in a dictionary keyed by the identity of the callback,
+	so that the unsubscribe is O(1).
+	The publish iterates over a precompiled dispatch tuple of `(weak reference, is coroutine function)` pairs,
+	which is rebuilt only when a subscriber is added or removed (also when the weak reference of a subscriber dies).
+
+	A message type can be subscribed also by a pattern, see `TopicTrie`.
+	Dispatch tuples of message types matched by patterns are resolved on the first publish and cached.
+	'''
 
 
 	def __init__(self, app):
-		self.Subscribers = {}
+		self.Subscribers = {}  # message_type -> {callback key: (weak reference, is coroutine function)}
+		self.Patterns = TopicTrie()  # Subscribers of patterns
+		self.Dispatch = {}  # message_type -> tuple of (weak reference, is coroutine function)
 		self.Loop = app.Loop
 
 
@@ -19,20 +32,32 @@ class PubSub(object):
 		"""
 		Subscribe a subscriber to the an message type.
 		It could be even plain function, method or its coroutine variant (then it will be delivered in a dedicated future)
+
+		The message type can be a pattern with wildcard segments, e.g. `Application.tick/*!` or `Library.**`.
 		"""
 
+		key = _callback_key(callback)
+		on_lost = functools.partial(self._on_lost, message_type, key)
+
 		# If subscribe is a bound method, do special treatment
 		# https://stackoverflow.com/questions/53225/how-do-you-check-whether-a-python-method-is-bound-or-not
 		if hasattr(callback, '__self__'):
-			callback = weakref.WeakMethod(callback)
+			callback_ref = weakref.WeakMethod(callback, on_lost)
 
 		else:
-			callback = weakref.ref(callback)
+			callback_ref = weakref.ref(callback, on_lost)
+
+		if is_pattern(message_type):
+			subscribers = self.Patterns.insert(message_type)
 
-		if message_type not in self.Subscribers:
-			self.Subscribers[message_type] = [callback]
 		else:
-			self.Subscribers[message_type].append(callback)
+			subscribers = self.Subscribers.get(message_type)
+			if subscribers is None:
+				subscribers = self.Subscribers[message_type] = dict()
+
+		# Dictionaries are ordered, so subscribers are called in the order of their subscription
+		subscribers[key] = (callback_ref, asyncio.iscoroutinefunction(callback))
+		self._invalidate(message_type)
 
 
 	def subscribe_all(self, obj):
@@ -50,68 +75,80 @@ class PubSub(object):
 	def unsubscribe(self, message_type, callback):
 		""" Remove a subscriber of an message type from the set. """
 
-		callback_list = self.Subscribers.get(message_type)
-		if callback_list is None:
+		subscribers = self._get_subscribers(message_type)
+		if subscribers is None:
 			L.warning("Message type subscription '{}'' not found.".format(message_type))
 			return
 
-		remove_list = None
+		if subscribers.pop(_callback_key(callback), None) is None:
+			L.warning("Subscriber '{}'' not found for the message type '{}'.".format(message_type, callback))
+			return
 
-		for i in range(len(callback_list)):
-			# Take an weakref entry in the callback list and references it
-			c = callback_list[i]()
+		self._remove_if_empty(message_type, subscribers)
+		self._invalidate(message_type)
 
-			# Check if a weak reference is working
-			if c is None:  # a reference is lost, remove this entry
-				if remove_list is None:
-					remove_list = list()
-				remove_list.append(callback_list[i])
-				continue
 
-			if c == callback:
-				callback_list.pop(i)
-				break
-
-		else:
-			L.warning("Subscriber '{}'' not found for the message type '{}'.".format(message_type, callback))
+	def _on_lost(self, message_type, key, callback_ref):
+		# The subscriber has been garbage collected
+		subscribers = self._get_subscribers(message_type)
+		if subscribers is None:
+			return
 
-		if remove_list is not None:
-			for callback_ref in remove_list:
-				callback_list.remove(callback_ref)
+		entry = subscribers.get(key)
+		if entry is None or entry[0] is not callback_ref:
+			# The key has been reused by a newer subscription
+			return
 
-		if len(callback_list) == 0:
-			del self.Subscribers[message_type]
+		del subscribers[key]
+		self._remove_if_empty(message_type, subscribers)
+		self._invalidate(message_type)
 
 
-	def _callback_iter(self, message_type):
+	def _get_subscribers(self, message_type):
+		if is_pattern(message_type):
+			return self.Patterns.get(message_type)
+		return self.Subscribers.get(message_type)
 
-		def _deliver_async(loop, callback, message_type, *args, **kwargs):
-			asyncio.ensure_future(callback(message_type, *args, **kwargs), loop=loop)
 
-		callback_list = self.Subscribers.get(message_type)
-		if callback_list is None:
+	def _remove_if_empty(self, message_type, subscribers):
+		if len(subscribers) > 0:
 			return
+		if is_pattern(message_type):
+			self.Patterns.remove(message_type)
+		else:
+			del self.Subscribers[message_type]
 
-		remove_list = None
 
-		for callback_ref in callback_list:
-			callback = callback_ref()
+	def _invalidate(self, message_type):
+		if is_pattern(message_type):
+			# The pattern can match any of cached message types
+			self.Dispatch.clear()
+		else:
+			self.Dispatch.pop(message_type, None)
 
-			# Check if a weak reference is working
-			if callback is None:  # a reference is lost
-				if remove_list is None:
-					remove_list = list()
-				remove_list.append(callback_ref)
-				continue
 
-			if asyncio.iscoroutinefunction(callback):
-				callback = functools.partial(_deliver_async, self.Loop, callback)
+	def _resolve(self, message_type):
+		subscribers = self.Subscribers.get(message_type)
+		if len(self.Patterns) == 0 or not isinstance(message_type, str):
+			# Patterns match only message types that are strings
+			if subscribers is None:
+				return None
+			dispatch = tuple(subscribers.values())
+
+		else:
+			# A callback subscribed by several matching patterns is called only once
+			matched = dict(subscribers) if subscribers is not None else dict()
+			for pattern_subscribers in self.Patterns.match(message_type):
+				for key, entry in pattern_subscribers.items():
+					matched.setdefault(key, entry)
+			dispatch = tuple(matched.values())
 
-			yield callback
+			if len(self.Dispatch) >= 65536:
+				# Protection from message types generated without limits
+				self.Dispatch.clear()
 
-		if remove_list is not None:
-			for callback_ref in remove_list:
-				callback_list.remove(callback_ref)
+		self.Dispatch[message_type] = dispatch
+		return dispatch
 
 
 	def publish(self, message_type, *args, **kwargs):
@@ -119,15 +156,201 @@ class PubSub(object):
 
 		asynchronously = kwargs.pop('asynchronously', False)
 
+		dispatch = self.Dispatch.get(message_type)
+		if dispatch is None:
+			dispatch = self._resolve(message_type)
+			if dispatch is None:
+				return
+
 		if asynchronously:
-			for callback in self._callback_iter(message_type):
-				self.Loop.call_soon(functools.partial(callback, message_type, *args, **kwargs))
+			for callback_ref, is_coroutine in dispatch:
+				callback = callback_ref()
+				if callback is None:  # a reference is lost
+					continue
+				if is_coroutine:
+					self.Loop.call_soon(functools.partial(self._deliver_async, callback, message_type, *args, **kwargs))
+				else:
+					self.Loop.call_soon(functools.partial(callback, message_type, *args, **kwargs))
 
 		else:
-			for callback in self._callback_iter(message_type):
+			for callback_ref, is_coroutine in dispatch:
+				callback = callback_ref()
+				if callback is None:  # a reference is lost
+					continue
+				if is_coroutine:
+					self.Loop.create_task(callback(message_type, *args, **kwargs))
+				else:
+					callback(message_type, *args, **kwargs)
+
+
+	async def publish_async(self, message_type, *args, **kwargs):
+		"""
+		Notify subscribers of an message type and wait until they accept the message.
+		Coroutine subscribers are awaited and :any:`Subscriber` objects with the ``block`` overflow policy
+		are awaited until there is a space in their queue, so that a fast publisher is slowed down by slow subscribers.
+		"""
+
+		dispatch = self.Dispatch.get(message_type)
+		if dispatch is None:
+			dispatch = self._resolve(message_type)
+			if dispatch is None:
+				return
+
+		for callback_ref, is_coroutine in dispatch:
+			callback = callback_ref()
+			if callback is None:  # a reference is lost
+				continue
+			if is_coroutine:
+				await callback(message_type, *args, **kwargs)
+			elif isinstance(callback, Subscriber):
+				await callback.put(message_type, *args, **kwargs)
+			else:
 				callback(message_type, *args, **kwargs)
 
 
+	def _deliver_async(self, callback, message_type, *args, **kwargs):
+		self.Loop.create_task(callback(message_type, *args, **kwargs))
+
+
+def _callback_key(callback):
+	# Bound methods are created on every attribute access, so they are identified by their object and function
+	if hasattr(callback, '__self__'):
+		return (id(callback.__self__), id(callback.__func__))
+	return id(callback)
+
+
+###
+
+_SEPARATORS = re.compile(r"[./]")
+
+
+def _topic_segments(topic):
+	# The trailing exclamation mark is a naming convention of message types, it is not significant for the matching
+	if topic.endswith('!'):
+		topic = topic[:-1]
+	return _SEPARATORS.split(topic)
+
+
+def is_pattern(message_type):
+	'''
+	Returns True if the message type contains a wildcard segment (`*` or `**`).
+	'''
+	if not isinstance(message_type, str) or '*' not in message_type:
+		return False
+	return any(segment in ('*', '**') for segment in _topic_segments(message_type))
+
+
+class TopicTrie(object):
+	'''
+	Subscribers of patterns of message types, organized in a trie by segments of the pattern.
+
+	Segments of a message type are separated by `.` or `/`, the trailing `!` is ignored.
+	In a pattern, `*` matches exactly one segment and `**` matches any number (incl. zero) of segments.
+	E.g. `Application.tick/*!` matches `Application.tick/10!` and `Library.**` matches `Library.ready!`.
+
+	The cost of the matching is proportional to the number of segments of the message type,
+	not to the number of patterns.
+	'''
+
+	def __init__(self):
+		self.Root = _TopicNode()
+		self.Count = 0  # Number of patterns with subscribers
+
+
+	def __len__(self):
+		return self.Count
+
+
+	def insert(self, pattern):
+		'''
+		Returns the (mutable) dictionary of subscribers of the pattern.
+		'''
+		node = self.Root
+		for segment in _topic_segments(pattern):
+			child = node.Children.get(segment)
+			if child is None:
+				child = node.Children[segment] = _TopicNode()
+			node = child
+
+		if node.Subscribers is None:
+			node.Subscribers = dict()
+			self.Count += 1
+		return node.Subscribers
+
+
+	def get(self, pattern):
+		node = self.Root
+		for segment in _topic_segments(pattern):
+			node = node.Children.get(segment)
+			if node is None:
+				return None
+		return node.Subscribers
+
+
+	def remove(self, pattern):
+		path = [self.Root]
+		segments = _topic_segments(pattern)
+		for segment in segments:
+			node = path[-1].Children.get(segment)
+			if node is None:
+				return
+			path.append(node)
+
+		if path[-1].Subscribers is None:
+			return
+		path[-1].Subscribers = None
+		self.Count -= 1
+
+		# Prune nodes that are not needed anymore
+		for i in range(len(segments), 0, -1):
+			node = path[i]
+			if node.Subscribers is not None or len(node.Children) > 0:
+				break
+			del path[i - 1].Children[segments[i - 1]]
+
+
+	def match(self, message_type):
+		'''
+		Returns a list of dictionaries of subscribers of patterns that match the message type.
+		'''
+		result = []
+		self._match(self.Root, _topic_segments(message_type), 0, result)
+		return result
+
+
+	def _match(self, node, segments, position, result):
+		globstar = node.Children.get('**')
+
+		if position == len(segments):
+			if node.Subscribers:
+				result.append(node.Subscribers)
+			if globstar is not None:
+				# `**` matches also zero segments
+				self._match(globstar, segments, position, result)
+			return
+
+		child = node.Children.get(segments[position])
+		if child is not None:
+			self._match(child, segments, position + 1, result)
+
+		child = node.Children.get('*')
+		if child is not None:
+			self._match(child, segments, position + 1, result)
+
+		if globstar is not None:
+			for i in range(position, len(segments) + 1):
+				self._match(globstar, segments, i, result)
+
+
+class _TopicNode(object):
+
+	__slots__ = ('Children', 'Subscribers')
+
+	def __init__(self):
+		self.Children = dict()
+		self.Subscribers = None
+
+
 ###
 
 class subscribe(object):
@@ -140,6 +363,8 @@ class subscribe(object):
 	@asab.subscribe("tick")
 	def on_tick(self, message_type):
 	print("Service tick")
+
+	The message type can be also a pattern, e.g. `@asab.subscribe("Application.tick/*!")`.
 	'''
 
 	def __init__(self, message_type):
@@ -170,11 +395,33 @@ If ``pubsub`` argument is None, the initial subscription is skipped.
 		"Application.tick!",
 		"Application.stop!"
 	)
+
+The queue of the subscriber is unbounded by default.
+When ``maxsize`` is set, the ``overflow`` policy decides what happens with a message that doesn't fit into the queue:
+
+* ``drop_oldest`` (default): the oldest queued message is dropped
+* ``drop_newest``: the new message is dropped
+* ``coalesce``: the queue keeps only the most recent message of each message type (the oldest message is dropped when the queue is full)
+* ``block``: :any:`PubSub.publish_async` waits until there is a space in the queue (messages of the synchronous ``publish()`` that don't fit are dropped)
+
+Dropped messages are counted in ``Dropped`` attribute.
 	'''
 
-	def __init__(self, pubsub=None, *message_types):
+	OverflowPolicies = frozenset(['drop_oldest', 'drop_newest', 'coalesce', 'block'])
+
 
-		self._q = asyncio.Queue()
+	def __init__(self, pubsub=None, *message_types, maxsize=0, overflow='drop_oldest'):
+		if overflow not in self.OverflowPolicies:
+			raise ValueError("Unknown overflow policy '{}'".format(overflow))
+
+		self.MaxSize = maxsize
+		self.Overflow = overflow
+		self.Dropped = 0
+
+		self._q = collections.deque()
+		self._coalesced = dict()  # message_type -> queued entry, for 'coalesce' policy
+		self._not_empty = asyncio.Event()
+		self._not_full = asyncio.Event()
 		self._subscriptions = []
 
 		if pubsub is not None:
@@ -191,7 +438,54 @@ Subscribe for more message types. This method can be called many times with vari
 
 
 	def __call__(self, message_type, *args, **kwargs):
-		self._q.put_nowait((message_type, args, kwargs))
+		if self.Overflow == 'coalesce':
+			entry = self._coalesced.get(message_type)
+			if entry is not None:
+				# Replace the queued message of the same type, it keeps its position in the queue
+				entry[1] = args
+				entry[2] = kwargs
+				return
+
+		if self.MaxSize > 0 and len(self._q) >= self.MaxSize:
+			if self.Overflow in ('drop_newest', 'block'):
+				self.Dropped += 1
+				return
+			self._pop()
+			self.Dropped += 1
+
+		entry = [message_type, args, kwargs]
+		self._q.append(entry)
+		if self.Overflow == 'coalesce':
+			self._coalesced[message_type] = entry
+		self._not_empty.set()
+
+
+	async def put(self, message_type, *args, **kwargs):
+		'''
+Enqueue a message, wait for a space in the queue if the ``overflow`` policy is ``block``.
+It is used by :any:`PubSub.publish_async`.
+		'''
+		if self.Overflow == 'block':
+			while self.MaxSize > 0 and len(self._q) >= self.MaxSize:
+				self._not_full.clear()
+				await self._not_full.wait()
+
+		self(message_type, *args, **kwargs)
+
+
+	def _pop(self):
+		entry = self._q.popleft()
+		if len(self._q) == 0:
+			self._not_empty.clear()
+		self._not_full.set()
+		if self._coalesced.get(entry[0]) is entry:
+			del self._coalesced[entry[0]]
+		return (entry[0], entry[1], entry[2])
+
+
+	async def _get(self):
+		await self._get_ready()
+		return self._pop()
 
 
 	def message(self):
@@ -217,7 +511,42 @@ Example of the `await message()` use:
 			print("Tick.")
 
 		'''
-		return self._q.get()
+		return self._get()
+
+
+	async def messages(self, max_batch=100, timeout=None):
+		'''
+Wait for messages asynchronously and return all queued messages (up to ``max_batch``) at once.
+Returns a list of three-members tuples ``(message_type, args, kwargs)``, the list is empty when the ``timeout`` expires.
+
+.. code:: python
+
+	async def my_coroutine(app):
+		subscriber = asab.Subscriber(app.PubSub, "Order.created!", maxsize=10000)
+		while True:
+			for message_type, args, kwargs in await subscriber.messages(max_batch=500):
+				process(*args)
+
+		'''
+		if len(self._q) == 0:
+			if timeout is None:
+				await self._get_ready()
+			else:
+				try:
+					await asyncio.wait_for(self._get_ready(), timeout)
+				except asyncio.TimeoutError:
+					return []
+
+		batch = []
+		while len(self._q) > 0 and len(batch) < max_batch:
+			batch.append(self._pop())
+		return batch
+
+
+	async def _get_ready(self):
+		while len(self._q) == 0:
+			self._not_empty.clear()
+			await self._not_empty.wait()
 
 
 	def __aiter__(self):
@@ -225,4 +554,4 @@ Example of the `await message()` use:
 
 
 	async def __anext__(self):
-		return await self._q.get()
+		return await self._get()
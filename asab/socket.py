@@ -26,7 +26,11 @@ class StreamSocketServerService(Service):
 		# TODO: Parallelize this ...
 		for addr in addrs:
 			host, port = addr
-			server = await app.Loop.create_server(protocol, host, port)
+			server = await app.Loop.create_server(
+				protocol, host, port,
+				# Workers of the application share the listening socket
+				reuse_port=True if app.WorkerId is not None else None,
+			)
 			self._servers.append(server)
 
 
@@ -0,0 +1,106 @@
+import os
+import sys
+import signal
+import logging
+import asyncio
+
+from .log import LOG_NOTICE
+
+#
+
+L = logging.getLogger(__name__)
+
+#
+
+
+class Supervisor(object):
+	'''
+	Supervisor of worker processes of the application (the multi-worker mode).
+
+	The supervisor starts `workers` processes of the same application (with the same command line),
+	each worker gets its number in the `ASAB_WORKER_ID` environment variable.
+	Workers share listening sockets of web containers and stream socket servers by `SO_REUSEPORT`,
+	so that the kernel distributes incoming connections among them.
+
+	A worker that crashes (exits with a non-zero code or by a signal) is restarted.
+	`Application.stop()` (SIGINT, SIGTERM) and `Application._hup()` (SIGHUP) of the supervisor are propagated to workers.
+	The exit code of the supervisor is the highest exit code of its workers.
+	'''
+
+	RestartDelay = 1.0  # Seconds before a crashed worker is restarted
+
+	def __init__(self, app, workers):
+		self.App = app
+		self.Loop = app.Loop
+		self.WorkerCount = workers
+
+		self.Workers = dict()  # worker_id -> asyncio.subprocess.Process
+		self.Stopping = asyncio.Event()
+
+		# Command line of workers, `sys.orig_argv` keeps also options of the interpreter (e.g. `-m`)
+		self.Command = getattr(sys, 'orig_argv', None) or [sys.executable] + sys.argv
+
+		app.PubSub.subscribe("Application.stop!", self._on_stop)
+		app.PubSub.subscribe("Application.hup!", self._on_hup)
+
+
+	async def run(self):
+		await asyncio.gather(*[
+			self._keep(worker_id)
+			for worker_id in range(self.WorkerCount)
+		])
+
+
+	async def _keep(self, worker_id):
+		'''
+		Keep the worker running until the application stops.
+		'''
+		while True:
+			process = await self._spawn(worker_id)
+			returncode = await process.wait()
+			del self.Workers[worker_id]
+
+			# Worker terminated by a signal has a negative return code, the shell convention is used for its exit code
+			exit_code = returncode if returncode >= 0 else 128 - returncode
+
+			if self.Stopping.is_set() or returncode == 0:
+				L.log(LOG_NOTICE, "Worker exited", struct_data={"worker": worker_id, "pid": process.pid, "exit_code": exit_code})
+				self.App.set_exit_code(exit_code)
+				return
+
+			L.error("Worker crashed, restarting", struct_data={"worker": worker_id, "pid": process.pid, "exit_code": exit_code})
+			try:
+				await asyncio.wait_for(self.Stopping.wait(), timeout=self.RestartDelay)
+			except asyncio.TimeoutError:
+				continue
+
+			# The application is stopping, the crashed worker is not restarted
+			self.App.set_exit_code(exit_code)
+			return
+
+
+	async def _spawn(self, worker_id):
+		env = dict(os.environ)
+		env['ASAB_WORKER_ID'] = str(worker_id)
+
+		process = await asyncio.create_subprocess_exec(*self.Command, env=env)
+		self.Workers[worker_id] = process
+		L.info("Worker started", struct_data={"worker": worker_id, "pid": process.pid})
+		return process
+
+
+	def _signal(self, signum):
+		for process in self.Workers.values():
+			try:
+				process.send_signal(signum)
+			except ProcessLookupError:
+				pass
+
+
+	def _on_stop(self, message_type, stop_counter):
+		self.Stopping.set()
+		self._signal(signal.SIGTERM)
+
+
+	def _on_hup(self, message_type):
+		self._signal(signal.SIGHUP)
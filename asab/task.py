@@ -1,5 +1,8 @@
+import io
+import heapq
 import logging
 import asyncio
+import itertools
 
 import asab
 
@@ -20,15 +23,29 @@ class TaskService(asab.Service):
 
 	The result of the task is collected (and discarted) automatically
 	and if there was an exception, it will be printed to the log.
+
+	Scheduled coroutines are started in the next iteration of the event loop.
+	Tasks can be assigned to a group with a limited concurrency (see `set_limit()`),
+	coroutines of such a group wait in a queue ordered by their priority until a running task of the group finishes.
+
+	Tasks that run longer than `[asab:task] slow_task` seconds are logged with their stack.
+	When the metrics module is used, counts of tasks and their wait and run durations are measured, see `TaskMetrics`.
 	'''
 
 	def __init__(self, app, service_name="asab.TaskService"):
 		super().__init__(app, service_name)
 
-		self.NewTasks = []
-		self.PendingTasks = set()
+		self.Groups = dict()  # group -> _TaskGroup
+		self.PendingTasks = dict()  # Running task -> _TaskRecord
+		self.Wakeup = asyncio.Event()
+		self.Sequence = itertools.count()
 		self.Main = None
 
+		self.Metrics = None  # TaskMetrics, set by MetricsService
+		self.SlowTask = asab.Config.getseconds('asab:task', 'slow_task')
+		if self.SlowTask > 0:
+			app.PubSub.subscribe("Application.tick!", self._on_tick)
+
 
 	async def initialize(self, app):
 		self.start()
@@ -54,10 +71,16 @@ class TaskService(asab.Service):
 			except Exception as e:
 				L.exception("Error '{}' during task service:".format(e))
 
-		total_tasks = len(self.PendingTasks) + len(self.NewTasks)
+		total_tasks = len(self.PendingTasks) + self.queued()
 		if total_tasks > 0:
 			L.warning("{} pending and incompleted tasks".format(total_tasks))
 
+		# Coroutines that have never been started
+		for group in self.Groups.values():
+			for _, _, coro, _ in group.Queue:
+				coro.close()
+			group.Queue.clear()
+
 
 	def _main_task_exited(self, ctx):
 		if self.Main is None:
@@ -74,29 +97,183 @@ class TaskService(asab.Service):
 		self.start()
 
 
-	def schedule(self, *tasks):
+	def set_limit(self, group, limit):
+		'''
+		Set the maximum number of concurrently running tasks of the group, `None` means unlimited.
+		'''
+		self._group(group).Limit = limit
+		self.Wakeup.set()
+
+
+	def schedule(self, *tasks, group=None, priority=0):
 		'''
 		Schedule execution of task(s).
-		Tasks will be started in 1-5 seconds (not immediately).
+		Coroutines are started in the next iteration of the event loop,
+		unless the concurrency limit of the `group` is reached.
+		Then they wait and coroutines with a higher `priority` are started first.
 
 		Task can be a simple coroutine, future or task.
+		Futures and tasks are already running, they only count towards the limit of the group.
+		'''
+		task_group = self._group(group)
+		now = self.App.Loop.time()
+		for task in tasks:
+			if asyncio.isfuture(task):
+				self._track(task_group, task, now)
+			else:
+				heapq.heappush(task_group.Queue, (-priority, next(self.Sequence), task, now))
+
+		self.Wakeup.set()
+
+
+	def _group(self, group):
+		task_group = self.Groups.get(group)
+		if task_group is None:
+			task_group = self.Groups[group] = _TaskGroup()
+		return task_group
+
+
+	def _track(self, task_group, task, scheduled_at, name=None):
+		task_group.Running += 1
+		record = _TaskRecord(name if name is not None else task_name(task), scheduled_at, self.App.Loop.time())
+		self.PendingTasks[task] = record
+		task.add_done_callback(lambda task: self._task_done(task_group, task))
+
+		if self.Metrics is not None:
+			self.Metrics.started(record)
+
+
+	def _task_done(self, task_group, task):
+		record = self.PendingTasks.pop(task, None)
+		task_group.Running -= 1
+		if len(task_group.Queue) > 0:
+			self.Wakeup.set()
+
+		if record is not None and self.Metrics is not None:
+			self.Metrics.finished(record, self.App.Loop.time())
+
+		if task.cancelled():
+			return
+
+		e = task.exception()
+		if e is not None:
+			L.error("Error '{}' during task:".format(e), exc_info=e)
+
+
+	def _dispatch(self):
+		for task_group in self.Groups.values():
+			while len(task_group.Queue) > 0 and (task_group.Limit is None or task_group.Running < task_group.Limit):
+				_, _, coro, scheduled_at = heapq.heappop(task_group.Queue)
+				self._track(task_group, asyncio.ensure_future(coro), scheduled_at, task_name(coro))
+
+
+	def queued(self):
+		'''
+		Returns the number of coroutines that wait for a start.
 		'''
-		self.NewTasks.extend(tasks)
+		return sum(len(task_group.Queue) for task_group in self.Groups.values())
+
+
+	def _on_tick(self, message_type):
+		now = self.App.Loop.time()
+		for task, record in self.PendingTasks.items():
+			if record.Reported or now - record.StartedAt < self.SlowTask:
+				continue
+			record.Reported = True
+
+			stack = io.StringIO()
+			if hasattr(task, 'print_stack'):
+				task.print_stack(limit=20, file=stack)
+			L.warning("Task is running for {:.1f} seconds\n{}".format(now - record.StartedAt, stack.getvalue()), struct_data={
+				"task": record.Name,
+			})
 
 
 	async def main(self):
 		while True:
+			await self.Wakeup.wait()
+			self.Wakeup.clear()
+			self._dispatch()
 
-			while len(self.NewTasks) > 0:
-				task = self.NewTasks.pop()
-				self.PendingTasks.add(task)
 
-			if len(self.PendingTasks) == 0:
-				await asyncio.sleep(5.0)
-			else:
-				done, self.PendingTasks = await asyncio.wait(self.PendingTasks, timeout=1.0)
-				for task in done:
-					try:
-						await task
-					except Exception as e:
-						L.exception("Error '{}' during task:".format(e))
+class _TaskGroup(object):
+
+	__slots__ = ('Limit', 'Running', 'Queue')
+
+	def __init__(self):
+		self.Limit = None
+		self.Running = 0
+		self.Queue = []  # Heap of (-priority, sequence, coroutine, time of the schedule)
+
+
+class _TaskRecord(object):
+
+	__slots__ = ('Name', 'ScheduledAt', 'StartedAt', 'Reported')
+
+	def __init__(self, name, scheduled_at, started_at):
+		self.Name = name
+		self.ScheduledAt = scheduled_at
+		self.StartedAt = started_at
+		self.Reported = False
+
+
+def task_name(task):
+	'''
+	Returns a name of the task, i.e. a qualified name of its coroutine.
+	'''
+	get_coro = getattr(task, 'get_coro', None)
+	coro = get_coro() if get_coro is not None else task
+	name = getattr(coro, '__qualname__', None)
+	if name is None:
+		return type(task).__name__
+	return name
+
+
+class TaskMetrics(object):
+	'''
+	Metrics of the task service:
+
+	* `asab.tasks` gauge with `queued` (waiting for a start) and `running` tasks
+	* `asab.tasks.wait` histogram of the time from the schedule to the start of a task, by the task name
+	* `asab.tasks.duration` histogram of the run time of a task, by the task name
+	'''
+
+	Buckets = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 50]
+
+	def __init__(self, task_svc, metrics_svc):
+		self.TaskService = task_svc
+
+		self.Gauge = metrics_svc.create_gauge(
+			"asab.tasks",
+			init_values={"queued": 0, "running": 0},
+			help="Tasks of the task service.",
+		)
+		self.WaitHistogram = metrics_svc.create_histogram(
+			"asab.tasks.wait",
+			buckets=self.Buckets,
+			unit="seconds",
+			help="Time from the schedule to the start of a task.",
+			dynamic_tags=True,
+		)
+		self.DurationHistogram = metrics_svc.create_histogram(
+			"asab.tasks.duration",
+			buckets=self.Buckets,
+			unit="seconds",
+			help="Run time of a task.",
+			dynamic_tags=True,
+		)
+
+		task_svc.App.PubSub.subscribe("Metrics.flush!", self._on_flushing_event)
+
+
+	def started(self, record):
+		self.WaitHistogram.set("wait", record.StartedAt - record.ScheduledAt, {"task": record.Name})
+
+
+	def finished(self, record, now):
+		self.DurationHistogram.set("duration", now - record.StartedAt, {"task": record.Name})
+
+
+	def _on_flushing_event(self, message_type):
+		self.Gauge.set("queued", self.TaskService.queued())
+		self.Gauge.set("running", len(self.TaskService.PendingTasks))
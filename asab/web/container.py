@@ -167,6 +167,8 @@ want to allow OPTIONS method for preflight requests.
 				self.WebAppRunner,
 				host=addr, port=port, backlog=self.BackLog,
 				ssl_context=ssl_context,
+				# Workers of the application share the listening socket
+				reuse_port=True if app.WorkerId is not None else None,
 			)
 			await site.start()
 
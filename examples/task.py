@@ -8,7 +8,7 @@ class MyApplication(asab.Application):
 		task_service = app.get_service("asab.TaskService")
 
 		# Schedule tasks to be executed
-		# They will be executed in ~ 5 seconds
+		# They will be started in the next iteration of the event loop
 		task_service.schedule(
 			self.task1(),
 			self.task2(),
@@ -1,6 +1,27 @@
 from .test_metrics.test_counter import *
+from .test_metrics.test_counter_with_dynamic_tags import *
 from .test_metrics.test_gauge import *
 from .test_metrics.test_eps_counter import *
 from .test_metrics.test_agg_counter import *
 from .test_metrics.test_histogram import *
 from .test_metrics.test_duplicates import *
+from .test_metrics.test_summary import *
+from .test_metrics.test_snapshot import *
+from .test_metrics.test_shared_memory import *
+from .test_metrics.test_targets import *
+from .test_metrics.test_web_handler import *
+from .test_pubsub.test_patterns import *
+from .test_pubsub.test_dispatch import *
+from .test_pubsub.test_subscriber import *
+from .test_bridge.test_bridge import *
+from .test_task.test_groups import *
+from .test_task.test_instrumentation import *
+from .test_loop.test_loopmonitor import *
+from .test_loop.test_event_loop import *
+from .test_proactor.test_process_pool import *
+from .test_log.test_syslog import *
+from .test_log.test_json import *
+from .test_log.test_queue import *
+from .test_log.test_render_cache import *
+from .test_log.test_rate_filter import *
+from .test_supervisor.test_supervisor import *
@@ -0,0 +1,149 @@
+import os
+import asyncio
+import tempfile
+import unittest
+
+import asab
+import asab.bridge.service
+from asab.bridge.service import FrameHeader, encode_frame, decode_payload, select_codec
+
+
+class TestFrame(unittest.TestCase):
+
+
+	def roundtrip(self, messages, codec):
+		frame = encode_frame(messages, codec)
+		length, frame_codec = FrameHeader.unpack_from(frame)
+		self.assertEqual(frame_codec, codec)
+		self.assertEqual(length, len(frame) - FrameHeader.size)
+		return decode_payload(frame_codec, frame[FrameHeader.size:])
+
+
+	def test_frame_01(self):
+		"""
+		JSON round-trip
+		"""
+		messages = [
+			("a!", (1, "two", [3.5]), {"key": None}),
+			("b!", (), {}),
+		]
+		self.assertEqual(self.roundtrip(messages, b'j'), [
+			["a!", [1, "two", [3.5]], {"key": None}],
+			["b!", [], {}],
+		])
+
+
+	@unittest.skipUnless(asab.bridge.service.msgpack is not None, "msgpack is not installed")
+	def test_frame_02(self):
+		"""
+		MessagePack round-trip
+		"""
+		messages = [
+			("a!", (1, "two", [3.5], b"\x00bytes"), {"key": None}),
+			("b!", (), {}),
+		]
+		self.assertEqual(self.roundtrip(messages, b'm'), [
+			["a!", [1, "two", [3.5], b"\x00bytes"], {"key": None}],
+			["b!", [], {}],
+		])
+
+
+	def test_frame_03(self):
+		"""
+		A message that can't be serialized is skipped
+		"""
+		messages = [
+			("a!", (object(),), {}),
+			("b!", (1,), {}),
+		]
+		with self.assertLogs("asab.bridge.service", level="WARNING"):
+			self.assertEqual(self.roundtrip(messages, b'j'), [["b!", [1], {}]])
+
+		with self.assertLogs("asab.bridge.service", level="WARNING"):
+			self.assertIsNone(encode_frame(messages[:1], b'j'))
+
+
+	def test_codec(self):
+		self.assertEqual(select_codec(""), b'j')
+		self.assertEqual(select_codec("j"), b'j')
+		expected = b'm' if asab.bridge.service.msgpack is not None else b'j'
+		self.assertEqual(select_codec("mj"), expected)
+
+
+class TestBridge(unittest.TestCase):
+	'''
+	Two bridge services (i.e. two sibling processes) in one event loop.
+	'''
+
+
+	def setUp(self):
+		super().setUp()
+		self.Loop = asyncio.new_event_loop()
+		self.Directory = tempfile.TemporaryDirectory()
+		self.OrigDirectory = asab.Config.get('pubsub:bridge', 'directory')
+		asab.Config.set('pubsub:bridge', 'directory', self.Directory.name)
+		self.First = self.create_bridge("first")
+		self.Second = self.create_bridge("second")
+
+
+	def tearDown(self):
+		for bridge in (self.First, self.Second):
+			self.Loop.run_until_complete(bridge.finalize(bridge.App))
+		self.Loop.run_until_complete(asyncio.sleep(0))
+		self.Loop.close()
+		self.Directory.cleanup()
+		asab.Config.set('pubsub:bridge', 'directory', self.OrigDirectory)
+		super().tearDown()
+
+
+	def create_bridge(self, name):
+		bridge = asab.bridge.service.PubSubBridgeService(MockedApp(self.Loop), "asab.PubSubBridgeService")
+		bridge.Path = os.path.join(self.Directory.name, "{}.sock".format(name))
+		return bridge
+
+
+	def run_until(self, condition, timeout=5.0):
+		async def wait():
+			while not condition():
+				await asyncio.sleep(0.01)
+		self.Loop.run_until_complete(asyncio.wait_for(wait(), timeout))
+
+
+	def test_bridge_01(self):
+		received = []
+
+		def on_order(message_type, *args, **kwargs):
+			received.append((args, kwargs))
+
+		self.Second.App.PubSub.subscribe("Order.created!", on_order)
+
+		self.First.forward("Order.*!")
+		self.Second.forward("Order.*!")
+
+		self.Loop.run_until_complete(self.First.initialize(self.First.App))
+		self.Loop.run_until_complete(self.Second.initialize(self.Second.App))
+
+		# Both siblings are connected and know codecs of each other
+		self.run_until(lambda: self.First.Path in self.Second.Peers and self.Second.Path in self.First.Peers)
+		self.run_until(lambda: self.Second.Path in self.First.PeerCodecs and self.First.Path in self.Second.PeerCodecs)
+		self.assertEqual(self.First.PeerCodecs[self.Second.Path], asab.bridge.service.SupportedCodecs)
+
+		with self.assertLogs("asab.bridge.service", level="WARNING"):
+			self.First.App.PubSub.publish("Order.created!", object())
+			self.First.App.PubSub.publish("Order.created!", 1, (2, 3), customer="john")
+			self.run_until(lambda: len(received) > 0)
+
+		self.assertEqual(received, [((1, [2, 3]), {"customer": "john"})])
+
+		# Received messages are not forwarded back
+		self.assertEqual(self.Second.Pending, [])
+
+
+class MockedApp(object):
+
+	def __init__(self, loop):
+		self.Loop = loop
+		self.PubSub = asab.PubSub(self)
+
+	def _register_service(self, service):
+		pass
@@ -0,0 +1,24 @@
+import logging
+import unittest
+
+import asab
+
+
+class LogTestCase(unittest.TestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		asab.Config.add_defaults({
+			"logging": {
+				"app_name": "test",
+			}
+		})
+
+
+	def record(self, msg="Hello %s", args=("world",), level=logging.WARNING, name="test.logger", exc_info=None, struct_data=None, **extra):
+		record = logging.LogRecord(name, level, __file__, 1, msg, args, exc_info)
+		if struct_data is not None:
+			record._struct_data = struct_data
+		record.__dict__.update(extra)
+		return record
@@ -0,0 +1,122 @@
+import io
+import sys
+import json
+import socket
+import logging
+import unittest
+import unittest.mock
+
+import asab.log
+
+from .baseclass import LogTestCase
+
+
+class TestJSONFormatter(LogTestCase):
+
+
+	def format(self, record, static_fields=None):
+		line = asab.log.JSONFormatter(static_fields=static_fields).format(record)
+		self.assertNotIn("\n", line)
+		return json.loads(line)
+
+
+	def test_json_01(self):
+		"""
+		Fields of the Elastic Common Schema and static fields
+		"""
+		record = self.record()
+		record.created = 1616715238.044595
+		entry = self.format(record, static_fields={"service.version": "1.0"})
+
+		self.assertEqual(entry["@timestamp"], "2021-03-25T23:33:58.044595Z")
+		self.assertEqual(entry["log.level"], "WARNING")
+		self.assertEqual(entry["log.logger"], "test.logger")
+		self.assertEqual(entry["message"], "Hello world")
+		self.assertEqual(entry["host.hostname"], socket.gethostname())
+		self.assertEqual(entry["service.version"], "1.0")
+		self.assertIn("process.pid", entry)
+		self.assertNotIn("labels", entry)
+		self.assertNotIn("error.type", entry)
+
+
+	def test_json_02(self):
+		"""
+		Structured data, the trace context and the exception
+		"""
+		try:
+			raise ValueError("Bad value")
+		except ValueError:
+			exc_info = sys.exc_info()
+
+		record = self.record(
+			exc_info=exc_info,
+			struct_data={"user": "john", "count": 3, 10: "int key", "object": object},
+			trace_id="4bf92f3577b34da6a3ce929d0e0e4736",
+			span_id="00f067aa0ba902b7",
+		)
+		entry = self.format(record)
+
+		self.assertEqual(entry["labels"], {"user": "john", "count": 3, "10": "int key", "object": str(object)})
+		self.assertEqual(entry["trace.id"], "4bf92f3577b34da6a3ce929d0e0e4736")
+		self.assertEqual(entry["span.id"], "00f067aa0ba902b7")
+		self.assertEqual(entry["error.type"], "ValueError")
+		self.assertEqual(entry["error.message"], "Bad value")
+		self.assertIn("Traceback", entry["error.stack_trace"])
+
+
+	def test_json_03(self):
+		"""
+		The standard json module is used when orjson is not installed
+		"""
+		with unittest.mock.patch.object(asab.log, "orjson", None):
+			entry = self.format(self.record(msg="Žluťoučký kůň", args=None, struct_data={1: "one"}))
+		self.assertEqual(entry["message"], "Žluťoučký kůň")
+		self.assertEqual(entry["labels"], {"1": "one"})
+
+
+	def test_json_04(self):
+		"""
+		The formatter of the console and the file is selected by `format=json`
+		"""
+		asab.Config.add_defaults({"logging:console": {"format": ""}})
+		original = asab.Config.get("logging:console", "format")
+		asab.Config.set("logging:console", "format", "json")
+		try:
+			formatter = asab.log._create_formatter("logging:console", use_color=True)
+		finally:
+			asab.Config.set("logging:console", "format", original)
+		self.assertIsInstance(formatter, asab.log.JSONFormatter)
+		self.assertEqual(json.loads(formatter.format(self.record(level=logging.INFO)))["log.level"], "INFO")
+
+
+	def test_json_05(self):
+		"""
+		The exception logged outside of the `except` block
+		"""
+		entry = self.format(self.record(exc_info=(None, None, None)))
+		self.assertEqual(entry["message"], "Hello world")
+		self.assertNotIn("error.type", entry)
+
+		logger = logging.getLogger("test.json")
+		handler = logging.StreamHandler(io.StringIO())
+		handler.setFormatter(asab.log.JSONFormatter())
+		logger.addHandler(handler)
+		logger.propagate = False
+		try:
+			logger.exception("No exception")
+		finally:
+			logger.removeHandler(handler)
+			logger.propagate = True
+		self.assertEqual(json.loads(handler.stream.getvalue())["message"], "No exception")
+
+
+	def test_json_06(self):
+		"""
+		Keys that are not strings are converted the same way with and without orjson
+		"""
+		struct_data = {(1, 2): "tuple key", 3: {("a",): "nested"}, "list": [{(4,): 5}]}
+		expected = {"(1, 2)": "tuple key", "3": {"('a',)": "nested"}, "list": [{"(4,)": 5}]}
+
+		self.assertEqual(self.format(self.record(struct_data=struct_data))["labels"], expected)
+		with unittest.mock.patch.object(asab.log, "orjson", None):
+			self.assertEqual(self.format(self.record(struct_data=struct_data))["labels"], expected)
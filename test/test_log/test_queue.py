@@ -0,0 +1,89 @@
+import io
+import time
+import logging
+import threading
+
+import asab.log
+
+from .baseclass import LogTestCase
+
+
+class BlockingHandler(logging.Handler):
+
+	def __init__(self):
+		super().__init__()
+		self.Release = threading.Event()
+		self.Records = []
+
+	def emit(self, record):
+		self.Release.wait(5)
+		self.Records.append(record.getMessage())
+
+
+class TestQueueLogHandler(LogTestCase):
+
+
+	def test_queue_01(self):
+		"""
+		Records are written by the writer thread in order, the rest is drained on close
+		"""
+		stream = io.StringIO()
+		handler = logging.StreamHandler(stream)
+		handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+		debug_handler = logging.StreamHandler(io.StringIO())
+		debug_handler.setLevel(logging.ERROR)
+
+		queue_handler = asab.log.QueueLogHandler([handler, debug_handler])
+		for i in range(2000):
+			queue_handler.emit(self.record(msg="Record %d", args=(i,)))
+		queue_handler.close()
+
+		self.assertFalse(queue_handler.Writer.is_alive())
+		self.assertEqual(stream.getvalue().splitlines(), ["WARNING Record {}".format(i) for i in range(2000)])
+		# The level of the target handler applies
+		self.assertEqual(debug_handler.stream.getvalue(), "")
+
+
+	def test_queue_02(self):
+		"""
+		Records are dropped when the queue is full, the number of dropped records is logged
+		"""
+		handler = BlockingHandler()
+		queue_handler = asab.log.QueueLogHandler([handler], maxsize=5)
+
+		# The writer thread is blocked by the first record
+		queue_handler.emit(self.record(msg="first", args=None))
+		deadline = time.time() + 5
+		while len(queue_handler.Queue) > 0 and time.time() < deadline:
+			time.sleep(0.01)
+
+		for i in range(10):
+			queue_handler.emit(self.record(msg="Record %d", args=(i,)))
+		self.assertEqual(queue_handler.Dropped, 5)
+		self.assertEqual(len(queue_handler.Queue), 5)
+
+		handler.Release.set()
+		queue_handler.close()
+		self.assertEqual(handler.Records, [
+			"first",
+			"Record 0", "Record 1", "Record 2", "Record 3", "Record 4",
+			"5 log records dropped, the log queue is full",
+		])
+
+
+	def test_queue_03(self):
+		"""
+		Arguments are rendered when the record is queued, they can be mutated then
+		"""
+		handler = BlockingHandler()
+		queue_handler = asab.log.QueueLogHandler([handler])
+
+		args = {"state": "before"}
+		record = self.record(msg="State %(state)s", args=None)
+		record.args = args
+		queue_handler.emit(record)
+		args["state"] = "after"
+
+		handler.Release.set()
+		queue_handler.close()
+		self.assertEqual(handler.Records, ["State before"])
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import unittest.mock
+
+import asab.log
+from asab.utils import convert_to_seconds
+
+from .baseclass import LogTestCase
+
+
+class TestLogRateFilter(LogTestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		self.Loop = asyncio.new_event_loop()
+
+
+	def tearDown(self):
+		self.Loop.close()
+		super().tearDown()
+
+
+	def create_filter(self, dedup=None, sampling=None):
+		rate_filter = asab.log.LogRateFilter(dedup or {}, sampling or {})
+		rate_filter.Loop = self.Loop
+		return rate_filter
+
+
+	def test_dedup_01(self):
+		"""
+		Identical records (the same logger, template and level) are suppressed within the window
+		"""
+		rate_filter = self.create_filter(dedup={"test.dedup": 10.0})
+
+		records = [self.record(name="test.dedup", msg="Hello %d", args=(i,)) for i in range(5)]
+		self.assertEqual([rate_filter.filter(record) for record in records], [True, False, False, False, False])
+
+		# The decision is shared by all handlers of the record
+		self.assertTrue(rate_filter.filter(records[0]))
+		self.assertFalse(rate_filter.filter(records[1]))
+
+		# Other level, template or logger
+		self.assertTrue(rate_filter.filter(self.record(name="test.dedup", msg="Hello %d", args=(0,), level=logging.ERROR)))
+		self.assertTrue(rate_filter.filter(self.record(name="test.dedup", msg="Other %d", args=(0,))))
+		self.assertTrue(rate_filter.filter(self.record(name="test.other", msg="Hello %d", args=(0,))))
+		self.assertTrue(rate_filter.filter(self.record(name="test.other", msg="Hello %d", args=(0,))))
+
+
+	def test_dedup_02(self):
+		"""
+		The summary record is logged by the sweep after the window
+		"""
+		rate_filter = self.create_filter(dedup={"test": 10.0})
+
+		records = [self.record(name="test.dedup", msg="Hello %d", args=(i,), struct_data={"k": "v"}) for i in range(5)]
+		for record in records:
+			rate_filter.filter(record)
+
+		# The window is not over yet
+		rate_filter._on_sweep()
+		self.assertEqual(len(rate_filter.Records), 1)
+
+		for record in records:
+			record.created -= 10
+		next(iter(rate_filter.Records.values())).Start -= 10
+
+		with self.assertLogs("test.dedup", level="WARNING") as logs:
+			rate_filter._on_sweep()
+
+		self.assertEqual(len(logs.records), 1)
+		summary = logs.records[0]
+		self.assertEqual(summary.getMessage(), "Hello 4 (suppressed 4 times in 10 seconds)")
+		self.assertEqual(summary._suppressed, 4)
+		self.assertEqual(summary._struct_data, {"k": "v", "suppressed": 4})
+		self.assertEqual(rate_filter.Records, {})
+
+		# The summary record passes the filter
+		self.assertTrue(rate_filter.filter(summary))
+
+
+	def test_dedup_03(self):
+		"""
+		A record after the window starts a new window, the summary of the previous one is logged by the next sweep
+		"""
+		rate_filter = self.create_filter(dedup={"test.dedup": 10.0})
+
+		first = self.record(name="test.dedup", msg="Hello", args=None)
+		suppressed = self.record(name="test.dedup", msg="Hello", args=None)
+		later = self.record(name="test.dedup", msg="Hello", args=None)
+		later.created = first.created + 11
+
+		self.assertTrue(rate_filter.filter(first))
+		self.assertFalse(rate_filter.filter(suppressed))
+		self.assertTrue(rate_filter.filter(later))
+		self.assertEqual(len(rate_filter.Summaries), 1)
+
+		with self.assertLogs("test.dedup", level="WARNING") as logs:
+			rate_filter._on_sweep()
+		self.assertEqual([record.getMessage() for record in logs.records], ["Hello (suppressed 1 times in 10 seconds)"])
+		self.assertEqual(rate_filter.Summaries, [])
+
+
+	def test_sampling_01(self):
+		"""
+		Only the fraction of records below WARNING is passed
+		"""
+		rate_filter = self.create_filter(sampling={"test.sampled": 0.5, "test.muted": 0.0})
+
+		with unittest.mock.patch("random.random", side_effect=[0.1, 0.9, 0.49, 0.5]):
+			passed = [
+				rate_filter.filter(self.record(name="test.sampled", level=logging.INFO))
+				for _ in range(4)
+			]
+		self.assertEqual(passed, [True, False, True, False])
+
+		self.assertFalse(rate_filter.filter(self.record(name="test.muted.child", level=logging.DEBUG)))
+		self.assertTrue(rate_filter.filter(self.record(name="test.muted", level=logging.WARNING)))
+		self.assertTrue(rate_filter.filter(self.record(name="test", level=logging.DEBUG)))
+
+
+	def test_options(self):
+		dedup = asab.log._parse_logger_options("""
+			asab.web 30s
+			# comment
+			asab.web.al 1m
+		""", convert_to_seconds)
+		self.assertEqual(dedup, {"asab.web": 30.0, "asab.web.al": 60.0})
+
+		self.assertEqual(asab.log._lookup_logger(dedup, "asab.web.al.access"), 60.0)
+		self.assertEqual(asab.log._lookup_logger(dedup, "asab.web.container"), 30.0)
+		self.assertIsNone(asab.log._lookup_logger(dedup, "asab.webx"))
+		self.assertIsNone(asab.log._lookup_logger(dedup, "asab"))
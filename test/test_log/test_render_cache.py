@@ -0,0 +1,86 @@
+import logging
+import unittest.mock
+
+import asab.log
+
+from .baseclass import LogTestCase
+
+
+class CountingArgument(object):
+
+	def __init__(self):
+		self.Calls = 0
+
+	def __str__(self):
+		self.Calls += 1
+		return "argument"
+
+
+class TestRenderCache(LogTestCase):
+
+
+	def formatter(self, **kwargs):
+		return asab.log.StructuredDataFormatter(
+			fmt=kwargs.pop("fmt", "%(asctime)s %(levelname)s %(struct_data)s%(message)s"),
+			datefmt=kwargs.pop("datefmt", "%d-%b-%Y %H:%M:%S"),
+			**kwargs
+		)
+
+
+	def test_render_cache_01(self):
+		"""
+		The message, the timestamp and the structured data are rendered once for all formatters
+		"""
+		argument = CountingArgument()
+		record = self.record(msg="Hello %s", args=(argument,), struct_data={"key": "value"})
+
+		first = self.formatter()
+		second = self.formatter()
+		with unittest.mock.patch.object(first, "formatTime", wraps=first.formatTime) as first_time, \
+			unittest.mock.patch.object(second, "formatTime", wraps=second.formatTime) as second_time, \
+			unittest.mock.patch.object(second, "render_struct_data", wraps=second.render_struct_data) as second_sd:
+
+			output = first.format(record)
+			self.assertEqual(second.format(record), output)
+
+		self.assertTrue(output.endswith(' WARNING [sd key="value"] Hello argument'))
+		self.assertEqual(argument.Calls, 1)
+		self.assertEqual(first_time.call_count, 1)
+		self.assertEqual(second_time.call_count, 0)
+		self.assertEqual(second_sd.call_count, 0)
+		self.assertEqual(asab.log.get_message(record), "Hello argument")
+
+
+	def test_render_cache_02(self):
+		"""
+		Formatters with different settings don't share rendered parts
+		"""
+		record = self.record(struct_data={"key": "value"})
+		record.created = 1616715238.044595
+
+		plain = self.formatter()
+		other_date = self.formatter(datefmt="%Y")
+		other_sd = self.formatter(sd_id="other")
+
+		self.assertTrue(plain.format(record).startswith("25-Mar-2021 "))
+		self.assertTrue(other_date.format(record).startswith("2021 WARNING "))
+		self.assertIn('[other key="value"]', other_sd.format(record))
+		self.assertIn('[sd key="value"]', plain.format(record))
+
+		rfc5424 = asab.log.SyslogRFC5424Formatter()
+		self.assertIn('[log l="WARNING"][sd key="value"] Hello world', rfc5424.format(record))
+
+
+	def test_render_cache_03(self):
+		"""
+		The colored level name of the console is not passed to other handlers
+		"""
+		record = self.record(level=logging.ERROR)
+
+		colored = self.formatter(use_color=True).format(record)
+		plain = self.formatter().format(record)
+
+		self.assertIn("\x1b[", colored)
+		self.assertNotIn("\x1b[", plain)
+		self.assertIn(" ERROR ", plain)
+		self.assertEqual(record.levelname, "ERROR")
@@ -0,0 +1,55 @@
+import socket
+import asyncio
+import logging
+import unittest
+
+import asab.log
+
+
+class TestAsyncIOHandler(unittest.TestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		self.Loop = asyncio.new_event_loop()
+		self.Connections = 0
+		self.Received = bytearray()
+		self.Server = self.Loop.run_until_complete(asyncio.start_server(self.on_connection, '127.0.0.1', 0))
+		self.Port = self.Server.sockets[0].getsockname()[1]
+
+
+	def tearDown(self):
+		self.Server.close()
+		self.Loop.run_until_complete(self.Server.wait_closed())
+		self.Loop.close()
+		super().tearDown()
+
+
+	async def on_connection(self, reader, writer):
+		self.Connections += 1
+		self.Received.extend(await reader.read())
+		writer.close()
+
+
+	def run_loop(self, seconds):
+		self.Loop.run_until_complete(asyncio.sleep(seconds))
+
+
+	def test_close_01(self):
+		"""
+		The closed handler flushes the buffer and doesn't reconnect
+		"""
+		handler = asab.log.AsyncIOHandler(self.Loop, socket.AF_INET, socket.SOCK_STREAM, ('127.0.0.1', self.Port))
+		handler.ReconnectDelayMin = 0.01
+		handler._reconnect_delay = 0.01
+		handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+		self.run_loop(0.05)
+
+		handler.emit(logging.LogRecord("test", logging.WARNING, __file__, 1, "Hello", None, None))
+		handler.close()
+		self.run_loop(0.2)
+
+		self.assertEqual(self.Connections, 1)
+		self.assertEqual(bytes(self.Received), b"WARNING Hello")
+		self.assertIsNone(handler._transport)
+		self.assertFalse(handler._connecting)
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import unittest
+import unittest.mock
+
+import asab.application
+
+try:
+	import uvloop
+except ImportError:
+	uvloop = None
+
+
+class TestEventLoopPolicy(unittest.TestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		self.Policy = asyncio.get_event_loop_policy()
+
+
+	def tearDown(self):
+		asyncio.set_event_loop_policy(self.Policy)
+		super().tearDown()
+
+
+	def test_policy_asyncio(self):
+		asab.application._set_event_loop_policy('asyncio')
+		self.assertIs(asyncio.get_event_loop_policy(), self.Policy)
+
+
+	def test_policy_unknown(self):
+		with self.assertRaises(RuntimeError):
+			asab.application._set_event_loop_policy('tokio')
+
+
+	@unittest.skipUnless(uvloop is not None, "uvloop is not installed")
+	def test_policy_uvloop(self):
+		asab.application._set_event_loop_policy('uvloop')
+		self.assertIsInstance(asyncio.get_event_loop_policy(), uvloop.EventLoopPolicy)
+
+
+	@unittest.skipIf(uvloop is not None, "uvloop is installed")
+	def test_policy_uvloop_missing(self):
+		with self.assertLogs("asab.application", level="WARNING"):
+			asab.application._set_event_loop_policy('uvloop')
+		self.assertIs(asyncio.get_event_loop_policy(), self.Policy)
+
+
+class TestEventLoopConfiguration(unittest.TestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		self.Loop = asyncio.new_event_loop()
+
+
+	def tearDown(self):
+		self.Loop.close()
+		super().tearDown()
+
+
+	def test_executor_workers_01(self):
+		asab.application._configure_event_loop(self.Loop, 3, False)
+
+		executor = self.Loop._default_executor
+		self.assertEqual(executor._max_workers, 3)
+
+		thread_name = self.Loop.run_until_complete(self.Loop.run_in_executor(None, lambda: threading.current_thread().name))
+		self.assertTrue(thread_name.startswith("AsabDefaultExecutor"))
+
+
+	def test_executor_workers_02(self):
+		# The Python default executor is created on the first use
+		asab.application._configure_event_loop(self.Loop, 0, False)
+		self.assertIsNone(self.Loop._default_executor)
+
+
+	def test_eager_tasks_01(self):
+		factory = unittest.mock.Mock()
+		with unittest.mock.patch.object(asyncio, "eager_task_factory", factory, create=True):
+			asab.application._configure_event_loop(self.Loop, 0, True)
+		self.assertIs(self.Loop.get_task_factory(), factory)
+
+
+	def test_eager_tasks_02(self):
+		# Python older than 3.12 doesn't provide the eager task factory
+		with unittest.mock.patch.object(asyncio, "eager_task_factory", None, create=True):
+			with self.assertLogs("asab.application", level="WARNING"):
+				asab.application._configure_event_loop(self.Loop, 0, True)
+		self.assertIsNone(self.Loop.get_task_factory())
+
+
+	@unittest.skipUnless(hasattr(asyncio, "eager_task_factory"), "eager tasks require Python 3.12+")
+	def test_eager_tasks_03(self):
+		asab.application._configure_event_loop(self.Loop, 0, True)
+		started = []
+
+		async def task():
+			started.append(True)
+
+		async def main():
+			self.Loop.create_task(task())
+			# The eager task has run up to its first suspension before create_task() returned
+			return list(started)
+
+		self.assertEqual(self.Loop.run_until_complete(main()), [True])
+
+
+	def test_eager_tasks_04(self):
+		asab.application._configure_event_loop(self.Loop, 0, False)
+		self.assertIsNone(self.Loop.get_task_factory())
@@ -0,0 +1,125 @@
+import time
+import asyncio
+import unittest
+import unittest.mock
+
+import asab
+import asab.loopmonitor
+
+from ..test_metrics.baseclass import MetricsTestCase
+
+
+class TestLoopMonitor(unittest.TestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		asab.Config.add_defaults({
+			"asab:loop": {
+				"monitor_interval": 0.1,
+				"blocked_threshold": 0,
+			}
+		})
+		self.Loop = asyncio.new_event_loop()
+		self.LoopMonitor = asab.loopmonitor.LoopMonitor(MockedApp(self.Loop))
+		self.LoopMonitor.Interval = 0.02
+		self.LoopMonitor.BlockedThreshold = 0.1
+
+
+	def tearDown(self):
+		self.LoopMonitor.stop()
+		self.Loop.close()
+		super().tearDown()
+
+
+	def test_lag_01(self):
+		"""
+		The lag is measured by the heartbeat
+		"""
+		self.LoopMonitor.BlockedThreshold = 0
+		self.LoopMonitor.Metrics = unittest.mock.Mock()
+		self.LoopMonitor.start()
+		self.assertIsNotNone(self.LoopMonitor.Handle)
+		self.assertIsNone(self.LoopMonitor.Watchdog)
+
+		async def block():
+			await asyncio.sleep(0.03)
+			time.sleep(0.05)
+			await asyncio.sleep(0.03)
+
+		self.Loop.run_until_complete(block())
+		self.assertGreaterEqual(self.LoopMonitor.MaxLag, 0.02)
+		self.assertEqual(self.LoopMonitor.Blocked, 0)
+		self.assertGreater(self.LoopMonitor.Metrics.lag.call_count, 0)
+
+		max_lag = self.LoopMonitor.reset_max_lag()
+		self.assertGreaterEqual(max_lag, 0.02)
+		self.assertEqual(self.LoopMonitor.MaxLag, 0.0)
+
+
+	def test_start_01(self):
+		"""
+		The heartbeat doesn't run without the watchdog and metrics, the watchdog is disabled by default
+		"""
+		self.assertEqual(asab.Config._default_values["asab:loop"]["blocked_threshold"], 0)
+
+		self.LoopMonitor.BlockedThreshold = 0
+		self.LoopMonitor.start()
+		self.assertIsNone(self.LoopMonitor.Handle)
+		self.assertIsNone(self.LoopMonitor.Watchdog)
+
+
+	def test_blocked_01(self):
+		"""
+		The watchdog logs the stack of the blocked event loop once per block
+		"""
+		self.LoopMonitor.start()
+
+		def blocking_handler():
+			time.sleep(0.4)
+
+		async def block():
+			await asyncio.sleep(0.03)
+			blocking_handler()
+			await asyncio.sleep(0.1)
+
+		with self.assertLogs("asab.loopmonitor", level="WARNING") as logs:
+			self.Loop.run_until_complete(block())
+
+		self.assertEqual(self.LoopMonitor.Blocked, 1)
+		self.assertEqual(len(logs.records), 1)
+		self.assertIn("Event loop is blocked", logs.records[0].getMessage())
+		self.assertIn("blocking_handler", logs.records[0].getMessage())
+
+
+class TestLoopMetrics(MetricsTestCase):
+
+
+	def test_loop_metrics_01(self):
+		loop_monitor = self.App.LoopMonitor
+		metrics = asab.loopmonitor.LoopMetrics(loop_monitor, self.MetricsService)
+
+		metrics.lag(0.003)
+		loop_monitor.MaxLag = 0.003
+		loop_monitor.Blocked = 2
+		try:
+			self.App.PubSub.publish("Metrics.flush!")
+		finally:
+			loop_monitor.Blocked = 0
+			loop_monitor.App.PubSub.unsubscribe("Metrics.flush!", metrics._on_flushing_event)
+
+		self.assertEqual(metrics.Gauge.Storage['fieldset'][0]['values'], {"lag_max": 0.003, "blocked": 2})
+		self.assertEqual(loop_monitor.MaxLag, 0.0)
+
+		self.MetricsService._flush_metrics()
+		values = metrics.Histogram.Storage['fieldset'][0]['values']
+		self.assertEqual(values['count'], 1)
+		self.assertEqual(values['buckets'][0.005], {"lag": 1})
+		self.assertEqual(values['buckets'][0.001], {})
+
+
+class MockedApp(object):
+
+	def __init__(self, loop):
+		self.Loop = loop
+		self.PubSub = asab.PubSub(self)
@@ -170,3 +170,125 @@ class TestCounterWithDynamicTags(MetricsTestCase):
 				'mycounter,foo=bar,host=mockedhost.com value3="nice_weather" 123450000000\n',
 			])
 		)
+
+
+	def test_counter_04(self):
+		'''
+		Field lookup by dynamic tags
+		'''
+
+		my_counter = self.MetricsService.create_counter(
+			"mycounter",
+			tags={"foo": "bar"},
+			dynamic_tags=True
+		)
+
+		my_counter.add('value1', 1, {"status": "200", "method": "GET"})
+		my_counter.add('value1', 1, {"method": "GET", "status": "200"})
+		my_counter.add('value1', 1, {"method": "GET", "status": "200", "foo": "bar"})
+		my_counter.add('value1', 1, {"method": "GET", "status": "404"})
+
+		self.assertEqual(len(my_counter.Storage["fieldset"]), 2)
+		field = my_counter.locate_field({"method": "GET", "status": "200"})
+		self.assertEqual(field["actuals"], {"value1": 3})
+
+		# Expired fields are removed from the index as well
+		self.MetricsService._flush_metrics()
+		my_counter.flush(self.App.time() + my_counter.Expiration + 1)
+		self.assertEqual(my_counter.Storage["fieldset"], [])
+		self.assertEqual(my_counter.FieldIndex, {})
+
+
+	def test_counter_05(self):
+		'''
+		Series over the limit are merged into the overflow series
+		'''
+
+		my_counter = self.MetricsService.create_counter(
+			"mycounter",
+			tags={"foo": "bar"},
+			dynamic_tags=True,
+			max_series=2,
+		)
+
+		my_counter.add('value1', 1, {"status": "200"})
+		my_counter.add('value1', 1, {"status": "404"})
+		my_counter.add('value1', 1, {"status": "500"})
+		my_counter.add('value1', 1, {"status": "503"})
+		my_counter.add('value1', 1, {"status": "200"})
+
+		self.assertEqual(len(my_counter.Storage["fieldset"]), 3)
+		self.assertEqual(my_counter.OverflowedUpdates, 2)
+
+		self.MetricsService._flush_metrics()
+		fields = {
+			tuple(sorted(field["tags"].items())): field["values"]
+			for field in my_counter.Storage["fieldset"]
+		}
+		self.assertEqual(fields[(("foo", "bar"), ("host", "mockedhost.com"), ("status", "200"))], {"value1": 2})
+		self.assertEqual(fields[(("foo", "bar"), ("host", "mockedhost.com"), ("overflow", "true"))], {"value1": 2})
+
+		# The limit is reported by a gauge
+		self.assertEqual(my_counter.CardinalityGauge.Storage["fieldset"][0]["values"], {"series": 2, "evicted": 0, "overflowed": 2})
+
+
+	def test_counter_06(self):
+		'''
+		The least recently updated series is evicted when the limit is reached
+		'''
+		asab.Config["asab:metrics"]["cardinality_policy"] = "lru"
+		try:
+			my_counter = self.MetricsService.create_counter(
+				"mycounter",
+				dynamic_tags=True,
+				max_series=2,
+			)
+		finally:
+			asab.Config["asab:metrics"]["cardinality_policy"] = "overflow"
+
+		my_counter.add('value1', 1, {"status": "200"})
+		my_counter.add('value1', 1, {"status": "404"})
+		my_counter.add('value1', 1, {"status": "200"})
+		my_counter.add('value1', 1, {"status": "500"})
+
+		tags = [field["tags"]["status"] for field in my_counter.Storage["fieldset"]]
+		self.assertEqual(sorted(tags), ["200", "500"])
+		self.assertEqual(my_counter.EvictedSeries, 1)
+		self.assertEqual(my_counter.locate_field({"status": "500"})["actuals"], {"value1": 1})
+		self.assertNotIn((("status", "404"),), my_counter.FieldIndex)
+
+
+	def test_counter_07(self):
+		'''
+		Only expired fields are removed, updated fields are kept
+		'''
+
+		my_counter = self.MetricsService.create_counter(
+			"mycounter",
+			dynamic_tags=True,
+		)
+
+		for status in ["200", "404", "500", "503"]:
+			my_counter.add('value1', 1, {"status": status})
+
+		# Updates take the expiration from the coarse clock
+		now = self.App.time() + my_counter.Expiration
+		my_counter.refresh_expiration(now)
+		my_counter.add('value1', 1, {"status": "404"})
+		my_counter.add('value1', 1, {"status": "503"})
+
+		my_counter.flush(now + 1)
+		self.assertEqual(
+			sorted(field["tags"]["status"] for field in my_counter.Storage["fieldset"]),
+			["404", "503"]
+		)
+		self.assertEqual(sorted(my_counter.FieldIndex.keys()), [(("host", "mockedhost.com"), ("status", "404")), (("host", "mockedhost.com"), ("status", "503")), (("status", "404"),), (("status", "503"),)])
+		self.assertEqual(
+			[my_counter.FieldPositions[id(field)] for field in my_counter.Storage["fieldset"]],
+			[0, 1]
+		)
+
+		# A new series after the expiration
+		my_counter.add('value1', 1, {"status": "200"})
+		self.assertEqual(my_counter.locate_field({"status": "200"})["actuals"], {"value1": 1})
+		self.assertEqual(len(my_counter.Storage["fieldset"]), 3)
@@ -1,6 +1,13 @@
+import json
+import asyncio
+
+import aiohttp.web
+import aiohttp.test_utils
+
 from .baseclass import MetricsTestCase
 import asab.metrics.openmetric
 import asab.metrics.influxdb
+import asab.metrics.web_handler
 
 
 class TestHistogram(MetricsTestCase):
@@ -272,3 +279,57 @@ class TestHistogram(MetricsTestCase):
 				'testhistogram_seconds_sum{host="mockedhost.com",foo="bar"} 5.0',
 			])
 		)
+
+
+	def test_histogram_07(self):
+		"""
+		Values on bucket boundaries and above the last finite bucket
+		"""
+		my_histogram = self.MetricsService.create_histogram(
+			"testhistogram",
+			[1, 10, 100],
+		)
+
+		my_histogram.set('value1', 1)
+		my_histogram.set('value1', 10)
+		my_histogram.set('value1', 1000)
+		self.assertEqual(my_histogram.Storage["fieldset"][0]["actuals"]["buckets"], {'value1': [1, 1, 0, 1]})
+
+		self.MetricsService._flush_metrics()
+		self.assertEqual(
+			my_histogram.Storage["fieldset"][0]["values"],
+			{
+				"buckets": {
+					1.0: {'value1': 1},
+					10.0: {'value1': 2},
+					100.0: {'value1': 2},
+					float("inf"): {'value1': 3},
+				},
+				"sum": 1011.0,
+				"count": 3,
+			}
+		)
+		self.assertEqual(my_histogram.Storage["fieldset"][0]["actuals"]["buckets"], {})
+
+
+	def test_histogram_08(self):
+		"""
+		The JSON endpoint produces a strict JSON, the infinite bucket is not a bare `Infinity`
+		"""
+		my_histogram = self.MetricsService.create_histogram(
+			"testhistogram",
+			[1, 10, 100],
+		)
+		my_histogram.set('value1', 5)
+		self.MetricsService._flush_metrics()
+
+		handler = asab.metrics.web_handler.MetricWebHandler(self.MetricsService, aiohttp.web.Application())
+		request = aiohttp.test_utils.make_mocked_request("GET", "/asab/v1/metrics.json")
+		response = asyncio.get_event_loop().run_until_complete(handler.metrics_json(request))
+
+		def reject_constant(constant):
+			raise ValueError("Invalid JSON constant '{}'".format(constant))
+
+		metrics = json.loads(response.body, parse_constant=reject_constant)
+		self.assertEqual(metrics[0]['buckets'], [1.0, 10.0, 100.0, "+Inf"])
+		self.assertEqual(metrics[0]['fieldset'][0]['values']['buckets']['Infinity'], {'value1': 1})
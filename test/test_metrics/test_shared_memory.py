@@ -0,0 +1,203 @@
+import os
+import asyncio
+import tempfile
+import unittest.mock
+
+from .baseclass import MetricsTestCase
+import asab.metrics.openmetric
+from asab.metrics.shared import SharedMemoryMetrics
+
+
+class TestSharedMemory(MetricsTestCase):
+
+	def setUp(self):
+		super().setUp()
+		fd, self.Path = tempfile.mkstemp()
+		os.close(fd)
+		self.Workers = [
+			SharedMemoryMetrics(self.Path, slots=4, slot_size=65536, interval=60, worker_id=worker_id)
+			for worker_id in range(2)
+		]
+
+
+	def tearDown(self):
+		for worker in self.Workers:
+			worker.close()
+		os.unlink(self.Path)
+		super().tearDown()
+
+
+	def _publish(self, worker, count, gauge, latency, now=120.0):
+		'''
+		Simulate metrics of a worker process
+		'''
+		self.MetricsService.SharedMemory = None
+		self.MetricsService.clear()
+		my_counter = self.MetricsService.create_counter("mycounter", init_values={'v1': 0})
+		my_gauge = self.MetricsService.create_gauge("mygauge", init_values={'v1': 0})
+		my_histogram = self.MetricsService.create_histogram("myhistogram", [1, 10])
+		my_counter.add('v1', count)
+		my_gauge.set('v1', gauge)
+		my_histogram.set('v1', latency)
+		self.MetricsService._flush_metrics(now)
+		self.Workers[worker].publish(self.MetricsService.Storage.Metrics, now)
+
+
+	def test_shared_memory_01(self):
+		'''
+		Counters and histograms are added up, gauges are kept per worker
+		'''
+		self._publish(0, 2, 5, 0.5)
+		self._publish(1, 3, 7, 5)
+
+		metrics = {metric['name']: metric for metric in self.Workers[0].aggregate()}
+		self.assertEqual(metrics['mycounter']['fieldset'][0]['values'], {'v1': 5})
+		self.assertEqual(
+			[(field['tags']['worker'], field['values']) for field in metrics['mygauge']['fieldset']],
+			[('0', {'v1': 5}), ('1', {'v1': 7})]
+		)
+		self.assertEqual(
+			metrics['myhistogram']['fieldset'][0]['values'],
+			{'buckets': {1.0: {'v1': 1}, 10.0: {'v1': 2}, float('inf'): {'v1': 2}}, 'sum': 5.5, 'count': 2}
+		)
+
+		# Any worker renders the same aggregated output
+		self.assertEqual(
+			asab.metrics.openmetric.metric_to_openmetric(metrics['mycounter']),
+			asab.metrics.openmetric.metric_to_openmetric(
+				{metric['name']: metric for metric in self.Workers[1].aggregate()}['mycounter']
+			)
+		)
+
+
+	def test_shared_memory_02(self):
+		'''
+		Stale slots are not aggregated, final flushes of exited workers are aggregated into their window
+		'''
+		self._publish(0, 2, 5, 0.5)
+		self._publish(1, 3, 7, 5, now=0.0)
+
+		metrics = {metric['name']: metric for metric in self.Workers[0].aggregate()}
+		self.assertEqual(metrics['mycounter']['fieldset'][0]['values'], {'v1': 2})
+
+		# The worker exits in the middle of the window
+		self._publish(1, 3, 7, 5, now=100.0)
+		self.Workers[1].close()
+		self.assertEqual(self.Workers[0].live_slots(), [0])
+
+		metrics = {metric['name']: metric for metric in self.Workers[0].aggregate()}
+		self.assertEqual(metrics['mycounter']['fieldset'][0]['values'], {'v1': 5})
+		self.assertEqual(metrics['mycounter']['@timestamp'], 120.0)
+
+		# Empty slots are claimed before the slot with the final flush
+		self.Workers[1] = SharedMemoryMetrics(self.Path, slots=4, slot_size=65536, interval=60)
+		self.assertEqual(self.Workers[1].WorkerId, 2)
+		self.assertEqual([slot[0] for slot in self.Workers[0].read()], [0, 1])
+		self.assertEqual(self.Workers[0].live_slots(), [0, 2])
+
+		# The final flush is not aggregated into the next window
+		self.assertEqual(self.Workers[0].aggregate(since=120.0, until=180.0), [])
+
+
+	def test_shared_memory_03(self):
+		'''
+		Data of slots are copied only when a worker publishes new metrics
+		'''
+		self._publish(0, 2, 5, 0.5)
+		self._publish(1, 3, 7, 5)
+
+		reads = []
+		read_slot = self.Workers[0]._read_slot
+
+		def counting_read_slot(worker_id, with_data=True):
+			if with_data:
+				reads.append(worker_id)
+			return read_slot(worker_id, with_data)
+
+		self.Workers[0]._read_slot = counting_read_slot
+
+		first = self.Workers[0].aggregate()
+		self.assertEqual(reads, [0, 1])
+		self.assertIs(self.Workers[0].aggregate(), first)
+		self.assertEqual(reads, [0, 1])
+
+		self._publish(1, 4, 7, 5)
+		metrics = {metric['name']: metric for metric in self.Workers[0].aggregate()}
+		self.assertEqual(reads, [0, 1, 0, 1])
+		self.assertEqual(metrics['mycounter']['fieldset'][0]['values'], {'v1': 6})
+
+
+	def _target(self):
+		target = MockedTarget()
+		self.MetricsService.Targets.append(target)
+		self.addCleanup(self.MetricsService.Targets.remove, target)
+		self.addCleanup(setattr, self.MetricsService, 'SharedMemory', None)
+		return target
+
+
+	def _process_targets(self, worker, now, final=False):
+		self.MetricsService.SharedMemory = self.Workers[worker]
+		# Don't wait for other workers to publish
+		with unittest.mock.patch("asab.metrics.service.asyncio.sleep", unittest.mock.AsyncMock()):
+			asyncio.get_event_loop().run_until_complete(self.MetricsService._process_targets(now, final=final))
+
+
+	def test_shared_memory_04(self):
+		'''
+		Only the worker in the lowest live slot pushes metrics of all workers to targets
+		'''
+		target = self._target()
+
+		self._publish(0, 2, 5, 0.5)
+		self._publish(1, 3, 7, 5)
+
+		self._process_targets(1, 120.0)
+		self.assertEqual(target.Pushed, [])
+
+		self._process_targets(0, 120.0)
+		self.assertEqual(len(target.Pushed), 1)
+		metrics = {metric['name']: metric for metric in target.Pushed[0]}
+		self.assertEqual(metrics['mycounter']['fieldset'], [{'tags': {'host': 'mockedhost.com'}, 'values': {'v1': 5}}])
+
+		# The first worker exits, the next one takes over, the final window of the first one is pushed with the next window
+		self._publish(0, 1, 5, 0.5, now=150.0)
+		self.Workers[0].close()
+		self._publish(1, 4, 7, 5, now=180.0)
+
+		self._process_targets(1, 180.0)
+		self.assertEqual(len(target.Pushed), 2)
+		metrics = {metric['name']: metric for metric in target.Pushed[1]}
+		self.assertEqual(metrics['mycounter']['fieldset'], [{'tags': {'host': 'mockedhost.com'}, 'values': {'v1': 5}}])
+
+
+	def test_shared_memory_05(self):
+		'''
+		Exiting workers leave their final window in the shared memory, the last one pushes final windows of all workers
+		'''
+		target = self._target()
+
+		self._publish(0, 2, 5, 0.5)
+		self._publish(1, 3, 7, 5)
+		self._process_targets(0, 120.0)
+		self.assertEqual(len(target.Pushed), 1)
+
+		# The worker in the lowest slot exits first, other worker is running
+		self._publish(0, 10, 5, 0.5, now=130.0)
+		self._process_targets(0, 130.0, final=True)
+		self.Workers[0].close()
+		self.assertEqual(len(target.Pushed), 1)
+
+		self._publish(1, 20, 7, 5, now=140.0)
+		self._process_targets(1, 140.0, final=True)
+		self.assertEqual(len(target.Pushed), 2)
+		metrics = {metric['name']: metric for metric in target.Pushed[1]}
+		self.assertEqual(metrics['mycounter']['fieldset'], [{'tags': {'host': 'mockedhost.com'}, 'values': {'v1': 30}}])
+
+
+class MockedTarget(object):
+
+	def __init__(self):
+		self.Pushed = []
+
+	async def process(self, metrics, now):
+		self.Pushed.append(metrics)
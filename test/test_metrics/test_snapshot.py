@@ -0,0 +1,115 @@
+import asyncio
+import unittest.mock
+
+from .baseclass import MetricsTestCase
+import asab.metrics.influxdb
+
+
+class TestSnapshot(MetricsTestCase):
+
+	def test_snapshot_01(self):
+		"""
+		Snapshot shares flushed values of counters and copies values of gauges
+		"""
+		my_counter = self.MetricsService.create_counter("mycounter", init_values={'v1': 0})
+		my_gauge = self.MetricsService.create_gauge("mygauge", init_values={'v1': 0})
+
+		my_counter.add('v1', 2)
+		my_gauge.set('v1', 3)
+		now = self.MetricsService._flush_metrics()
+		snapshot = self.MetricsService.Snapshot
+
+		self.assertEqual(
+			snapshot,
+			[
+				{
+					'type': 'Counter', 'static_tags': {'host': 'mockedhost.com'}, 'name': 'mycounter', 'reset': True, '@timestamp': now,
+					'fieldset': [{'tags': {'host': 'mockedhost.com'}, 'values': {'v1': 2}}],
+				},
+				{
+					'type': 'Gauge', 'static_tags': {'host': 'mockedhost.com'}, 'name': 'mygauge', '@timestamp': now,
+					'fieldset': [{'tags': {'host': 'mockedhost.com'}, 'values': {'v1': 3}}],
+				},
+			]
+		)
+		self.assertIs(snapshot[0]['fieldset'][0]['values'], my_counter.Storage['fieldset'][0]['values'])
+
+		# Updates after the flush do not change the snapshot
+		my_counter.add('v1', 5)
+		my_gauge.set('v1', 5)
+		self.assertEqual(snapshot[0]['fieldset'][0]['values'], {'v1': 2})
+		self.assertEqual(snapshot[1]['fieldset'][0]['values'], {'v1': 3})
+
+		self.assertEqual(
+			asab.metrics.influxdb.influxdb_format(snapshot, 123.45),
+			''.join([
+				"mycounter,host=mockedhost.com v1=2i {}\n".format(int(now * 1e9)),
+				"mygauge,host=mockedhost.com v1=3i {}\n".format(int(now * 1e9)),
+			])
+		)
+
+
+	def test_snapshot_02(self):
+		"""
+		A target with a longer interval receives flush windows accumulated over its interval
+		"""
+		class MockedTarget(object):
+			def __init__(self, interval):
+				self.Interval = interval
+				self.Pushed = []
+
+			async def process(self, metrics, now):
+				self.Pushed.append((now, metrics))
+
+		flush_interval = self.MetricsService.FlushInterval
+		target = MockedTarget(3 * flush_interval)
+		self.MetricsService.Targets.append(target)
+		self.addCleanup(self.MetricsService.Targets.remove, target)
+
+		my_counter = self.MetricsService.create_counter("mycounter", init_values={'v1': 0})
+		my_histogram = self.MetricsService.create_histogram("myhistogram", [1, 10])
+		my_gauge = self.MetricsService.create_gauge("mygauge", init_values={'v1': 0})
+
+		loop = asyncio.get_event_loop()
+		for window in range(1, 4):
+			my_counter.add('v1', window)
+			my_histogram.set('v1', window * 4)
+			my_gauge.set('v1', window)
+			now = self.MetricsService._flush_metrics(window * flush_interval)
+			loop.run_until_complete(self.MetricsService._process_targets(now))
+			if window < 3:
+				self.assertEqual(target.Pushed, [])
+
+		self.assertEqual(len(target.Pushed), 1)
+		counter, histogram, gauge = target.Pushed[0][1]
+		self.assertEqual(counter['fieldset'][0]['values'], {'v1': 6})
+		self.assertEqual(histogram['fieldset'][0]['values']['buckets'], {1.0: {}, 10.0: {'v1': 2}, float('inf'): {'v1': 3}})
+		self.assertEqual(histogram['fieldset'][0]['values']['count'], 3)
+		self.assertEqual(gauge['fieldset'][0]['values'], {'v1': 3})
+
+		# The storage and its snapshot are not modified by the accumulation
+		self.assertEqual(self.MetricsService.Snapshot[0]['fieldset'][0]['values'], {'v1': 3})
+
+
+	def test_snapshot_03(self):
+		"""
+		The end of the flush window is computed from the wall clock, the loop clock is used only for the sleep
+		"""
+		class Stop(Exception):
+			pass
+
+		self.MetricsService.create_counter("mycounter", init_values={'v1': 0})
+		interval = self.MetricsService.FlushInterval
+
+		# The first sleep wakes up a bit before the end of the window by the wall clock
+		clock = [10 * interval + 1.0, 11 * interval - 0.5, 11 * interval + 0.1]
+		with unittest.mock.patch("time.time", side_effect=clock), \
+			unittest.mock.patch("asab.metrics.service.asyncio.sleep", unittest.mock.AsyncMock()) as sleep, \
+			unittest.mock.patch.object(self.MetricsService, "_flush_metrics") as flush, \
+			unittest.mock.patch.object(self.MetricsService, "_process_targets", unittest.mock.Mock()), \
+			unittest.mock.patch.object(self.App.TaskService, "schedule", side_effect=Stop()):
+			with self.assertRaises(Stop):
+				asyncio.get_event_loop().run_until_complete(self.MetricsService._flushing_timer())
+
+		self.assertEqual([call.args[0] for call in sleep.call_args_list], [interval - 1.0, 0.5])
+		flush.assert_called_once_with(11 * interval)
@@ -0,0 +1,139 @@
+import math
+import random
+
+from .baseclass import MetricsTestCase
+import asab.metrics.openmetric
+import asab.metrics.influxdb
+from asab.metrics.sketch import DDSketch
+
+
+class TestSummary(MetricsTestCase):
+
+	def test_summary_01(self):
+		"""
+		Influx
+		"""
+		self.maxDiff = None
+		my_summary = self.MetricsService.create_summary(
+			"testsummary",
+			quantiles=[0.5, 0.99],
+			tags={'foo': 'bar'},
+		)
+
+		# Test Influx format with init values
+		influx_format = asab.metrics.influxdb.influxdb_format(self.MetricsService.Storage.Metrics, 123.45)
+		self.assertEqual(influx_format, '')
+
+		my_summary.set('value1', 1.0)
+		self.MetricsService._flush_metrics()
+
+		influx_format = asab.metrics.influxdb.influxdb_format(self.MetricsService.Storage.Metrics, 123.45)
+		self.assertEqual(
+			influx_format,
+			''.join([
+				'testsummary,host=mockedhost.com,foo=bar,quantile=0.5 value1=1.0 123450000000\n',
+				'testsummary,host=mockedhost.com,foo=bar,quantile=0.99 value1=1.0 123450000000\n',
+				'testsummary,host=mockedhost.com,foo=bar value1_sum=1.0,value1_count=1i 123450000000\n',
+			])
+		)
+
+
+	def test_summary_02(self):
+		"""
+		Prometheus
+		"""
+		my_summary = self.MetricsService.create_summary(
+			"testsummary",
+			quantiles=[0.5, 0.99],
+			tags={'foo': 'bar'},
+			unit="seconds",
+		)
+
+		om_format = asab.metrics.openmetric.metric_to_openmetric(my_summary.Storage)
+		self.assertEqual(
+			om_format,
+			''.join([
+				'# TYPE testsummary_seconds summary\n',
+				'# UNIT testsummary_seconds seconds',
+			])
+		)
+
+		my_summary.set('value1', 2.0)
+		my_summary.set('value1', 2.0)
+		self.MetricsService._flush_metrics()
+
+		om_format = asab.metrics.openmetric.metric_to_openmetric(my_summary.Storage)
+		self.assertEqual(
+			om_format,
+			''.join([
+				'# TYPE testsummary_seconds summary\n',
+				'# UNIT testsummary_seconds seconds\n',
+				'testsummary_seconds{host="mockedhost.com",foo="bar",quantile="0.5",name="value1"} 2.0\n',
+				'testsummary_seconds{host="mockedhost.com",foo="bar",quantile="0.99",name="value1"} 2.0\n',
+				'testsummary_seconds_count{host="mockedhost.com",foo="bar",name="value1"} 2\n',
+				'testsummary_seconds_sum{host="mockedhost.com",foo="bar",name="value1"} 4.0',
+			])
+		)
+
+
+	def test_summary_03(self):
+		"""
+		Non-resetable summary with dynamic tags
+		"""
+		my_summary = self.MetricsService.create_summary(
+			"testsummary",
+			quantiles=[0.5],
+			reset=False,
+			dynamic_tags=True,
+		)
+
+		my_summary.set('value1', 3.0, {"tag": "yes"})
+		self.MetricsService._flush_metrics()
+		my_summary.set('value1', 3.0, {"tag": "yes"})
+
+		om_format = asab.metrics.openmetric.metric_to_openmetric(my_summary.Storage)
+		self.assertEqual(
+			om_format,
+			''.join([
+				'# TYPE testsummary summary\n',
+				'testsummary{tag="yes",host="mockedhost.com",quantile="0.5",name="value1"} 3.0\n',
+				'testsummary_count{tag="yes",host="mockedhost.com",name="value1"} 2\n',
+				'testsummary_sum{tag="yes",host="mockedhost.com",name="value1"} 6.0',
+			])
+		)
+
+
+	def test_sketch_accuracy(self):
+		"""
+		Quantile estimates are within the relative accuracy, sketches merge
+		"""
+		rnd = random.Random(42)
+		values = [rnd.lognormvariate(0, 2) for _ in range(10000)]
+
+		sketch1 = DDSketch(relative_accuracy=0.01)
+		sketch2 = DDSketch(relative_accuracy=0.01)
+		for i, value in enumerate(values):
+			(sketch1 if i % 2 else sketch2).add(value)
+		sketch1.merge(sketch2)
+
+		self.assertEqual(sketch1.Count, len(values))
+		self.assertAlmostEqual(sketch1.Sum, sum(values), places=6)
+
+		values.sort()
+		for q in (0.0, 0.5, 0.9, 0.99, 0.999, 1.0):
+			expected = values[int(q * (len(values) - 1))]
+			self.assertLessEqual(abs(sketch1.quantile(q) - expected), 0.01 * expected + 1e-12)
+
+		self.assertTrue(math.isnan(DDSketch().quantile(0.5)))
+
+
+	def test_sketch_max_bins(self):
+		"""
+		Memory of the sketch is bounded
+		"""
+		sketch = DDSketch(relative_accuracy=0.01, max_bins=64)
+		for i in range(1, 100000, 7):
+			sketch.add(float(i))
+		self.assertLessEqual(len(sketch.Positive.Counts), 64)
+		self.assertEqual(sketch.Count, len(range(1, 100000, 7)))
+		self.assertAlmostEqual(sketch.quantile(1.0), 99996.0, delta=0.01 * 99996.0)
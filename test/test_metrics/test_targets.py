@@ -0,0 +1,169 @@
+import gzip
+import json
+import asyncio
+import unittest.mock
+
+import asab.metrics.buffer
+import asab.metrics.http
+import asab.metrics.influxdb
+
+from .baseclass import MetricsTestCase
+
+
+class TestRetryBuffer(MetricsTestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.Buffer = asab.metrics.buffer.RetryBuffer(self.MetricsService, "test", max_size=3, max_batch_bytes=10)
+
+
+	def test_buffer_01(self):
+		'''
+		The buffer is bounded, the oldest payload is dropped
+		'''
+		with self.assertLogs("asab.metrics.buffer", level="WARNING"):
+			for payload in ["aaa", "bbb", "ccc", "ddd"]:
+				self.Buffer.append(payload)
+
+		self.assertEqual(list(self.Buffer.Payloads), ["bbb", "ccc", "ddd"])
+		self.assertEqual(self.Buffer.Bytes, 9)
+
+		values = self.Buffer.Gauge.Storage["fieldset"][0]["values"]
+		self.assertEqual(values, {"buffered": 3, "buffered_bytes": 9, "dropped": 1})
+
+
+	def test_buffer_02(self):
+		'''
+		Batches are limited by `max_batch_bytes`, the oldest payloads first
+		'''
+		for payload in ["aaaa", "bbbb", "cccc"]:
+			self.Buffer.append(payload)
+
+		self.assertEqual(self.Buffer.batch(), ["aaaa", "bbbb"])
+		self.Buffer.commit(2)
+		self.assertEqual(self.Buffer.batch(), ["cccc"])
+		self.Buffer.commit(1)
+		self.assertEqual(len(self.Buffer), 0)
+		self.assertEqual(self.Buffer.Bytes, 0)
+
+
+	def test_buffer_03(self):
+		'''
+		A payload larger than `max_batch_bytes` is sent alone
+		'''
+		self.Buffer.append("x" * 20)
+		self.Buffer.append("y")
+		self.assertEqual(self.Buffer.batch(), ["x" * 20])
+
+
+class TestInfluxDBTarget(MetricsTestCase):
+
+	def _target(self, **config):
+		config.setdefault("proactor", "no")
+		config.setdefault("batch_max_bytes", 60)
+		return asab.metrics.influxdb.InfluxDBTarget(self.MetricsService, "asab:metrics:influxdb", config=config)
+
+
+	def _process(self, target, value):
+		m_tree = [{
+			"name": "test", "type": "Gauge",
+			"fieldset": [{"tags": {"host": "h"}, "values": {"v": value}}],
+		}]
+		asyncio.get_event_loop().run_until_complete(target.process(m_tree, 1.0))
+
+
+	def test_influxdb_01(self):
+		'''
+		Compression is disabled by default and the request timeout is configurable
+		'''
+		target = self._target()
+		self.assertEqual(target.Compression, '')
+		self.assertNotIn('Content-Encoding', target.Headers)
+		self.assertEqual(target.Timeout, 30.0)
+
+		target = self._target(timeout="5s", compression="gzip")
+		self.assertEqual(target.Timeout, 5.0)
+		self.assertEqual(target.Headers['Content-Encoding'], 'gzip')
+
+		with unittest.mock.patch("http.client.HTTPConnection") as connection:
+			connection.return_value.getresponse.return_value.status = 204
+			connection.return_value.getresponse.return_value.read.return_value = b""
+			self.assertTrue(target._worker_upload(b"test v=1i 1000000000\n"))
+
+		connection.assert_called_once_with("localhost:8086", timeout=5.0)
+		_, body, _ = connection.return_value.request.call_args[0][1:]
+		self.assertEqual(gzip.decompress(body), b"test v=1i 1000000000\n")
+
+
+	def test_influxdb_02(self):
+		'''
+		Undelivered flush windows are kept and sent in batches with the next flush
+		'''
+		target = self._target()
+		target._upload = unittest.mock.AsyncMock(return_value=False)
+
+		self._process(target, 1)
+		self._process(target, 2)
+		self.assertEqual(len(target.RetryBuffer), 2)
+		self.assertEqual(target._upload.call_count, 2)
+
+		target._upload = unittest.mock.AsyncMock(return_value=True)
+		self._process(target, 3)
+		self.assertEqual(len(target.RetryBuffer), 0)
+
+		# Each line takes 28 bytes, so two flush windows fit into a batch of 60 bytes
+		bodies = [call.args[0] for call in target._upload.call_args_list]
+		self.assertEqual(bodies, [
+			b"test,host=h v=1i 1000000000\ntest,host=h v=2i 1000000000\n",
+			b"test,host=h v=3i 1000000000\n",
+		])
+
+
+	def test_influxdb_03(self):
+		'''
+		Server errors and 429 are retried, other errors drop the batch
+		'''
+		target = self._target()
+		with self.assertLogs("asab.metrics.influxdb", level="WARNING"):
+			self.assertFalse(target._check_response(503, ""))
+			self.assertFalse(target._check_response(429, ""))
+			self.assertTrue(target._check_response(400, ""))
+		self.assertTrue(target._check_response(204, ""))
+
+
+	def test_influxdb_04(self):
+		'''
+		A broken connection of the proactor is closed and the batch is retried
+		'''
+		target = self._target()
+		connection = unittest.mock.Mock()
+		connection.request.side_effect = ConnectionRefusedError()
+		target.Connection = connection
+
+		with self.assertLogs("asab.metrics.influxdb", level="ERROR"):
+			self.assertFalse(target._worker_upload(b"test v=1i 1000000000\n"))
+
+		connection.close.assert_called_once_with()
+		self.assertIsNone(target.Connection)
+
+
+class TestHTTPTarget(MetricsTestCase):
+
+	def test_http_01(self):
+		'''
+		Buffered flush windows are sent as one JSON list
+		'''
+		target = asab.metrics.http.HTTPTarget(self.MetricsService, "asab:metrics:http", config={"url": "http://localhost/"})
+		self.assertEqual(target.Timeout, 30.0)
+		target._upload = unittest.mock.AsyncMock(return_value=False)
+
+		loop = asyncio.get_event_loop()
+		loop.run_until_complete(target.process([{"name": "a"}], 1.0))
+		loop.run_until_complete(target.process([], 2.0))
+
+		target._upload = unittest.mock.AsyncMock(return_value=True)
+		loop.run_until_complete(target.process([{"name": "b"}], 3.0))
+
+		self.assertEqual(len(target.RetryBuffer), 0)
+		body = target._upload.call_args.args[0]
+		self.assertEqual(json.loads(body), [{"name": "a"}, {"name": "b"}])
@@ -0,0 +1,100 @@
+import unittest.mock
+
+import aiohttp.web
+
+import asab.metrics.openmetric
+import asab.metrics.web_handler
+
+from .baseclass import MetricsTestCase
+
+
+class TestOpenMetricCache(MetricsTestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.Handler = asab.metrics.web_handler.MetricWebHandler(self.MetricsService, aiohttp.web.Application())
+		self.Counter = self.MetricsService.create_counter("testcounter", init_values={"v1": 0})
+		self.Gauge = self.MetricsService.create_gauge("testgauge", init_values={"v1": 1})
+
+
+	def _render(self):
+		'''
+		Returns the body and names of metrics that have been rendered again.
+		'''
+		with unittest.mock.patch.object(
+			asab.metrics.web_handler, "metric_to_openmetric",
+			wraps=asab.metrics.openmetric.metric_to_openmetric
+		) as render:
+			body = self.Handler._render_openmetric(self.MetricsService.aggregated_metrics())
+		return body, [call.args[0]["name"] for call in render.call_args_list]
+
+
+	def test_cache_01(self):
+		'''
+		Unchanged metrics are taken from the cache and the body is reused
+		'''
+		self.Counter.add("v1", 1)
+		self.MetricsService._flush_metrics()
+
+		body1, rendered = self._render()
+		self.assertEqual(rendered, ["testcounter", "testgauge"])
+		self.assertTrue(body1.endswith(b"# EOF\n"))
+		self.assertIn(b'testcounter{host="mockedhost.com",name="v1"} 1\n', body1)
+
+		body2, rendered = self._render()
+		self.assertEqual(rendered, [])
+		self.assertIs(body2, body1)
+
+
+	def test_cache_02(self):
+		'''
+		A flush invalidates only metrics which flushed values have changed
+		'''
+		self._render()
+
+		self.Counter.add("v1", 2)
+		self.MetricsService._flush_metrics()
+
+		body, rendered = self._render()
+		self.assertEqual(rendered, ["testcounter"])
+		self.assertIn(b'testcounter{host="mockedhost.com",name="v1"} 2\n', body)
+		self.assertIn(b'testgauge{host="mockedhost.com",name="v1"} 1\n', body)
+
+		self.MetricsService._flush_metrics()
+		_, rendered = self._render()
+		self.assertEqual(rendered, ["testcounter"])
+
+		# Values of the next flush are a new object with the same content
+		self.MetricsService._flush_metrics()
+		_, rendered = self._render()
+		self.assertEqual(rendered, [])
+
+
+	def test_cache_03(self):
+		'''
+		Gauges are rendered again when they are set to a different value
+		'''
+		self._render()
+
+		self.Gauge.set("v1", 1)
+		_, rendered = self._render()
+		self.assertEqual(rendered, [])
+
+		self.Gauge.set("v1", 7)
+		body, rendered = self._render()
+		self.assertEqual(rendered, ["testgauge"])
+		self.assertIn(b'testgauge{host="mockedhost.com",name="v1"} 7\n', body)
+
+
+	def test_cache_04(self):
+		'''
+		Removed and replaced metrics are not taken from the cache
+		'''
+		self._render()
+
+		self.MetricsService.create_gauge("testgauge", init_values={"v2": 3})
+		body, rendered = self._render()
+		self.assertEqual(rendered, ["testgauge"])
+		self.assertIn(b'testgauge{host="mockedhost.com",name="v2"} 3\n', body)
+		self.assertNotIn(b'name="v1"} 1\n', body)
+		self.assertEqual(len(self.Handler.OpenMetricCache), 2)
@@ -0,0 +1,191 @@
+import os
+import time
+import array
+import asyncio
+import hashlib
+import unittest
+
+import asab
+import asab.proactor
+import asab.proactor.service
+
+
+def digest(data, algorithm):
+	# Executed in the worker process, it has to be defined at the module level to be picklable
+	return (os.getpid(), type(data).__name__, hashlib.new(algorithm, data).hexdigest())
+
+
+def describe(data):
+	# Executed in the worker process
+	view = memoryview(data)
+	return (type(data).__name__, view.format, view.shape, view.tobytes())
+
+
+def slow_digest(data):
+	# Executed in the worker process
+	time.sleep(0.5)
+	return hashlib.sha256(data).hexdigest()
+
+
+def fail():
+	raise ValueError("Failure in the worker process")
+
+
+@unittest.skipIf(asab.proactor.service.shared_memory is None, "shared memory is not available")
+class TestSharedBytes(unittest.TestCase):
+
+
+	def test_shared_bytes_01(self):
+		from multiprocessing import shared_memory
+		import pickle
+
+		data = os.urandom(4096)
+		segment = shared_memory.SharedMemory(create=True, size=len(data))
+		try:
+			segment.buf[:len(data)] = data
+			shared = pickle.loads(pickle.dumps(asab.proactor.service._SharedBytes(segment.name, len(data))))
+			self.assertEqual(shared.Name, segment.name)
+			self.assertEqual(shared.load(), data)
+		finally:
+			segment.close()
+			segment.unlink()
+
+
+class TestProcessPool(unittest.TestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		self.Loop = asyncio.new_event_loop()
+		self.Proactor = asab.proactor.ProactorService(MockedApp(self.Loop), "asab.ProactorService")
+		self.Proactor.CPUWorkers = 2
+
+
+	def tearDown(self):
+		self.Loop.run_until_complete(self.Proactor.finalize(self.Proactor.App))
+		self.Proactor.Executor.shutdown()
+		self.Loop.close()
+		super().tearDown()
+
+
+	def test_execute_cpu_01(self):
+		"""
+		The function is executed in another process
+		"""
+		data = b"asab" * 100
+		pid, data_type, result = self.Loop.run_until_complete(self.Proactor.execute_cpu(digest, data, "sha256"))
+		self.assertNotEqual(pid, os.getpid())
+		self.assertEqual(data_type, "bytes")
+		self.assertEqual(result, hashlib.sha256(data).hexdigest())
+
+
+	@unittest.skipIf(asab.proactor.service.shared_memory is None, "shared memory is not available")
+	def test_execute_cpu_02(self):
+		"""
+		Large bytes are passed over a shared memory, which is released after the call
+		"""
+		self.Proactor.SharedMemoryThreshold = 1024
+		data = os.urandom(64 * 1024)
+
+		shared = []
+		original_share = self.Proactor._share
+
+		def share(arg, segments):
+			result = original_share(arg, segments)
+			if isinstance(result, asab.proactor.service._SharedBytes):
+				shared.append(result)
+			return result
+
+		self.Proactor._share = share
+		pid, data_type, result = self.Loop.run_until_complete(self.Proactor.execute_cpu(digest, data, "sha256"))
+		self.assertEqual(data_type, "bytes")
+		self.assertEqual(result, hashlib.sha256(data).hexdigest())
+
+		# The argument has been shared, the string argument hasn't
+		self.assertEqual(len(shared), 1)
+		self.Loop.run_until_complete(asyncio.sleep(0))
+		with self.assertRaises(FileNotFoundError):
+			shared[0].load()
+
+
+	def test_execute_cpu_03(self):
+		"""
+		An exception of the function is raised by the future
+		"""
+		with self.assertRaises(ValueError):
+			self.Loop.run_until_complete(self.Proactor.execute_cpu(fail))
+
+
+	@unittest.skipIf(asab.proactor.service.shared_memory is None, "shared memory is not available")
+	def test_execute_cpu_04(self):
+		"""
+		Bytearrays and memory views keep their type, format and shape
+		"""
+		self.Proactor.SharedMemoryThreshold = 1024
+
+		large = bytearray(os.urandom(4096))
+		small = bytearray(b"asab")
+		ints = array.array('i', range(512))
+		matrix = memoryview(bytearray(range(16))).cast('B', (4, 4))
+
+		results = self.Loop.run_until_complete(asyncio.gather(
+			self.Proactor.execute_cpu(describe, large),
+			self.Proactor.execute_cpu(describe, small),
+			self.Proactor.execute_cpu(describe, memoryview(ints)),
+			self.Proactor.execute_cpu(describe, memoryview(b"abcdef")[::2]),
+			self.Proactor.execute_cpu(describe, matrix),
+		))
+		self.assertEqual(results, [
+			("bytearray", "B", (4096,), bytes(large)),
+			("bytearray", "B", (4,), b"asab"),
+			("memoryview", "i", (512,), ints.tobytes()),
+			("memoryview", "B", (3,), b"ace"),
+			("memoryview", "B", (4, 4), bytes(range(16))),
+		])
+
+
+	@unittest.skipIf(asab.proactor.service.shared_memory is None, "shared memory is not available")
+	def test_execute_cpu_05(self):
+		"""
+		The shared memory is released when the worker process is done, not when the awaiting task is cancelled
+		"""
+		self.Proactor.SharedMemoryThreshold = 1024
+		self.Proactor.CPUWarmStart = True
+		self.Loop.run_until_complete(self.Proactor.initialize(self.Proactor.App))
+
+		shared = []
+		original_share = self.Proactor._share
+
+		def share(arg, segments):
+			result = original_share(arg, segments)
+			shared.append(result)
+			return result
+
+		self.Proactor._share = share
+		future = self.Proactor.execute_cpu(slow_digest, os.urandom(64 * 1024))
+		self.Loop.run_until_complete(asyncio.sleep(0.2))
+		future.cancel()
+		self.Loop.run_until_complete(asyncio.sleep(0))
+		self.assertTrue(future.cancelled())
+
+		# The worker process still reads the argument
+		self.assertEqual(len(shared[0].load()), 64 * 1024)
+
+		deadline = time.monotonic() + 5.0
+		while time.monotonic() < deadline:
+			try:
+				shared[0].load()
+			except FileNotFoundError:
+				break
+			time.sleep(0.05)
+		else:
+			self.fail("The shared memory has not been released")
+
+
+class MockedApp(object):
+
+	def __init__(self, loop):
+		self.Loop = loop
+
+	def _register_service(self, service):
+		pass
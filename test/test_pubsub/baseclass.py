@@ -0,0 +1,23 @@
+import asyncio
+import unittest
+
+import asab
+
+
+class PubSubTestCase(unittest.TestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		self.Loop = asyncio.new_event_loop()
+		self.PubSub = asab.PubSub(MockedApp(self.Loop))
+
+
+	def tearDown(self):
+		self.Loop.close()
+		super().tearDown()
+
+
+class MockedApp(object):
+	def __init__(self, loop):
+		self.Loop = loop
@@ -0,0 +1,112 @@
+import gc
+import asyncio
+
+from .baseclass import PubSubTestCase
+
+
+class Receiver(object):
+
+	def __init__(self):
+		self.Received = []
+
+	def on_message(self, message_type, *args):
+		self.Received.append((message_type, args))
+
+
+class TestDispatch(PubSubTestCase):
+
+
+	def test_dispatch_01(self):
+		"""
+		Subscribers are called in the order of subscription, a repeated subscription is idempotent
+		"""
+		received = []
+
+		def first(message_type, value):
+			received.append(("first", value))
+
+		def second(message_type, value):
+			received.append(("second", value))
+
+		self.PubSub.subscribe("test!", first)
+		self.PubSub.subscribe("test!", second)
+		self.PubSub.subscribe("test!", first)
+		self.PubSub.publish("test!", 1)
+
+		self.assertEqual(received, [("first", 1), ("second", 1)])
+		self.assertEqual(len(self.PubSub.Subscribers["test!"]), 2)
+
+
+	def test_dispatch_02(self):
+		"""
+		The dispatch tuple is cached on publish and invalidated by (un)subscribe
+		"""
+		receiver = Receiver()
+
+		self.PubSub.subscribe("test!", receiver.on_message)
+		self.PubSub.publish("test!")
+		dispatch = self.PubSub.Dispatch["test!"]
+		self.assertEqual(len(dispatch), 1)
+
+		self.PubSub.publish("test!")
+		self.assertIs(self.PubSub.Dispatch["test!"], dispatch)
+
+		# Bound method objects differ on every access, they are identified by the object and the function
+		self.PubSub.unsubscribe("test!", receiver.on_message)
+		self.assertNotIn("test!", self.PubSub.Dispatch)
+		self.assertNotIn("test!", self.PubSub.Subscribers)
+
+		self.PubSub.publish("test!")
+		self.assertEqual(receiver.Received, [("test!", ()), ("test!", ())])
+
+
+	def test_dispatch_03(self):
+		"""
+		A garbage collected subscriber is removed from the table and from the dispatch cache
+		"""
+		receiver = Receiver()
+		kept = Receiver()
+
+		self.PubSub.subscribe("test!", receiver.on_message)
+		self.PubSub.subscribe("test!", kept.on_message)
+		self.PubSub.publish("test!")
+
+		del receiver
+		gc.collect()
+
+		self.assertNotIn("test!", self.PubSub.Dispatch)
+		self.assertEqual(len(self.PubSub.Subscribers["test!"]), 1)
+
+		self.PubSub.publish("test!")
+		self.assertEqual(len(kept.Received), 2)
+
+		del kept
+		gc.collect()
+		self.assertNotIn("test!", self.PubSub.Subscribers)
+
+
+	def test_dispatch_04(self):
+		"""
+		Coroutine subscribers are delivered in tasks, `asynchronously` defers the delivery to the loop
+		"""
+		received = []
+
+		async def coro(message_type, value):
+			received.append(("coro", value))
+
+		def func(message_type, value):
+			received.append(("func", value))
+
+		self.PubSub.subscribe("test!", coro)
+		self.PubSub.subscribe("test!", func)
+
+		self.PubSub.publish("test!", 1, asynchronously=True)
+		self.assertEqual(received, [])
+
+		self.Loop.run_until_complete(_yield(3))
+		self.assertEqual(sorted(received), [("coro", 1), ("func", 1)])
+
+
+async def _yield(count):
+	for _ in range(count):
+		await asyncio.sleep(0)
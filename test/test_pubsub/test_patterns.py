@@ -0,0 +1,139 @@
+import asab.pubsub
+
+from .baseclass import PubSubTestCase
+
+
+class TestTopicTrie(PubSubTestCase):
+
+
+	def match(self, trie, message_type):
+		return sorted(
+			key
+			for subscribers in trie.match(message_type)
+			for key in subscribers
+		)
+
+
+	def test_trie_01(self):
+		"""
+		Single segment wildcard
+		"""
+		trie = asab.pubsub.TopicTrie()
+		trie.insert("Application.tick/*!")['tick'] = None
+
+		self.assertEqual(self.match(trie, "Application.tick/10!"), ['tick'])
+		self.assertEqual(self.match(trie, "Application.tick/10"), ['tick'])
+		self.assertEqual(self.match(trie, "Application.tick!"), [])
+		self.assertEqual(self.match(trie, "Application.tick/10/20!"), [])
+
+
+	def test_trie_02(self):
+		"""
+		Multi segment wildcard matches also zero segments
+		"""
+		trie = asab.pubsub.TopicTrie()
+		trie.insert("Library.**")['library'] = None
+		trie.insert("**.ready!")['ready'] = None
+
+		self.assertEqual(self.match(trie, "Library.ready!"), ['library', 'ready'])
+		self.assertEqual(self.match(trie, "Library!"), ['library'])
+		self.assertEqual(self.match(trie, "Library.a/b.c"), ['library'])
+		self.assertEqual(self.match(trie, "ready!"), ['ready'])
+		self.assertEqual(self.match(trie, "Storage.ready"), ['ready'])
+		self.assertEqual(self.match(trie, "Storage.stop!"), [])
+
+
+	def test_trie_03(self):
+		"""
+		Removal prunes the trie
+		"""
+		trie = asab.pubsub.TopicTrie()
+		trie.insert("a.*.c")
+		trie.insert("a.*")
+		self.assertEqual(len(trie), 2)
+
+		trie.remove("a.*.c")
+		self.assertEqual(len(trie), 1)
+		self.assertIsNone(trie.get("a.*.c"))
+		self.assertIsNotNone(trie.get("a.*"))
+
+		trie.remove("a.*")
+		self.assertEqual(len(trie), 0)
+		self.assertEqual(trie.Root.Children, {})
+
+
+	def test_is_pattern(self):
+		self.assertTrue(asab.pubsub.is_pattern("Application.tick/*!"))
+		self.assertTrue(asab.pubsub.is_pattern("Library.**"))
+		self.assertFalse(asab.pubsub.is_pattern("Application.tick!"))
+		self.assertFalse(asab.pubsub.is_pattern("a*b.c"))
+		self.assertFalse(asab.pubsub.is_pattern(('tuple', '*')))
+
+
+class TestPatternSubscription(PubSubTestCase):
+
+
+	def test_pattern_01(self):
+		"""
+		A callback subscribed by the message type and by matching patterns is called once
+		"""
+		received = []
+
+		def callback(message_type, *args):
+			received.append((message_type, args))
+
+		self.PubSub.subscribe("Application.tick/*!", callback)
+		self.PubSub.subscribe("Application.**", callback)
+		self.PubSub.subscribe("Application.tick/10!", callback)
+
+		self.PubSub.publish("Application.tick/10!", 1)
+		self.PubSub.publish("Application.tick!", 2)
+		self.PubSub.publish("Other.tick/10!", 3)
+
+		self.assertEqual(received, [
+			("Application.tick/10!", (1,)),
+			("Application.tick!", (2,)),
+		])
+
+
+	def test_pattern_02(self):
+		"""
+		A new pattern subscription invalidates the cached dispatch
+		"""
+		received = []
+
+		def callback(message_type):
+			received.append(message_type)
+
+		self.PubSub.publish("Library.ready!")
+		self.PubSub.subscribe("Library.*!", callback)
+		self.PubSub.publish("Library.ready!")
+
+		self.PubSub.unsubscribe("Library.*!", callback)
+		self.PubSub.publish("Library.ready!")
+
+		self.assertEqual(received, ["Library.ready!"])
+		self.assertEqual(len(self.PubSub.Patterns), 0)
+
+
+	def test_pattern_03(self):
+		"""
+		Message types that are not strings are published while patterns are subscribed
+		"""
+		received = []
+
+		def callback(message_type, *args):
+			received.append((message_type, args))
+
+		self.PubSub.subscribe("Library.**", callback)
+		self.PubSub.subscribe(("tuple", "type"), callback)
+		self.PubSub.subscribe(42, callback)
+
+		self.PubSub.publish(("tuple", "type"), 1)
+		self.PubSub.publish(42, 2)
+		self.PubSub.publish(None, 3)
+
+		self.assertEqual(received, [
+			(("tuple", "type"), (1,)),
+			(42, (2,)),
+		])
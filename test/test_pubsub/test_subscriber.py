@@ -0,0 +1,113 @@
+import asyncio
+
+import asab
+
+from .baseclass import PubSubTestCase
+
+
+class TestSubscriber(PubSubTestCase):
+
+
+	def publish(self, *messages):
+		for message_type, value in messages:
+			self.PubSub.publish(message_type, value)
+
+
+	def drain(self, subscriber):
+		batch = self.Loop.run_until_complete(subscriber.messages(timeout=0.01))
+		return [(message_type, args[0]) for message_type, args, kwargs in batch]
+
+
+	def test_subscriber_01(self):
+		"""
+		Unbounded queue keeps all messages in order
+		"""
+		subscriber = asab.Subscriber(self.PubSub, "a!", "b!")
+		self.publish(("a!", 1), ("b!", 2), ("a!", 3))
+
+		self.assertEqual(self.drain(subscriber), [("a!", 1), ("b!", 2), ("a!", 3)])
+		self.assertEqual(subscriber.Dropped, 0)
+		self.assertEqual(self.drain(subscriber), [])
+
+
+	def test_subscriber_02(self):
+		"""
+		drop_oldest
+		"""
+		subscriber = asab.Subscriber(self.PubSub, "a!", maxsize=2, overflow='drop_oldest')
+		self.publish(("a!", 1), ("a!", 2), ("a!", 3))
+
+		self.assertEqual(self.drain(subscriber), [("a!", 2), ("a!", 3)])
+		self.assertEqual(subscriber.Dropped, 1)
+
+
+	def test_subscriber_03(self):
+		"""
+		drop_newest
+		"""
+		subscriber = asab.Subscriber(self.PubSub, "a!", maxsize=2, overflow='drop_newest')
+		self.publish(("a!", 1), ("a!", 2), ("a!", 3))
+
+		self.assertEqual(self.drain(subscriber), [("a!", 1), ("a!", 2)])
+		self.assertEqual(subscriber.Dropped, 1)
+
+
+	def test_subscriber_04(self):
+		"""
+		coalesce keeps the latest message of each type at the position of the first one
+		"""
+		subscriber = asab.Subscriber(self.PubSub, "a!", "b!", "c!", maxsize=2, overflow='coalesce')
+		self.publish(("a!", 1), ("b!", 2), ("a!", 3))
+
+		self.assertEqual(self.drain(subscriber), [("a!", 3), ("b!", 2)])
+		self.assertEqual(subscriber.Dropped, 0)
+
+		# The oldest message is dropped when the queue is full
+		self.publish(("a!", 4), ("b!", 5), ("c!", 6), ("b!", 7))
+		self.assertEqual(self.drain(subscriber), [("b!", 7), ("c!", 6)])
+		self.assertEqual(subscriber.Dropped, 1)
+
+
+	def test_subscriber_05(self):
+		"""
+		block: publish_async waits for a space in the queue, the synchronous publish drops
+		"""
+		subscriber = asab.Subscriber(self.PubSub, "a!", maxsize=1, overflow='block')
+		received = []
+
+		async def publisher():
+			for i in range(3):
+				await self.PubSub.publish_async("a!", i)
+			# The synchronous publish doesn't wait
+			self.PubSub.publish("a!", 3)
+
+		async def consumer():
+			for _ in range(3):
+				message_type, args, kwargs = await subscriber.message()
+				received.append(args[0])
+				await asyncio.sleep(0)
+
+		async def main():
+			await asyncio.gather(publisher(), consumer())
+
+		self.Loop.run_until_complete(main())
+
+		self.assertEqual(received, [0, 1, 2])
+		self.assertEqual(subscriber.Dropped, 1)
+
+
+	def test_subscriber_06(self):
+		"""
+		Batched read respects max_batch
+		"""
+		subscriber = asab.Subscriber(self.PubSub, "a!")
+		self.publish(*[("a!", i) for i in range(5)])
+
+		batch = self.Loop.run_until_complete(subscriber.messages(max_batch=3))
+		self.assertEqual([args[0] for _, args, _ in batch], [0, 1, 2])
+		self.assertEqual(len(self.drain(subscriber)), 2)
+
+
+	def test_subscriber_07(self):
+		with self.assertRaises(ValueError):
+			asab.Subscriber(self.PubSub, "a!", overflow='unknown')
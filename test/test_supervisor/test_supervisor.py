@@ -0,0 +1,140 @@
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+import unittest.mock
+
+import asab
+import asab.application
+import asab.supervisor
+
+
+# The worker: it crashes on its first start (if asked to), reports SIGHUP and exits on SIGTERM
+WORKER = '''
+import os, sys, time, signal
+
+directory = sys.argv[1]
+worker_id = os.environ["ASAB_WORKER_ID"]
+crashed = os.path.join(directory, "crashed-" + worker_id)
+
+if sys.argv[2] == "crash" and not os.path.exists(crashed):
+	open(crashed, "w").close()
+	sys.exit(3)
+
+def on_hup(signum, frame):
+	open(os.path.join(directory, "hup-" + worker_id), "w").close()
+
+signal.signal(signal.SIGHUP, on_hup)
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(int(sys.argv[3])))
+
+with open(os.path.join(directory, "started-" + worker_id), "a") as f:
+	f.write("{}\\n".format(os.getpid()))
+
+while True:
+	time.sleep(0.01)
+'''
+
+
+class TestSupervisor(unittest.TestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		self.Loop = asyncio.new_event_loop()
+		self.Directory = tempfile.TemporaryDirectory()
+		self.MockedApp = MockedApp(self.Loop)
+
+
+	def tearDown(self):
+		self.Loop.close()
+		self.Directory.cleanup()
+		super().tearDown()
+
+
+	def create_supervisor(self, workers, mode="run", exit_code=0):
+		supervisor = asab.supervisor.Supervisor(self.MockedApp, workers)
+		supervisor.RestartDelay = 0.05
+		supervisor.Command = [sys.executable, "-c", WORKER, self.Directory.name, mode, str(exit_code)]
+		return supervisor
+
+
+	def path(self, name):
+		return os.path.join(self.Directory.name, name)
+
+
+	def wait_for(self, *names, timeout=10.0):
+		async def wait():
+			while not all(os.path.exists(self.path(name)) for name in names):
+				await asyncio.sleep(0.01)
+		self.Loop.run_until_complete(asyncio.wait_for(wait(), timeout))
+
+
+	def test_supervisor_01(self):
+		"""
+		Crashed workers are restarted, SIGHUP and SIGTERM are propagated to workers
+		"""
+		supervisor = self.create_supervisor(2, mode="crash")
+		run = self.Loop.create_task(supervisor.run())
+
+		with self.assertLogs("asab.supervisor", level="ERROR") as logs:
+			self.wait_for("started-0", "started-1")
+		self.assertEqual([record.getMessage() for record in logs.records], ["Worker crashed, restarting"] * 2)
+		self.assertTrue(os.path.exists(self.path("crashed-0")))
+		self.assertTrue(os.path.exists(self.path("crashed-1")))
+		self.assertEqual(sorted(supervisor.Workers.keys()), [0, 1])
+
+		self.MockedApp.PubSub.publish("Application.hup!")
+		self.wait_for("hup-0", "hup-1")
+
+		self.MockedApp.PubSub.publish("Application.stop!", 1)
+		self.Loop.run_until_complete(asyncio.wait_for(run, 10.0))
+
+		self.assertEqual(supervisor.Workers, {})
+		self.assertEqual(self.MockedApp.ExitCode, 0)
+
+		# Each worker has been started only once after its crash
+		for worker_id in (0, 1):
+			with open(self.path("started-{}".format(worker_id))) as f:
+				self.assertEqual(len(f.read().split()), 1)
+
+
+	def test_supervisor_02(self):
+		"""
+		The exit code of the supervisor is the highest exit code of its workers
+		"""
+		supervisor = self.create_supervisor(1, exit_code=5)
+		run = self.Loop.create_task(supervisor.run())
+		self.wait_for("started-0")
+
+		self.MockedApp.PubSub.publish("Application.stop!", 1)
+		self.Loop.run_until_complete(asyncio.wait_for(run, 10.0))
+		self.assertEqual(self.MockedApp.ExitCode, 5)
+
+
+class TestCheckSupervisor(unittest.TestCase):
+
+
+	def test_check_supervisor_01(self):
+		app = unittest.mock.Mock()
+
+		app.SupervisorPid = os.getppid()
+		asab.Application._check_supervisor(app, "Application.tick!")
+		app.stop.assert_not_called()
+
+		# The worker has been reparented, its supervisor is gone
+		app.SupervisorPid = -1
+		with self.assertLogs("asab.application", level="ERROR"):
+			asab.Application._check_supervisor(app, "Application.tick!")
+		app.stop.assert_called_once_with()
+
+
+class MockedApp(object):
+
+	def __init__(self, loop):
+		self.Loop = loop
+		self.PubSub = asab.PubSub(self)
+		self.ExitCode = 0
+
+	def set_exit_code(self, exit_code):
+		self.ExitCode = max(self.ExitCode, exit_code)
@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+
+import asab
+import asab.task
+
+
+class TaskTestCase(unittest.TestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		asab.Config.add_defaults({
+			"asab:task": {
+				"slow_task": 10,
+			}
+		})
+		self.OriginalLoop = asyncio.get_event_loop_policy().get_event_loop()
+		self.Loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(self.Loop)
+		self.MockedApp = MockedApp(self.Loop)
+		self.TaskService = asab.task.TaskService(self.MockedApp)
+		self.TaskService.start()
+
+
+	def tearDown(self):
+		self.Loop.run_until_complete(self.TaskService.finalize(self.MockedApp))
+		self.Loop.close()
+		asyncio.set_event_loop(self.OriginalLoop)
+		super().tearDown()
+
+
+	def run_loop(self, iterations=5):
+		async def iterate():
+			for _ in range(iterations):
+				await asyncio.sleep(0)
+		self.Loop.run_until_complete(iterate())
+
+
+class MockedApp(object):
+
+	def __init__(self, loop):
+		self.Loop = loop
+		self.PubSub = asab.PubSub(self)
+
+	def _register_service(self, service):
+		pass
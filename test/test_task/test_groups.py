@@ -0,0 +1,129 @@
+import asyncio
+
+from .baseclass import TaskTestCase
+
+
+class TestTaskGroups(TaskTestCase):
+
+
+	def test_schedule_01(self):
+		"""
+		Scheduled coroutines without a group are started in the next iteration
+		"""
+		started = []
+
+		async def job(i):
+			started.append(i)
+
+		self.TaskService.schedule(job(1), job(2))
+		self.assertEqual(self.TaskService.queued(), 2)
+
+		self.run_loop()
+		self.assertEqual(sorted(started), [1, 2])
+		self.assertEqual(self.TaskService.queued(), 0)
+		self.assertEqual(len(self.TaskService.PendingTasks), 0)
+
+
+	def test_limit_01(self):
+		"""
+		Concurrency of the group is limited, waiting coroutines are started by priority
+		"""
+		release = asyncio.Event()
+		started = []
+
+		async def job(name):
+			started.append(name)
+			await release.wait()
+
+		self.TaskService.set_limit("io", 1)
+		self.TaskService.schedule(job("first"), group="io")
+		self.run_loop()
+		self.assertEqual(started, ["first"])
+
+		self.TaskService.schedule(job("low"), group="io", priority=-1)
+		self.TaskService.schedule(job("normal-1"), group="io")
+		self.TaskService.schedule(job("high"), group="io", priority=10)
+		self.TaskService.schedule(job("normal-2"), group="io")
+		self.run_loop()
+		self.assertEqual(started, ["first"])
+		self.assertEqual(self.TaskService.queued(), 4)
+		self.assertEqual(self.TaskService.Groups["io"].Running, 1)
+
+		# Each finished task starts the next one in the order of priority, then of the schedule
+		for expected in (["high"], ["normal-1"], ["normal-2"], ["low"]):
+			release.set()
+			self.run_loop(1)
+			release.clear()
+			self.run_loop()
+			self.assertEqual(started[-1:], expected)
+			self.assertEqual(self.TaskService.Groups["io"].Running, 1)
+
+		release.set()
+		self.run_loop()
+		self.assertEqual(self.TaskService.Groups["io"].Running, 0)
+		self.assertEqual(self.TaskService.queued(), 0)
+
+
+	def test_limit_02(self):
+		"""
+		Raising the limit starts waiting coroutines, groups are independent
+		"""
+		release = asyncio.Event()
+		started = []
+
+		async def job(name):
+			started.append(name)
+			await release.wait()
+
+		self.TaskService.set_limit("io", 1)
+		self.TaskService.schedule(job("a"), job("b"), job("c"), group="io")
+		self.TaskService.schedule(job("other"))
+		self.run_loop()
+		self.assertEqual(sorted(started), ["a", "other"])
+
+		self.TaskService.set_limit("io", 3)
+		self.run_loop()
+		self.assertEqual(sorted(started), ["a", "b", "c", "other"])
+
+		self.TaskService.set_limit("io", None)
+		release.set()
+		self.run_loop()
+		self.assertEqual(len(self.TaskService.PendingTasks), 0)
+
+
+	def test_limit_03(self):
+		"""
+		Running futures count towards the limit of the group
+		"""
+		started = []
+		future = self.Loop.create_future()
+
+		async def job():
+			started.append(True)
+
+		self.TaskService.set_limit("io", 1)
+		self.TaskService.schedule(future, group="io")
+		self.TaskService.schedule(job(), group="io")
+		self.run_loop()
+		self.assertEqual(started, [])
+
+		future.set_result(None)
+		self.run_loop()
+		self.assertEqual(started, [True])
+
+
+	def test_finalize(self):
+		"""
+		Coroutines that were never started are closed by finalize
+		"""
+		async def job():
+			pass
+
+		coro = job()
+		self.TaskService.set_limit("io", 0)
+		self.TaskService.schedule(coro, group="io")
+		self.run_loop()
+
+		with self.assertLogs("asab.task", level="WARNING"):
+			self.Loop.run_until_complete(self.TaskService.finalize(self.MockedApp))
+		self.assertIsNone(coro.cr_frame)
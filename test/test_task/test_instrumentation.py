@@ -0,0 +1,87 @@
+import asyncio
+
+import asab.task
+
+from ..test_metrics.baseclass import MetricsTestCase
+from .baseclass import TaskTestCase
+
+
+class TestSlowTask(TaskTestCase):
+
+
+	def test_slow_task_01(self):
+		"""
+		A task running longer than `slow_task` is logged once, with its stack
+		"""
+		release = asyncio.Event()
+
+		async def slow_job():
+			await release.wait()
+
+		self.TaskService.SlowTask = 0.01
+		self.TaskService.schedule(slow_job())
+		self.run_loop()
+		self.TaskService._on_tick("Application.tick!")  # Not slow yet
+
+		self.Loop.run_until_complete(asyncio.sleep(0.02))
+		with self.assertLogs("asab.task", level="WARNING") as logs:
+			self.TaskService._on_tick("Application.tick!")
+		self.assertEqual(len(logs.records), 1)
+		self.assertIn("Task is running for", logs.records[0].getMessage())
+		self.assertIn("slow_job", logs.records[0].getMessage())
+		self.assertEqual(logs.records[0]._struct_data["task"], "TestSlowTask.test_slow_task_01.<locals>.slow_job")
+
+		# The task is reported only once
+		record, = self.TaskService.PendingTasks.values()
+		self.assertTrue(record.Reported)
+
+		release.set()
+		self.run_loop()
+		self.assertEqual(len(self.TaskService.PendingTasks), 0)
+
+
+class TestTaskMetrics(TaskTestCase, MetricsTestCase):
+
+
+	def setUp(self):
+		super().setUp()
+		self.TaskService.Metrics = asab.task.TaskMetrics(self.TaskService, self.MetricsService)
+
+
+	def fields(self, metric, tags):
+		for field in metric.Storage['fieldset']:
+			if all(field['tags'].get(k) == v for k, v in tags.items()):
+				return field['values']
+		return None
+
+
+	def test_task_metrics_01(self):
+		release = asyncio.Event()
+
+		async def job():
+			await release.wait()
+
+		metrics = self.TaskService.Metrics
+		self.TaskService.set_limit("io", 1)
+		self.TaskService.schedule(job(), job(), group="io")
+		self.run_loop()
+
+		# The gauge is updated at the flush
+		self.MockedApp.PubSub.publish("Metrics.flush!")
+		self.assertEqual(self.fields(metrics.Gauge, {}), {"queued": 1, "running": 1})
+
+		release.set()
+		self.run_loop()
+		self.MockedApp.PubSub.publish("Metrics.flush!")
+		self.assertEqual(self.fields(metrics.Gauge, {}), {"queued": 0, "running": 0})
+
+		self.MetricsService._flush_metrics()
+		tags = {"task": "TestTaskMetrics.test_task_metrics_01.<locals>.job"}
+
+		wait = self.fields(metrics.WaitHistogram, tags)
+		self.assertEqual(wait["count"], 2)
+		self.assertEqual(wait["buckets"][float("inf")], {"wait": 2})
+
+		duration = self.fields(metrics.DurationHistogram, tags)
+		self.assertEqual(duration["count"], 2)
+		self.assertEqual(duration["buckets"][float("inf")], {"duration": 2})